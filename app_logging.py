@@ -0,0 +1,170 @@
+# LOGGING ASÍNCRONO, ROTATIVO Y ESTRUCTURADO
+"""
+Los handlers de la UI sólo encolan el registro (QueueHandler); un hilo
+QueueListener lo formatea y escribe. El archivo rota por tamaño y cada línea
+es un objeto JSON con el contexto de la sesión y del trabajo:
+
+    {"ts": ..., "level": "INFO", "logger": ..., "msg": ...,
+     "session": "a1b2", "job": "analisis-3", "timings": {"yolo_ms": 412.0}}
+
+    setup_logging()
+    with log_context(session=page.session_id, job="analisis-3"):
+        timer = StageTimer()
+        with timer.stage("yolo"):
+            ...
+        logger.info("Análisis completado", extra={"timings": timer.ms()})
+
+Mensajes por frame: extra={"sample": "clave"} los limita a uno por
+SAMPLE_INTERVAL_S por clave; el siguiente que pasa lleva "suppressed" con los
+descartados entretanto.
+"""
+import atexit
+import contextlib
+import contextvars
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+LOG_PATH = os.environ.get("TOYOTA_LOG_PATH", "/tmp/toyota_app_main.log")
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 5
+SAMPLE_INTERVAL_S = 2.0
+
+_session = contextvars.ContextVar("log_session", default=None)
+_job = contextvars.ContextVar("log_job", default=None)
+_job_ids = itertools.count(1)
+_listener = None
+
+
+def new_job_id(prefix="job"):
+    return f"{prefix}-{next(_job_ids)}"
+
+
+@contextlib.contextmanager
+def log_context(session=None, job=None):
+    """Asocia sesión y trabajo a todos los registros emitidos dentro del bloque (mismo hilo)"""
+    tokens = []
+    if session is not None:
+        tokens.append((_session, _session.set(str(session))))
+    if job is not None:
+        tokens.append((_job, _job.set(str(job))))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+class StageTimer:
+    """Acumula la duración de cada etapa de un trabajo.
+
+    stage(nombre) mide un bloque; lap(nombre) asigna a la etapa el tiempo
+    transcurrido desde el lap anterior (o desde la creación)."""
+
+    def __init__(self):
+        self.stages = {}
+        self._t = time.perf_counter()
+
+    def lap(self, name):
+        now = time.perf_counter()
+        self.stages[name] = self.stages.get(name, 0.0) + now - self._t
+        self._t = now
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - t0
+            self._t = time.perf_counter()
+
+    def ms(self):
+        return {f"{k}_ms": round(v * 1000, 1) for k, v in self.stages.items()}
+
+
+class ContextFilter(logging.Filter):
+    """Copia sesión y trabajo del contexto al registro (en el hilo que lo emite)"""
+
+    def filter(self, record):
+        if not hasattr(record, "session"):
+            record.session = _session.get()
+        if not hasattr(record, "job"):
+            record.job = _job.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Deja pasar un registro por clave `sample` cada `interval` segundos"""
+
+    def __init__(self, interval=SAMPLE_INTERVAL_S):
+        super().__init__()
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._state = {}  # clave -> (último emitido, descartados)
+
+    def filter(self, record):
+        key = getattr(record, "sample", None)
+        if key is None:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            last, dropped = self._state.get(key, (None, 0))
+            if last is not None and now - last < self.interval:
+                self._state[key] = (last, dropped + 1)
+                return False
+            self._state[key] = (now, 0)
+        if dropped:
+            record.suppressed = dropped
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key in ("session", "job", "timings", "suppressed"):
+            value = getattr(record, key, None)
+            if value is not None:
+                data[key] = value
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def setup_logging(path=LOG_PATH, level=logging.INFO, max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS):
+    """Configura el logger raíz una sola vez por proceso"""
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+    file_handler.setFormatter(JsonFormatter())
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+
+    q = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(q)
+    # Los filtros corren en el hilo que emite: ahí están los contextvars de la sesión
+    queue_handler.addFilter(ContextFilter())
+    queue_handler.addFilter(SamplingFilter())
+
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(q, file_handler, console, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
@@ -0,0 +1,160 @@
+# CALIBRACIÓN DE INFERENCIA POR MÁQUINA
+"""
+Mide el detector sobre un conjunto sintético fijo con distintas combinaciones
+de tamaño de lote, hilos intra-op de torch e `imgsz`, y guarda la mejor para
+esta máquina en HW_CONFIG_PATH (detector.py la aplica al arrancar).
+
+"Mejor" = mayor throughput (imágenes/s) cuyo p95 de latencia por llamada
+queda dentro del presupuesto y con imgsz >= --min-imgsz (por precisión).
+
+Uso: python autotune.py [--rapido] [--budget-ms 800] [--min-imgsz 480]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+import detector
+
+GRID_BATCH = (1, 2, 4, 8, 16)
+GRID_IMGSZ = (320, 480, 640, 800)
+SYNTH_IMAGES = 16
+SYNTH_SEED = 2025
+SYNTH_SIZE = (1920, 1080)
+REPETICIONES = 3
+LATENCY_BUDGET_MS = 800
+
+
+def hilos_candidatos():
+    n = os.cpu_count() or 1
+    return sorted({t for t in (1, 2, 4, n // 2, n) if 0 < t <= n})
+
+
+def generar_set_sintetico(carpeta, n=SYNTH_IMAGES, seed=SYNTH_SEED, size=SYNTH_SIZE):
+    """Fotos sintéticas deterministas: fondo, carrocería, ruedas, cristales y rayones"""
+    rng = np.random.default_rng(seed)
+    w, h = size
+    rutas = []
+    for i in range(n):
+        img = np.zeros((h, w, 3), dtype=np.uint8)
+        img[:] = rng.integers(90, 200, 3)
+        img = np.clip(img.astype(np.int16) + rng.normal(0, 6, img.shape).astype(np.int16), 0, 255).astype(np.uint8)
+        x1, y1 = int(rng.integers(50, w // 4)), int(rng.integers(h // 4, h // 2))
+        x2, y2 = int(rng.integers(3 * w // 4, w - 50)), int(rng.integers(3 * h // 4, h - 50))
+        color = tuple(int(v) for v in rng.integers(0, 255, 3))
+        cv2.rectangle(img, (x1, y1), (x2, y2), color, -1)
+        cv2.rectangle(img, (x1 + (x2 - x1) // 5, y1 - (y2 - y1) // 3), (x2 - (x2 - x1) // 5, y1), (60, 60, 70), -1)
+        for cx in (x1 + (x2 - x1) // 5, x2 - (x2 - x1) // 5):
+            cv2.circle(img, (cx, y2), (y2 - y1) // 4, (20, 20, 20), -1)
+        for _ in range(int(rng.integers(0, 6))):
+            p1 = (int(rng.integers(x1, x2)), int(rng.integers(y1, y2)))
+            p2 = (p1[0] + int(rng.integers(-120, 120)), p1[1] + int(rng.integers(-30, 30)))
+            cv2.line(img, p1, p2, (230, 230, 230), 2)
+        ruta = os.path.join(carpeta, f"sintetica_{i:02d}.jpg")
+        cv2.imwrite(ruta, img, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        rutas.append(ruta)
+    return rutas
+
+
+def medir(rutas, batch, imgsz, threads, repeticiones=REPETICIONES):
+    """Decodifica y analiza el set en lotes de `batch`; devuelve throughput y latencias"""
+    detector.INFERENCE_IMGSZ = imgsz
+    detector.INFERENCE_BATCH = batch
+    detector.aplicar_hilos(threads)
+
+    lotes = [rutas[i:i + batch] for i in range(0, len(rutas), batch)]
+    # Calentamiento: la primera llamada con un imgsz nuevo reconstruye buffers
+    detector.detectar_vehiculos_lote([cv2.imread(r) for r in lotes[0]])
+
+    latencias = []
+    t0 = time.perf_counter()
+    for _ in range(repeticiones):
+        for lote in lotes:
+            t = time.perf_counter()
+            imgs = [cv2.imread(r) for r in lote]
+            for img, dets in zip(imgs, detector.detectar_vehiculos_lote(imgs)):
+                detector.resumir_detecciones(img, dets)
+            latencias.append((time.perf_counter() - t) * 1000)
+    total = time.perf_counter() - t0
+    latencias.sort()
+    return {
+        "batch": batch, "imgsz": imgsz, "threads": threads,
+        "imgs_por_s": round(len(rutas) * repeticiones / total, 2),
+        "p50_ms": round(latencias[len(latencias) // 2], 1),
+        "p95_ms": round(latencias[min(len(latencias) - 1, int(0.95 * len(latencias)))], 1),
+    }
+
+
+def elegir(mediciones, budget_ms=LATENCY_BUDGET_MS, min_imgsz=480):
+    validas = [m for m in mediciones if m["p95_ms"] <= budget_ms and m["imgsz"] >= min_imgsz]
+    if not validas:
+        # Nada cumple el presupuesto: la de menor latencia con imgsz aceptable
+        validas = sorted((m for m in mediciones if m["imgsz"] >= min_imgsz), key=lambda m: m["p95_ms"])[:1] \
+            or sorted(mediciones, key=lambda m: m["p95_ms"])[:1]
+    # Con throughput parecido (±5%) se prefiere el imgsz mayor
+    mejor = max(validas, key=lambda m: m["imgs_por_s"])
+    parecidas = [m for m in validas if m["imgs_por_s"] >= 0.95 * mejor["imgs_por_s"]]
+    return max(parecidas, key=lambda m: (m["imgsz"], m["imgs_por_s"]))
+
+
+def guardar(config, path=None):
+    path = path or detector.HW_CONFIG_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        with open(path, encoding="utf-8") as f:
+            todas = json.load(f)
+    except (OSError, ValueError):
+        todas = {}
+    todas[detector.huella_hardware()] = config
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(todas, f, indent=2)
+    os.replace(tmp, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibra batch, hilos e imgsz del detector para esta máquina")
+    parser.add_argument("--rapido", action="store_true", help="Rejilla reducida (1 repetición)")
+    parser.add_argument("--budget-ms", type=float, default=LATENCY_BUDGET_MS, help="p95 máximo por llamada al modelo")
+    parser.add_argument("--min-imgsz", type=int, default=480)
+    parser.add_argument("--out", help=f"Archivo de configuración (por defecto {detector.HW_CONFIG_PATH})")
+    args = parser.parse_args()
+
+    detector.cargar_modelo()
+    if not detector.YOLO_AVAILABLE:
+        print("❌ YOLO no disponible: no hay nada que calibrar")
+        return
+    # El triaje de la cascada no debe saltarse el modelo durante la medición
+    detector.CASCADE_MODE = False
+
+    grid_batch = (1, 4, 8) if args.rapido else GRID_BATCH
+    grid_imgsz = (480, 640) if args.rapido else GRID_IMGSZ
+    repeticiones = 1 if args.rapido else REPETICIONES
+
+    mediciones = []
+    with tempfile.TemporaryDirectory(prefix="toyota_autotune_") as carpeta:
+        rutas = generar_set_sintetico(carpeta)
+        for threads in hilos_candidatos():
+            for imgsz in grid_imgsz:
+                for batch in grid_batch:
+                    m = medir(rutas, batch, imgsz, threads, repeticiones)
+                    mediciones.append(m)
+                    print(f"hilos={threads:<3} imgsz={imgsz:<4} batch={batch:<3} -> "
+                          f"{m['imgs_por_s']:>7} img/s | p50 {m['p50_ms']} ms | p95 {m['p95_ms']} ms")
+
+    mejor = elegir(mediciones, args.budget_ms, args.min_imgsz)
+    config = dict(mejor, fecha=datetime.now().strftime("%Y-%m-%d %H:%M:%S"), budget_ms=args.budget_ms)
+    path = guardar(config, args.out)
+    print(f"✅ Mejor configuración: hilos={mejor['threads']} imgsz={mejor['imgsz']} batch={mejor['batch']} "
+          f"({mejor['imgs_por_s']} img/s, p95 {mejor['p95_ms']} ms)")
+    print(f"✅ Guardada para {detector.huella_hardware()} en {path}")
+
+
+if __name__ == "__main__":
+    main()
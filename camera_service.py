@@ -0,0 +1,225 @@
+# SERVICIO DE CAPTURA DE CÁMARA PERSISTENTE
+"""
+Mantiene la cámara abierta en un hilo de fondo y guarda los últimos frames
+en un buffer circular. Capturar una foto ya no paga la apertura del
+dispositivo ni el ajuste de exposición: se devuelve al instante el frame
+nítido más reciente.
+
+Cualquier objeto con la interfaz de cv2.VideoCapture (isOpened/read/release)
+sirve como dispositivo, así que FileCaptureDevice permite probar el servicio
+con un video o una imagen en disco en lugar de una cámara real.
+"""
+import logging
+import platform
+import threading
+import time
+from collections import deque
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+# Frames recientes que se conservan en memoria
+RING_SIZE = 30
+# Varianza del Laplaciano mínima para considerar un frame nítido
+SHARPNESS_THRESHOLD = 60.0
+# Antigüedad máxima (s) de un frame para servirlo como captura
+MAX_FRAME_AGE = 1.0
+# Ancho del frame reducido sobre el que se mide la nitidez
+SHARPNESS_WIDTH = 320
+
+
+def sharpness(frame):
+    """Varianza del Laplaciano sobre una versión reducida en grises"""
+    h, w = frame.shape[:2]
+    if w > SHARPNESS_WIDTH:
+        frame = cv2.resize(frame, (SHARPNESS_WIDTH, int(h * SHARPNESS_WIDTH / w)), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def open_default_device(index=0):
+    """Abre la cámara del sistema con el backend adecuado por plataforma"""
+    if platform.system() == "Darwin":
+        return cv2.VideoCapture(index, cv2.CAP_AVFOUNDATION)
+    return cv2.VideoCapture(index)
+
+
+class FileCaptureDevice:
+    """Dispositivo falso respaldado por un archivo (video o imagen) para pruebas.
+
+    Reproduce el video en bucle al ritmo `fps`; una imagen se repite indefinidamente."""
+
+    def __init__(self, path, fps=30.0, loop=True):
+        self.path = path
+        self.fps = fps
+        self.loop = loop
+        self._cap = cv2.VideoCapture(path)
+        self._still = None
+        if not self._cap.isOpened():
+            self._still = cv2.imread(path)
+        self._last = 0.0
+
+    def isOpened(self):
+        return self._still is not None or (self._cap is not None and self._cap.isOpened())
+
+    def read(self):
+        espera = self._last + 1.0 / self.fps - time.monotonic()
+        if espera > 0:
+            time.sleep(espera)
+        self._last = time.monotonic()
+
+        if self._still is not None:
+            return True, self._still.copy()
+        ret, frame = self._cap.read()
+        if not ret and self.loop:
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self._cap.read()
+        return ret, frame
+
+    def release(self):
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+
+class CaptureService:
+    """Cámara abierta de forma permanente con buffer circular de frames recientes"""
+
+    def __init__(self, device_factory=open_default_device, ring_size=RING_SIZE):
+        self.device_factory = device_factory
+        self._ring = deque(maxlen=ring_size)  # (timestamp, nitidez, frame)
+        self._cond = threading.Condition()
+        self._device = None
+        self._thread = None
+        self._running = False
+        self._seq = 0
+        self._listeners = []
+
+    @property
+    def running(self):
+        return self._running
+
+    def start(self, timeout=5.0):
+        """Abre el dispositivo y arranca el hilo lector. Devuelve True si hay frames"""
+        if self._running:
+            return True
+        device = self.device_factory()
+        if device is None or not device.isOpened():
+            logger.warning("No se pudo abrir la cámara")
+            return False
+
+        self._device = device
+        self._running = True
+        self._thread = threading.Thread(target=self._reader, name="camera-capture", daemon=True)
+        self._thread.start()
+
+        # Esperar al primer frame para que la primera captura no falle
+        with self._cond:
+            self._cond.wait_for(lambda: self._ring or not self._running, timeout=timeout)
+        return bool(self._ring)
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        if self._device is not None:
+            self._device.release()
+            self._device = None
+        with self._cond:
+            self._ring.clear()
+            self._cond.notify_all()
+
+    def add_listener(self, fn):
+        """Registra `fn(frame, timestamp)`; se llama desde el hilo lector en cada frame"""
+        self._listeners.append(fn)
+
+    def remove_listener(self, fn):
+        if fn in self._listeners:
+            self._listeners.remove(fn)
+
+    def _reader(self):
+        fallos = 0
+        while self._running:
+            ret, frame = self._device.read()
+            if not ret or frame is None:
+                fallos += 1
+                if fallos > 50:
+                    logger.warning("Cámara sin frames, deteniendo servicio")
+                    self._running = False
+                    break
+                time.sleep(0.02)
+                continue
+            fallos = 0
+            entry = (time.monotonic(), sharpness(frame), frame)
+            with self._cond:
+                self._ring.append(entry)
+                self._seq += 1
+                self._cond.notify_all()
+            for fn in list(self._listeners):
+                fn(frame, entry[0])
+        with self._cond:
+            self._cond.notify_all()
+
+    def latest(self):
+        """Frame más reciente (o None)"""
+        with self._cond:
+            return self._ring[-1][2] if self._ring else None
+
+    def latest_sharp(self, max_age=MAX_FRAME_AGE, threshold=SHARPNESS_THRESHOLD):
+        """Frame nítido más reciente dentro de `max_age` segundos.
+
+        Si ninguno supera el umbral se devuelve el más nítido de la ventana."""
+        with self._cond:
+            ahora = time.monotonic()
+            recientes = [e for e in self._ring if ahora - e[0] <= max_age] or list(self._ring)[-1:]
+        if not recientes:
+            return None
+        for ts, score, frame in reversed(recientes):
+            if score >= threshold:
+                return frame
+        return max(recientes, key=lambda e: e[1])[2]
+
+    def burst(self, count=5, timeout=5.0):
+        """Captura los próximos `count` frames nuevos (modo ráfaga), ordenados por nitidez"""
+        frames = []
+        limite = time.monotonic() + timeout
+        with self._cond:
+            visto = self._seq
+            while len(frames) < count and self._running:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                self._cond.wait_for(lambda: self._seq > visto or not self._running, timeout=restante)
+                nuevos = min(self._seq - visto, len(self._ring))
+                if nuevos:
+                    frames.extend(list(self._ring)[-nuevos:])
+                    visto = self._seq
+        frames = frames[:count]
+        frames.sort(key=lambda e: e[1], reverse=True)
+        return [f for _, _, f in frames]
+
+    def capture_to_file(self, output_path):
+        """Guarda el frame nítido más reciente en disco. Devuelve la ruta o None"""
+        frame = self.latest_sharp()
+        if frame is None:
+            return None
+        if cv2.imwrite(output_path, frame):
+            return output_path
+        return None
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_capture_service(device_factory=open_default_device):
+    """Servicio de captura compartido por el proceso (se abre una sola vez)"""
+    global _service
+    with _service_lock:
+        if _service is None or not _service.running:
+            _service = CaptureService(device_factory)
+            if not _service.start():
+                _service = None
+        return _service
@@ -0,0 +1,110 @@
+# EVALUACIÓN DE LA CASCADA (TRIAJE vs MODELO COMPLETO)
+"""
+Pasa un conjunto de validación (carpeta de fotos) por el triaje rápido y por
+el modelo completo y mide:
+
+- tasa de escalado: fracción de fotos que el triaje no resuelve
+- acuerdo: de las fotos resueltas por el triaje, cuántas también salen sin
+  daños (Perfecto) con el modelo completo; las demás son daños que el
+  triaje habría ocultado y se listan para ajustar los umbrales TRIAGE_*
+- tiempo medio de triaje frente a modelo completo
+
+Uso: python cascade_eval.py fotos_validacion/ [--json resultado.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+
+import detector
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+
+
+def listar_imagenes(carpeta):
+    rutas = []
+    for raiz, _, archivos in os.walk(carpeta):
+        for nombre in sorted(archivos):
+            if nombre.lower().endswith(IMAGE_EXTENSIONS):
+                rutas.append(os.path.join(raiz, nombre))
+    return rutas
+
+
+def evaluar(rutas):
+    filas = []
+    for ruta in rutas:
+        t0 = time.perf_counter()
+        reducida = cv2.imread(ruta, cv2.IMREAD_REDUCED_COLOR_4)
+        triaje = detector.triaje_rapido(reducida) if reducida is not None else None
+        t1 = time.perf_counter()
+        daños, severidad = detector.detectar_daños(ruta, cascada=False)
+        t2 = time.perf_counter()
+        filas.append({
+            "ruta": ruta,
+            "triaje": list(triaje) if triaje else None,
+            "modelo": [daños, severidad],
+            "triaje_ms": (t1 - t0) * 1000,
+            "modelo_ms": (t2 - t1) * 1000,
+        })
+    return filas
+
+
+def resumir(filas):
+    total = len(filas)
+    resueltas = [f for f in filas if f["triaje"]]
+    # El triaje "acierta" si el modelo completo tampoco encuentra daños
+    perdidas = [f for f in resueltas if detector.SEVERIDAD_ORDEN.get(f["modelo"][1], -1) > 0]
+    por_categoria = {}
+    for f in resueltas:
+        por_categoria[f["triaje"][0]] = por_categoria.get(f["triaje"][0], 0) + 1
+    media = lambda key: sum(f[key] for f in filas) / total if total else 0.0
+    return {
+        "imagenes": total,
+        "resueltas_por_triaje": len(resueltas),
+        "tasa_escalado": (total - len(resueltas)) / total if total else 0.0,
+        "acuerdo": (len(resueltas) - len(perdidas)) / len(resueltas) if resueltas else 1.0,
+        "por_categoria": por_categoria,
+        "daños_ocultados": [{"ruta": f["ruta"], "triaje": f["triaje"], "modelo": f["modelo"]} for f in perdidas],
+        "triaje_ms_medio": round(media("triaje_ms"), 1),
+        "modelo_ms_medio": round(media("modelo_ms"), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evalúa el triaje de la cascada contra el modelo completo")
+    parser.add_argument("carpeta")
+    parser.add_argument("--json", help="Guardar resumen y resultados por imagen en este archivo")
+    args = parser.parse_args()
+
+    detector.cargar_modelo()
+    if not detector.YOLO_AVAILABLE:
+        print("❌ YOLO no disponible: no hay modelo completo con el que comparar")
+        sys.exit(1)
+
+    rutas = listar_imagenes(args.carpeta)
+    if not rutas:
+        print(f"❌ No hay imágenes en {args.carpeta}")
+        sys.exit(1)
+
+    filas = evaluar(rutas)
+    resumen = resumir(filas)
+    print(f"📊 {resumen['imagenes']} imágenes")
+    print(f"   Escaladas al modelo: {resumen['tasa_escalado']:.1%}")
+    print(f"   Acuerdo del triaje con el modelo: {resumen['acuerdo']:.1%}")
+    for categoria, n in resumen["por_categoria"].items():
+        print(f"   - {categoria}: {n}")
+    print(f"   Triaje {resumen['triaje_ms_medio']} ms | modelo {resumen['modelo_ms_medio']} ms (medias)")
+    for f in resumen["daños_ocultados"]:
+        print(f"⚠️ {f['ruta']}: triaje '{f['triaje'][0]}' / modelo {f['modelo'][1]} ({f['modelo'][0]})")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump({"resumen": resumen, "imagenes": filas}, fh, ensure_ascii=False, indent=2)
+        print(f"✅ Guardado: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# FEED DE CAMBIOS EN PROCESO (PUB/SUB)
+"""
+db_utils publica aquí cada fila insertada o modificada y cada sesión Flet se
+suscribe para aplicar el cambio a sus listas (pedidos, reportes) sin volver a
+consultar la tabla entera.
+
+La entrega se hace en un hilo propio: quien escribe en la BD no espera a que
+las demás sesiones envíen su diff por el websocket.
+
+    feed.subscribe(on_change)            # on_change(Change)
+    feed.publish("repair_orders", "insert", row_id, row)
+"""
+import itertools
+import logging
+import queue
+import threading
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# seq: número creciente dentro del proceso; row: la fila completa tal como la devuelve SELECT *
+Change = namedtuple("Change", ["seq", "table", "op", "row_id", "row"])
+
+
+class ChangeFeed:
+    def __init__(self):
+        self._subs = []
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def subscribe(self, callback):
+        with self._lock:
+            if callback not in self._subs:
+                self._subs.append(callback)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._deliver, daemon=True, name="change-feed")
+                self._thread.start()
+        return callback
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subs:
+                self._subs.remove(callback)
+
+    def publish(self, table, op, row_id, row=None):
+        change = Change(next(self._seq), table, op, row_id, tuple(row) if row is not None else None)
+        if self._subs:
+            self._queue.put(change)
+        return change
+
+    def _deliver(self):
+        while True:
+            change = self._queue.get()
+            with self._lock:
+                subs = list(self._subs)
+            for callback in subs:
+                try:
+                    callback(change)
+                except Exception:
+                    logger.exception(f"Error entregando cambio {change.table}#{change.row_id}")
+
+
+feed = ChangeFeed()
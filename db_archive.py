@@ -0,0 +1,223 @@
+# PARTICIONES DE ARCHIVO MENSUALES
+"""
+Los reportes y pedidos con más de HOT_MONTHS meses salen de la base caliente a
+un archivo SQLite por mes (archivo_AAAA-MM.db.gz, comprimido e inmutable). La
+base caliente queda pequeña: respaldos, VACUUM y consultas sin índice sólo
+recorren los meses recientes.
+
+Para consultar, la partición se descomprime una vez a ARCHIVE_DIR/.cache y se
+abre en sólo lectura; si otro proceso (la CLI) reescribe el .gz, la siguiente
+consulta lo detecta por mtime/tamaño y vuelve a abrirla. db_utils sólo la consulta cuando el rango de fechas lo
+pide (o cuando la base caliente no llena el `limit`) y mezcla los resultados
+por fecha. Las filas conservan su id, así que pedido -> reporte sigue
+resolviéndose entre particiones.
+
+Con almacén central configurado (TOYOTA_SYNC_URL), las filas con cambios aún
+sin subir (change_log con seq > pushed_seq) no se archivan hasta que se
+sincronicen; sin sync el change_log no se poda nunca y no retiene nada. Las
+entradas del change_log de las filas archivadas se descartan. La fila de id más
+alto de cada tabla tampoco se archiva (los ids deben seguir siendo únicos entre
+particiones).
+
+Uso: python db_archive.py archive [--meses 3] [--sin-vacuum]
+     python db_archive.py list
+"""
+import argparse
+import glob
+import gzip
+import os
+import re
+import shutil
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import date
+
+ARCHIVE_DIR = os.environ.get("TOYOTA_ARCHIVE_DIR") or os.path.join(os.path.expanduser("~"), "toyota_archive")
+HOT_MONTHS = int(os.environ.get("TOYOTA_HOT_MONTHS", "3"))
+# Particiones abiertas a la vez (conexiones de sólo lectura)
+MAX_OPEN = 8
+# Tabla -> columna de fecha por la que se particiona
+ARCHIVE_TABLES = {"damage_reports": "fecha", "repair_orders": "fecha_pedido"}
+CHUNK_SIZE = 1024 * 1024
+# Con almacén central, lo no subido se queda en la base caliente hasta el push
+SYNC_CONFIGURED = bool(os.environ.get("TOYOTA_SYNC_URL"))
+
+_MES_RE = re.compile(r"archivo_(\d{4}-\d{2})\.db\.gz$")
+
+
+def mes_corte(hot_months=HOT_MONTHS, hoy=None):
+    """Primer mes ('AAAA-MM') que permanece en la base caliente"""
+    hoy = hoy or date.today()
+    total = hoy.year * 12 + hoy.month - 1 - hot_months
+    return f"{total // 12:04d}-{total % 12 + 1:02d}"
+
+
+def _ruta(mes, directorio=None):
+    return os.path.join(directorio or ARCHIVE_DIR, f"archivo_{mes}.db.gz")
+
+
+def listar_particiones(directorio=None):
+    """Meses archivados, del más reciente al más antiguo"""
+    meses = []
+    for ruta in glob.glob(os.path.join(directorio or ARCHIVE_DIR, "archivo_*.db.gz")):
+        m = _MES_RE.search(ruta)
+        if m:
+            meses.append(m.group(1))
+    return sorted(meses, reverse=True)
+
+
+def particiones_para(desde=None, hasta=None, directorio=None):
+    """Meses archivados que pueden contener filas del rango (fechas 'AAAA-MM-DD...')"""
+    return [m for m in listar_particiones(directorio)
+            if (not desde or m >= desde[:7]) and (not hasta or m <= hasta[:7])]
+
+
+class Archivo:
+    """Lector de particiones: descomprime a caché y mantiene abiertas las MAX_OPEN más usadas"""
+
+    def __init__(self, directorio=None, max_open=MAX_OPEN):
+        self.directorio = directorio
+        self.max_open = max_open
+        self._lock = threading.Lock()
+        self._abiertas = OrderedDict()  # mes -> (conexión, firma del .gz)
+
+    @property
+    def dir(self):
+        return self.directorio or ARCHIVE_DIR
+
+    def _cache(self, mes, forzar=False):
+        gz = _ruta(mes, self.dir)
+        cache_dir = os.path.join(self.dir, ".cache")
+        os.makedirs(cache_dir, exist_ok=True)
+        ruta = os.path.join(cache_dir, f"{mes}.db")
+        if forzar or not os.path.exists(ruta) or os.path.getmtime(ruta) < os.path.getmtime(gz):
+            tmp = ruta + ".tmp"
+            with gzip.open(gz, "rb") as src, open(tmp, "wb") as dst:
+                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+            os.replace(tmp, ruta)
+        return ruta
+
+    def _abrir(self, mes):
+        st = os.stat(_ruta(mes, self.dir))
+        firma = (st.st_mtime_ns, st.st_size)
+        db, previa = self._abiertas.pop(mes, (None, None))
+        if db is not None and previa != firma:
+            # Partición reescrita desde otro proceso: descartar la copia descomprimida
+            db.close()
+            db = None
+        if db is None:
+            ruta = self._cache(mes, forzar=previa is not None)
+            db = sqlite3.connect(f"file:{ruta}?mode=ro", uri=True, check_same_thread=False)
+            db.execute("PRAGMA query_only = ON")
+            while len(self._abiertas) >= self.max_open:
+                self._abiertas.popitem(last=False)[1][0].close()
+        self._abiertas[mes] = (db, firma)
+        return db
+
+    def consultar(self, mes, sql, params=()):
+        with self._lock:
+            return self._abrir(mes).execute(sql, params).fetchall()
+
+    def invalidar(self, mes):
+        with self._lock:
+            db, _ = self._abiertas.pop(mes, (None, None))
+            if db is not None:
+                db.close()
+
+
+def _pushed_seq(conn):
+    row = conn.execute("SELECT valor FROM sync_state WHERE clave = 'pushed_seq'").fetchone()
+    return int(row[0]) if row else 0
+
+
+def _archivar_mes(conn, mes, directorio, pendientes_desde=None):
+    """Pasa las filas del mes a su partición (fusionando con la existente) y las
+    borra de la base caliente sólo cuando la partición ya está escrita.
+    Con `pendientes_desde` (seq ya subido) se retienen las filas con cambios posteriores"""
+    gz = _ruta(mes, directorio)
+    tmp = gz[:-3] + ".tmp"
+    if os.path.exists(gz):
+        with gzip.open(gz, "rb") as src, open(tmp, "wb") as dst:
+            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+    elif os.path.exists(tmp):
+        os.remove(tmp)
+
+    ids = {}
+    part = sqlite3.connect(tmp)
+    try:
+        for tabla, col in ARCHIVE_TABLES.items():
+            esquema = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (tabla,)).fetchone()
+            part.execute(esquema[0].replace("CREATE TABLE", "CREATE TABLE IF NOT EXISTS", 1))
+            part.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabla}_{col} ON {tabla}({col})")
+            # La fila de id más alto se queda: sin AUTOINCREMENT, SQLite reutilizaría su id
+            sql = f"SELECT * FROM {tabla} WHERE substr({col}, 1, 7) = ? AND id < (SELECT MAX(id) FROM {tabla})"
+            params = (mes,)
+            if pendientes_desde is not None:
+                sql += " AND id NOT IN (SELECT row_id FROM change_log WHERE tabla = ? AND seq > ?)"
+                params += (tabla, pendientes_desde)
+            filas = conn.execute(sql, params).fetchall()
+            if filas:
+                part.executemany(f"INSERT OR REPLACE INTO {tabla} VALUES ({', '.join('?' * len(filas[0]))})", filas)
+            ids[tabla] = [f[0] for f in filas]
+        part.commit()
+        part.execute("VACUUM")
+    finally:
+        part.close()
+
+    with open(tmp, "rb") as src, gzip.open(gz + ".part", "wb", compresslevel=9) as dst:
+        shutil.copyfileobj(src, dst, CHUNK_SIZE)
+    os.replace(gz + ".part", gz)
+    os.remove(tmp)
+
+    for tabla, lista in ids.items():
+        for i in range(0, len(lista), 500):
+            trozo = lista[i:i + 500]
+            marcas = ', '.join('?' * len(trozo))
+            conn.execute(f"DELETE FROM {tabla} WHERE id IN ({marcas})", trozo)
+            conn.execute(f"DELETE FROM change_log WHERE tabla = ? AND row_id IN ({marcas})", [tabla] + trozo)
+    conn.commit()
+    return sum(len(v) for v in ids.values())
+
+
+def archivar(conn, hot_months=HOT_MONTHS, directorio=None, vacuum=True, hoy=None, sync=None):
+    """Archiva todo lo anterior al mes de corte. Devuelve {mes: filas movidas}.
+    `sync` (por defecto SYNC_CONFIGURED) retiene lo que aún no se subió al central"""
+    directorio = directorio or ARCHIVE_DIR
+    sync = SYNC_CONFIGURED if sync is None else sync
+    pendientes_desde = _pushed_seq(conn) if sync else None
+    os.makedirs(directorio, exist_ok=True)
+    corte = mes_corte(hot_months, hoy)
+    meses = set()
+    for tabla, col in ARCHIVE_TABLES.items():
+        meses.update(r[0] for r in conn.execute(
+            f"SELECT DISTINCT substr({col}, 1, 7) FROM {tabla} WHERE {col} < ? AND {col} IS NOT NULL", (corte,)))
+    movidas = {mes: _archivar_mes(conn, mes, directorio, pendientes_desde) for mes in sorted(meses)}
+    if vacuum and any(movidas.values()):
+        conn.execute("VACUUM")
+    return movidas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Particiones de archivo mensuales de Toyota Damage Pro")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_archive = sub.add_parser("archive", help="Mover a particiones lo anterior a los meses calientes")
+    p_archive.add_argument("--meses", type=int, default=HOT_MONTHS, help="Meses que se quedan en la base caliente")
+    p_archive.add_argument("--sin-vacuum", action="store_true", help="No compactar la base caliente al terminar")
+    sub.add_parser("list", help="Listar particiones")
+    args = parser.parse_args()
+
+    if args.cmd == "archive":
+        import db_utils
+        movidas = archivar(db_utils.conn, args.meses, vacuum=not args.sin_vacuum)
+        for mes, n in movidas.items():
+            print(f"✅ {mes}: {n} filas archivadas")
+        if not movidas:
+            print(f"✅ Nada que archivar (corte {mes_corte(args.meses)})")
+    elif args.cmd == "list":
+        for mes in listar_particiones():
+            print(f"{mes}  {os.path.getsize(_ruta(mes)) / 1024:.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+# RESPALDOS EN CALIENTE DE LA BASE DE DATOS
+"""
+Copias de seguridad con la API de backup de SQLite (Connection.backup) sobre
+la conexión global de db_utils, en pasos de PAGES_PER_STEP páginas: cada paso
+bloquea a los escritores sólo unos milisegundos y, al ser la misma conexión,
+las escrituras de la app durante el respaldo no obligan a reiniciarlo.
+
+El snapshot se comprime con gzip (toyota_AAAAMMDD_HHMMSS.db.gz) y se conservan
+los KEEP_BACKUPS más recientes. BackupScheduler lo repite cada INTERVAL_HOURS
+en un hilo de fondo.
+
+Uso: python db_backup.py backup
+     python db_backup.py list
+     python db_backup.py verify <snapshot.db.gz>
+     python db_backup.py restore <snapshot.db.gz> [--db destino.db]
+"""
+import argparse
+import glob
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+BACKUP_DIR = os.environ.get("TOYOTA_BACKUP_DIR") or os.path.join(os.path.expanduser("~"), "toyota_backups")
+KEEP_BACKUPS = 7
+INTERVAL_HOURS = 6
+PAGES_PER_STEP = 256          # páginas copiadas por paso (1 MB con páginas de 4 KB)
+STEP_SLEEP = 0.005            # pausa entre pasos para dejar pasar a los escritores
+CHUNK_SIZE = 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+def _snapshot_path(directorio):
+    return os.path.join(directorio, f"toyota_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db.gz")
+
+
+def listar_backups(directorio=None):
+    """Snapshots existentes, más recientes primero"""
+    return sorted(glob.glob(os.path.join(directorio or BACKUP_DIR, "toyota_*.db.gz")), reverse=True)
+
+
+def rotar(directorio=None, conservar=KEEP_BACKUPS):
+    for viejo in listar_backups(directorio)[conservar:]:
+        os.remove(viejo)
+
+
+def crear_backup(origen=None, directorio=None, on_progress=None):
+    """Respalda la base en caliente y devuelve la ruta del snapshot comprimido.
+
+    `origen` es la conexión a respaldar (por defecto la global de db_utils).
+    `on_progress(copiadas, total)` se llama tras cada paso."""
+    if origen is None:
+        from db_utils import conn as origen
+    directorio = directorio or BACKUP_DIR
+    os.makedirs(directorio, exist_ok=True)
+    destino = _snapshot_path(directorio)
+
+    fd, tmp = tempfile.mkstemp(suffix=".db", dir=directorio)
+    os.close(fd)
+    try:
+        copia = sqlite3.connect(tmp)
+        try:
+            progreso = (lambda status, restantes, total: on_progress(total - restantes, total)) if on_progress else None
+            origen.backup(copia, pages=PAGES_PER_STEP, progress=progreso, sleep=STEP_SLEEP)
+        finally:
+            copia.close()
+        with open(tmp, "rb") as src, gzip.open(destino + ".part", "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+        os.replace(destino + ".part", destino)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        if os.path.exists(destino + ".part"):
+            os.remove(destino + ".part")
+    rotar(directorio)
+    return destino
+
+
+def _descomprimir(snapshot, directorio=None):
+    fd, tmp = tempfile.mkstemp(suffix=".db", dir=directorio)
+    with os.fdopen(fd, "wb") as dst, gzip.open(snapshot, "rb") as src:
+        shutil.copyfileobj(src, dst, CHUNK_SIZE)
+    return tmp
+
+
+def verificar(snapshot):
+    """Descomprime el snapshot y comprueba su integridad.
+    Devuelve {"ok", "integrity", "tablas": {tabla: filas}}"""
+    tmp = _descomprimir(snapshot)
+    try:
+        db = sqlite3.connect(tmp)
+        try:
+            integrity = db.execute("PRAGMA integrity_check").fetchone()[0]
+            tablas = [r[0] for r in db.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")]
+            filas = {t: db.execute(f'SELECT COUNT(*) FROM "{t}"').fetchone()[0] for t in tablas}
+        finally:
+            db.close()
+    except sqlite3.DatabaseError as e:
+        return {"ok": False, "integrity": str(e), "tablas": {}}
+    finally:
+        os.remove(tmp)
+    return {"ok": integrity == "ok", "integrity": integrity, "tablas": filas}
+
+
+def restaurar(snapshot, destino=None):
+    """Restaura un snapshot verificado sobre `destino` (por defecto la base de la app).
+
+    La copia se hace con la API de backup hacia una conexión al destino, así
+    que no se sobrescribe el archivo por debajo de otra conexión abierta."""
+    resultado = verificar(snapshot)
+    if not resultado["ok"]:
+        raise sqlite3.DatabaseError(f"Snapshot corrupto: {resultado['integrity']}")
+    if destino is None:
+        from db_utils import db_path as destino
+    tmp = _descomprimir(snapshot)
+    try:
+        origen = sqlite3.connect(tmp)
+        dst = sqlite3.connect(destino)
+        try:
+            origen.backup(dst, pages=PAGES_PER_STEP, sleep=STEP_SLEEP)
+        finally:
+            dst.close()
+            origen.close()
+    finally:
+        os.remove(tmp)
+    return resultado
+
+
+class BackupScheduler:
+    """Respaldo periódico en un hilo de fondo (uno por proceso)"""
+
+    def __init__(self, interval_hours=INTERVAL_HOURS, directorio=None):
+        self.interval = interval_hours * 3600
+        self.directorio = directorio
+        self.ultimo = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True, name="db-backup")
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        # Si el último snapshot es reciente, esperar lo que falte del intervalo
+        previos = listar_backups(self.directorio)
+        espera = 0
+        if previos:
+            espera = max(0, self.interval - (time.time() - os.path.getmtime(previos[0])))
+        while not self._stop.wait(espera):
+            t0 = time.monotonic()
+            try:
+                self.ultimo = crear_backup(directorio=self.directorio)
+                logger.info(f"Respaldo creado: {self.ultimo}", extra={"timings": {"backup_ms": round((time.monotonic() - t0) * 1000, 1)}})
+            except Exception:
+                logger.exception("Error creando respaldo")
+            espera = self.interval
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def iniciar_backups():
+    """Arranca el respaldo periódico del proceso (idempotente)"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = BackupScheduler().start()
+        return _scheduler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Respaldos de la base de datos Toyota Damage Pro")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("backup", help="Crear un snapshot ahora")
+    sub.add_parser("list", help="Listar snapshots")
+    p_verify = sub.add_parser("verify", help="Comprobar la integridad de un snapshot")
+    p_verify.add_argument("snapshot")
+    p_restore = sub.add_parser("restore", help="Restaurar un snapshot (con la app detenida)")
+    p_restore.add_argument("snapshot")
+    p_restore.add_argument("--db", help="Base destino (por defecto la de la app)")
+    args = parser.parse_args()
+
+    if args.cmd == "backup":
+        print(f"✅ {crear_backup()}")
+    elif args.cmd == "list":
+        for ruta in listar_backups():
+            print(f"{ruta}  {os.path.getsize(ruta) / 1024:.0f} KB")
+    elif args.cmd == "verify":
+        r = verificar(args.snapshot)
+        print(("✅" if r["ok"] else "❌") + f" integridad: {r['integrity']}")
+        for tabla, n in r["tablas"].items():
+            print(f"   {tabla}: {n} filas")
+        sys.exit(0 if r["ok"] else 1)
+    elif args.cmd == "restore":
+        r = restaurar(args.snapshot, args.db)
+        print(f"✅ Restaurado ({sum(r['tablas'].values())} filas en {len(r['tablas'])} tablas)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,661 @@
+# BASE DE DATOS - TOYOTA DAMAGE PRO
+import sqlite3
+import os
+import re
+import json
+import uuid
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from change_feed import feed
+from db_archive import Archivo, ARCHIVE_TABLES, particiones_para
+
+# DATABASE
+DB_NAME = "toyota_damage_pedidos_pro.db"
+db_path = os.environ.get("TOYOTA_DB_PATH") or os.path.join(os.path.expanduser("~"), DB_NAME)
+# Segundos sin latido tras los que un trabajo "running" de otro proceso vivo se da por colgado
+JOB_STALE_SECONDS = int(os.environ.get("TOYOTA_JOB_STALE_SECONDS", "600"))
+conn = sqlite3.connect(db_path, check_same_thread=False)
+c = conn.cursor()
+# La conexión la comparten los hilos de la UI, el feed de cambios, el diario de
+# trabajos, el agente de sincronización y los pools de evidencia y PDFs: cada
+# función toma _db_lock y usa su propio cursor, y cada escritura (con su fila de
+# change_log) confirma o deshace sólo lo suyo (ver _transaccion)
+_db_lock = threading.RLock()
+# Particiones mensuales de sólo lectura (db_archive.py)
+archivo = Archivo()
+
+c.execute('''CREATE TABLE IF NOT EXISTS damage_reports (
+    id INTEGER PRIMARY KEY,
+    vin TEXT,
+    placa TEXT,
+    fecha TEXT,
+    daños TEXT,
+    severidad TEXT,
+    foto_path TEXT
+)''')
+
+c.execute('''CREATE TABLE IF NOT EXISTS repair_orders (
+    id INTEGER PRIMARY KEY,
+    reporte_id INTEGER,
+    fecha_pedido TEXT,
+    tipo_pedido TEXT,
+    descripcion TEXT,
+    estado TEXT,
+    FOREIGN KEY(reporte_id) REFERENCES damage_reports(id)
+)''')
+# Consultas por rango de fechas (y corte de archivo, ver db_archive.py)
+c.execute("CREATE INDEX IF NOT EXISTS idx_damage_reports_fecha ON damage_reports(fecha)")
+c.execute("CREATE INDEX IF NOT EXISTS idx_repair_orders_fecha ON repair_orders(fecha_pedido)")
+
+# Hashes perceptuales (dHash) de cada foto analizada, con su resultado,
+# para reutilizarlo cuando el mismo vehículo vuelve con fotos casi idénticas
+c.execute('''CREATE TABLE IF NOT EXISTS media_hashes (
+    id INTEGER PRIMARY KEY,
+    dhash TEXT,
+    path TEXT,
+    vin TEXT,
+    placa TEXT,
+    fecha TEXT,
+    daños TEXT,
+    severidad TEXT
+)''')
+c.execute("CREATE INDEX IF NOT EXISTS idx_media_hashes_vin ON media_hashes(vin)")
+c.execute("CREATE INDEX IF NOT EXISTS idx_media_hashes_placa ON media_hashes(placa)")
+
+# Diario de análisis de galería: un trabajo por "Analizar" y una fila por
+# archivo (representante de su grupo de duplicados) con su estado y resultado,
+# confirmados a medida que avanza para poder reanudar tras un reinicio.
+#   trabajo: running -> done | abandoned      (pid = proceso que lo ejecuta,
+#            latido = último avance; otro proceso sólo lo adopta si ese pid ya
+#            no existe o si el latido tiene más de JOB_STALE_SECONDS)
+#   item:    queued -> decoded -> inferred -> persisted
+c.execute('''CREATE TABLE IF NOT EXISTS analysis_jobs (
+    id INTEGER PRIMARY KEY,
+    pid INTEGER,
+    vin TEXT,
+    placa TEXT,
+    creado TEXT,
+    estado TEXT,
+    reporte_id INTEGER,
+    latido TEXT
+)''')
+if "latido" not in [col[1] for col in c.execute("PRAGMA table_info(analysis_jobs)")]:
+    c.execute("ALTER TABLE analysis_jobs ADD COLUMN latido TEXT")
+c.execute('''CREATE TABLE IF NOT EXISTS analysis_job_items (
+    id INTEGER PRIMARY KEY,
+    job_id INTEGER,
+    idx INTEGER,
+    path TEXT,
+    grupo TEXT,
+    estado TEXT,
+    lineas TEXT,
+    severidad TEXT,
+    actualizado TEXT,
+    FOREIGN KEY(job_id) REFERENCES analysis_jobs(id)
+)''')
+c.execute("CREATE INDEX IF NOT EXISTS idx_analysis_jobs_estado ON analysis_jobs(estado)")
+c.execute("CREATE INDEX IF NOT EXISTS idx_analysis_job_items_job ON analysis_job_items(job_id)")
+
+# Sincronización entre kioscos (sync_agent.py):
+#   change_log  cada escritura local en damage_reports / repair_orders, con
+#               seq creciente; el agente sube lo que hay después de su cursor
+#   sync_rows   identidad global de cada fila (kiosco de origen + id allí) y
+#               su última modificación, para resolver conflictos
+#   sync_state  id de este kiosco y cursores de subida/bajada
+c.execute('''CREATE TABLE IF NOT EXISTS change_log (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    tabla TEXT,
+    op TEXT,
+    row_id INTEGER,
+    modificado TEXT
+)''')
+c.execute('''CREATE TABLE IF NOT EXISTS sync_rows (
+    tabla TEXT,
+    local_id INTEGER,
+    origen TEXT,
+    remoto_id INTEGER,
+    modificado TEXT,
+    PRIMARY KEY(tabla, local_id)
+)''')
+c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_sync_rows_origen ON sync_rows(tabla, origen, remoto_id)")
+c.execute('''CREATE TABLE IF NOT EXISTS sync_state (
+    clave TEXT PRIMARY KEY,
+    valor TEXT
+)''')
+c.execute("INSERT OR IGNORE INTO sync_state (clave, valor) VALUES ('kiosk_id', ?)", (uuid.uuid4().hex[:12],))
+
+# Evidencia anotada de cada reporte (cajas y etiquetas dibujadas al analizar),
+# de la peor severidad a la mejor: abrir un reporte no vuelve a inferir ni a dibujar
+c.execute('''CREATE TABLE IF NOT EXISTS report_annotations (
+    reporte_id INTEGER,
+    orden INTEGER,
+    evidencia TEXT,
+    anotada TEXT,
+    severidad TEXT,
+    PRIMARY KEY(reporte_id, orden)
+)''')
+
+# Evidencia gestionada (evidence_store.py): un registro por archivo del almacén,
+# con clave "<sha256>.<ext>" (la que guarda foto_path) y su versión compacta.
+#   estado: pending -> done | error      conservar: 1 si algún reporte Grave lo usa
+c.execute('''CREATE TABLE IF NOT EXISTS evidence_files (
+    clave TEXT PRIMARY KEY,
+    tipo TEXT,
+    conservar INTEGER DEFAULT 0,
+    derivado TEXT,
+    bytes_original INTEGER,
+    bytes_derivado INTEGER,
+    estado TEXT,
+    creado TEXT
+)''')
+conn.commit()
+
+@contextmanager
+def _transaccion():
+    """Cursor propio con la conexión en exclusiva: commit al salir, rollback si falla"""
+    with _db_lock:
+        cur = conn.cursor()
+        try:
+            yield cur
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+
+def _leer(sql, params=(), uno=False):
+    """SELECT con cursor propio (no ve transacciones a medias de otros hilos)"""
+    with _db_lock:
+        cur = conn.execute(sql, params)
+        return cur.fetchone() if uno else cur.fetchall()
+
+
+_CONTROL_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]")
+
+
+def sanitize_text(text, max_len=1000):
+    """Limpia texto de entrada del usuario (caracteres de control, espacios, longitud)"""
+    if text is None:
+        return ""
+    text = _CONTROL_CHARS.sub("", str(text)).strip()
+    return text[:max_len]
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _marca():
+    """Marca de modificación para la regla de último-en-escribir (con microsegundos)"""
+    return datetime.now().isoformat(timespec="microseconds")
+
+
+def _registrar_cambio(cur, table, op, row_id):
+    """Anota la escritura local en change_log (misma transacción que la escritura)"""
+    modificado = _marca()
+    cur.execute("INSERT INTO change_log (tabla, op, row_id, modificado) VALUES (?,?,?,?)",
+                (table, op, row_id, modificado))
+    cur.execute(
+        "INSERT INTO sync_rows (tabla, local_id, origen, remoto_id, modificado) VALUES (?,?,?,?,?) "
+        "ON CONFLICT(tabla, local_id) DO UPDATE SET modificado = excluded.modificado",
+        (table, row_id, get_kiosk_id(), row_id, modificado)
+    )
+
+
+def _publicar(table, op, row_id):
+    """Publica la fila (ya confirmada) en el feed de cambios de las sesiones"""
+    row = _leer(f"SELECT * FROM {table} WHERE id = ?", (row_id,), uno=True)
+    if row is not None:
+        feed.publish(table, op, row_id, row)
+
+
+def insert_report(vin, placa, daños, severidad, foto_path, fecha=None):
+    """Inserta un reporte de daños y devuelve su id"""
+    with _transaccion() as cur:
+        cur.execute(
+            "INSERT INTO damage_reports (vin,placa,fecha,daños,severidad,foto_path) VALUES (?,?,?,?,?,?)",
+            (vin, placa, fecha or _now(), daños, severidad, foto_path)
+        )
+        report_id = cur.lastrowid
+        _registrar_cambio(cur, "damage_reports", "insert", report_id)
+    _publicar("damage_reports", "insert", report_id)
+    return report_id
+
+
+def insert_order(reporte_id, fecha_pedido, tipo_pedido, descripcion, estado="Pendiente"):
+    """Inserta un pedido de reparación y devuelve su id"""
+    with _transaccion() as cur:
+        cur.execute(
+            "INSERT INTO repair_orders (reporte_id, fecha_pedido, tipo_pedido, descripcion, estado) VALUES (?,?,?,?,?)",
+            (reporte_id, fecha_pedido, tipo_pedido, descripcion, estado)
+        )
+        order_id = cur.lastrowid
+        _registrar_cambio(cur, "repair_orders", "insert", order_id)
+    _publicar("repair_orders", "insert", order_id)
+    return order_id
+
+
+def update_report_foto(report_id, foto_path):
+    """Reemplaza la evidencia de un reporte (p. ej. rutas originales por claves
+    del almacén al terminar la copia). False si ya no está en la base caliente"""
+    with _transaccion() as cur:
+        cur.execute("UPDATE damage_reports SET foto_path = ? WHERE id = ?", (foto_path, report_id))
+        if cur.rowcount == 0:
+            return False
+        _registrar_cambio(cur, "damage_reports", "update", report_id)
+    _publicar("damage_reports", "update", report_id)
+    return True
+
+
+def update_order_estado(order_id, estado):
+    """Cambia el estado de un pedido (Pendiente / Completado).
+    False si el pedido ya no está en la base caliente (archivado)"""
+    with _transaccion() as cur:
+        cur.execute("UPDATE repair_orders SET estado = ? WHERE id = ?", (estado, order_id))
+        if cur.rowcount == 0:
+            return False
+        _registrar_cambio(cur, "repair_orders", "update", order_id)
+    _publicar("repair_orders", "update", order_id)
+    return True
+
+
+def _consultar(tabla, where="", params=(), desde=None, hasta=None, limit=None, offset=0):
+    """SELECT * de la tabla más reciente primero, con reparto a las particiones
+    archivadas sólo cuando hace falta: si el rango de fechas las toca o, sin
+    `desde`, cuando la base caliente no llena offset + limit.
+    `desde` / `hasta` son fechas 'AAAA-MM-DD' (ambas inclusive)"""
+    col = ARCHIVE_TABLES[tabla]
+    conds, args = ([where], list(params)) if where else ([], [])
+    if desde:
+        conds.append(f"{col} >= ?")
+        args.append(desde)
+    if hasta:
+        conds.append(f"{col} <= ?")
+        args.append(hasta + "~")  # '~' ordena después de cualquier hora del día
+    # id como desempate: con fechas repetidas las páginas (LIMIT/OFFSET) no se solapan
+    sql = f"SELECT * FROM {tabla}" + (" WHERE " + " AND ".join(conds) if conds else "") + f" ORDER BY {col} DESC, id DESC"
+    necesarias = None if limit is None else limit + offset
+    if necesarias is not None:
+        sql += f" LIMIT {int(necesarias)}"
+
+    with _db_lock:
+        cur = conn.execute(sql, args)
+        filas = cur.fetchall()
+        idx = [d[0] for d in cur.description].index(col)
+    meses = particiones_para(desde, hasta, archivo.dir)
+    if necesarias is not None and not desde and len(filas) >= necesarias:
+        meses = []
+    for mes in meses:  # del más reciente al más antiguo
+        if necesarias is not None and len(filas) >= necesarias:
+            filas.sort(key=lambda r: (r[idx] or "", r[0]), reverse=True)
+            if (filas[necesarias - 1][idx] or "")[:7] > mes:
+                break  # nada de este mes (ni de los anteriores) entra ya en el resultado
+        filas.extend(archivo.consultar(mes, sql, args))
+    if meses:
+        filas.sort(key=lambda r: (r[idx] or "", r[0]), reverse=True)
+    return filas if necesarias is None else filas[offset:necesarias]
+
+
+def fetch_reports(limit=None, desde=None, hasta=None):
+    """Reportes más recientes primero; con `limit` sólo los primeros.
+    Incluye los archivados cuando el rango los alcanza"""
+    return _consultar("damage_reports", desde=desde, hasta=hasta, limit=limit)
+
+
+def fetch_orders(limit=None, offset=0, desde=None, hasta=None):
+    """Pedidos más recientes primero; con `limit` sólo esa página"""
+    return _consultar("repair_orders", desde=desde, hasta=hasta, limit=limit, offset=offset)
+
+
+def search_reports(texto, desde=None, hasta=None, limit=100):
+    """Reportes cuyo VIN, placa o daños contienen `texto`, más recientes primero"""
+    patron = f"%{texto}%"
+    return _consultar("damage_reports", "(vin LIKE ? OR placa LIKE ? OR daños LIKE ?)", (patron, patron, patron),
+                      desde=desde, hasta=hasta, limit=limit)
+
+
+def fetch_report(report_id):
+    """Fila de un reporte por id (caliente o archivado); None si no existe"""
+    filas = _consultar("damage_reports", "id = ?", (report_id,), limit=1)
+    return filas[0] if filas else None
+
+
+def fetch_report_orders(report_id):
+    """Pedidos de un reporte (calientes y archivados), más recientes primero.
+    Sin filtro de fecha: fecha_pedido la escribe el usuario y puede ser anterior al reporte"""
+    return _consultar("repair_orders", "reporte_id = ?", (report_id,))
+
+
+def export_reports_csv(export_path, desde=None, hasta=None):
+    """Exporta reportes a CSV (incluidos los archivados del rango)"""
+    rows = fetch_reports(desde=desde, hasta=hasta)
+    with open(export_path, "w", encoding="utf-8") as f:
+        f.write("ID,VIN,Placa,Fecha,Daños,Severidad,Foto\n")
+        for r in rows:
+            f.write(f"{r[0]},{r[1]},{r[2]},{r[3]},\"{r[4]}\",{r[5]},{r[6] if len(r)>6 else ''}\n")
+    return export_path
+
+
+def export_orders_csv(export_path, desde=None, hasta=None):
+    """Exporta órdenes de reparación a CSV (incluidas las archivadas del rango)"""
+    rows = fetch_orders(desde=desde, hasta=hasta)
+    with open(export_path, "w", encoding="utf-8") as f:
+        f.write("ID,Reporte_ID,Fecha,Tipo,Descripción,Estado\n")
+        for r in rows:
+            f.write(f"{r[0]},{r[1]},{r[2]},{r[3]},\"{r[4]}\",{r[5]}\n")
+    return export_path
+
+
+def insert_media_hash(dhash, path, vin, placa, daños, severidad):
+    """Guarda el hash perceptual de una foto analizada junto con su resultado"""
+    with _transaccion() as cur:
+        cur.execute(
+            "INSERT INTO media_hashes (dhash, path, vin, placa, fecha, daños, severidad) VALUES (?,?,?,?,?,?,?)",
+            (dhash, path, vin, placa, _now(), daños, severidad)
+        )
+
+
+def fetch_media_hashes(vin, placa):
+    """Hashes de fotos previas del mismo vehículo (por VIN o placa), más recientes primero"""
+    claves = [(col, val) for col, val in (("vin", vin), ("placa", placa)) if val and val != "N/A"]
+    if not claves:
+        return []
+    where = " OR ".join(f"{col} = ?" for col, _ in claves)
+    return _leer(
+        f"SELECT dhash, path, fecha, daños, severidad FROM media_hashes WHERE {where} ORDER BY fecha DESC",
+        [val for _, val in claves]
+    )
+
+
+def create_job(vin, placa, grupos):
+    """Registra un trabajo de análisis con un item 'queued' por grupo y devuelve su id"""
+    ahora = _now()
+    with _transaccion() as cur:
+        cur.execute(
+            "INSERT INTO analysis_jobs (pid, vin, placa, creado, estado, latido) VALUES (?,?,?,?,?,?)",
+            (os.getpid(), vin, placa, ahora, "running", ahora)
+        )
+        job_id = cur.lastrowid
+        cur.executemany(
+            "INSERT INTO analysis_job_items (job_id, idx, path, grupo, estado, actualizado) VALUES (?,?,?,?,?,?)",
+            [(job_id, i, grupo[0], json.dumps(grupo), "queued", ahora) for i, grupo in enumerate(grupos)]
+        )
+    return job_id
+
+
+def fetch_job_items(job_id):
+    """Items del trabajo en orden: (id, idx, path, grupo, estado, lineas, severidad)
+    con grupo y lineas ya decodificados a listas"""
+    filas = _leer(
+        "SELECT id, idx, path, grupo, estado, lineas, severidad FROM analysis_job_items WHERE job_id = ? ORDER BY idx",
+        (job_id,)
+    )
+    return [(r[0], r[1], r[2], json.loads(r[3] or "[]"), r[4], json.loads(r[5] or "[]"), r[6]) for r in filas]
+
+
+def update_job_item(item_id, estado, lineas=None, severidad=None):
+    """Avanza el estado de un item (y guarda su resultado al llegar a 'inferred').
+    Cuenta como latido de su trabajo"""
+    ahora = _now()
+    with _transaccion() as cur:
+        if lineas is None:
+            cur.execute("UPDATE analysis_job_items SET estado = ?, actualizado = ? WHERE id = ?",
+                        (estado, ahora, item_id))
+        else:
+            cur.execute("UPDATE analysis_job_items SET estado = ?, lineas = ?, severidad = ?, actualizado = ? WHERE id = ?",
+                        (estado, json.dumps(lineas, ensure_ascii=False), severidad, ahora, item_id))
+        cur.execute("UPDATE analysis_jobs SET latido = ? WHERE id = (SELECT job_id FROM analysis_job_items WHERE id = ?)",
+                    (ahora, item_id))
+
+
+def heartbeat_job(job_id):
+    """Marca que el trabajo sigue vivo (p. ej. durante un video largo)"""
+    with _transaccion() as cur:
+        cur.execute("UPDATE analysis_jobs SET latido = ? WHERE id = ? AND pid = ?", (_now(), job_id, os.getpid()))
+
+
+def finish_job(job_id, reporte_id):
+    """Cierra el trabajo una vez guardado su reporte combinado"""
+    with _transaccion() as cur:
+        cur.execute("UPDATE analysis_job_items SET estado = 'persisted', actualizado = ? WHERE job_id = ?", (_now(), job_id))
+        cur.execute("UPDATE analysis_jobs SET estado = 'done', reporte_id = ? WHERE id = ?", (reporte_id, job_id))
+
+
+def abandon_job(job_id):
+    with _transaccion() as cur:
+        cur.execute("UPDATE analysis_jobs SET estado = 'abandoned' WHERE id = ?", (job_id,))
+
+
+def _pid_vivo(pid):
+    """True si existe un proceso con ese pid en esta máquina"""
+    if not pid or pid <= 0:
+        return False
+    if os.name == "nt":
+        # En Windows os.kill(pid, 0) termina el proceso: sólo cuenta el latido
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # existe, pero es de otro usuario
+    return True
+
+
+def _trabajo_huerfano(pid, latido):
+    """Un trabajo de otro proceso se puede adoptar si ese proceso ya no existe o
+    si lleva más de JOB_STALE_SECONDS sin avanzar (colgado o pid reutilizado)"""
+    if pid == os.getpid():
+        return False
+    if not _pid_vivo(pid):
+        return True
+    try:
+        return (datetime.now() - datetime.strptime(latido, "%Y-%m-%d %H:%M:%S")).total_seconds() > JOB_STALE_SECONDS
+    except (TypeError, ValueError):
+        return True  # trabajos de antes de existir el latido
+
+
+def fetch_interrupted_jobs():
+    """Trabajos que quedaron a medias en un proceso que ya no los ejecuta (más recientes primero)"""
+    filas = _leer(
+        "SELECT id, vin, placa, creado, pid, COALESCE(latido, creado) FROM analysis_jobs "
+        "WHERE estado = 'running' AND pid != ? ORDER BY id DESC",
+        (os.getpid(),)
+    )
+    return [f[:4] for f in filas if _trabajo_huerfano(f[4], f[5])]
+
+
+def claim_job(job_id):
+    """Adopta un trabajo interrumpido para este proceso. False si sigue vivo en
+    otro proceso o si otra sesión ya lo adoptó"""
+    with _transaccion() as cur:
+        fila = cur.execute("SELECT pid, COALESCE(latido, creado) FROM analysis_jobs WHERE id = ? AND estado = 'running'",
+                           (job_id,)).fetchone()
+        if not fila or not _trabajo_huerfano(*fila):
+            return False
+        # pid = ? : si otro proceso lo adoptó entre la lectura y aquí, no se pisa
+        cur.execute("UPDATE analysis_jobs SET pid = ?, latido = ? WHERE id = ? AND estado = 'running' AND pid = ?",
+                    (os.getpid(), _now(), job_id, fila[0]))
+        return cur.rowcount == 1
+
+
+def insert_report_annotations(reporte_id, anotaciones):
+    """Enlaza al reporte sus imágenes anotadas: [(evidencia, anotada, severidad)] en orden"""
+    with _transaccion() as cur:
+        cur.executemany(
+            "INSERT OR REPLACE INTO report_annotations (reporte_id, orden, evidencia, anotada, severidad) VALUES (?,?,?,?,?)",
+            [(reporte_id, i, ev, an, sev) for i, (ev, an, sev) in enumerate(anotaciones)]
+        )
+
+
+def fetch_report_annotations(reporte_id):
+    """[(evidencia, anotada, severidad)] del reporte, la más grave primero"""
+    return _leer("SELECT evidencia, anotada, severidad FROM report_annotations WHERE reporte_id = ? ORDER BY orden",
+                 (reporte_id,))
+
+
+# SINCRONIZACIÓN ENTRE KIOSCOS
+
+SYNC_COLUMNS = {
+    "damage_reports": ("vin", "placa", "fecha", "daños", "severidad", "foto_path"),
+    "repair_orders": ("reporte_id", "fecha_pedido", "tipo_pedido", "descripcion", "estado"),
+}
+
+
+def get_sync_state(clave, default=None):
+    row = _leer("SELECT valor FROM sync_state WHERE clave = ?", (clave,), uno=True)
+    return row[0] if row else default
+
+
+def set_sync_state(clave, valor):
+    with _transaccion() as cur:
+        cur.execute("INSERT OR REPLACE INTO sync_state (clave, valor) VALUES (?, ?)", (clave, str(valor)))
+
+
+def get_kiosk_id():
+    return get_sync_state("kiosk_id")
+
+
+def _clave_global(tabla, local_id):
+    """(origen, id en el origen) de una fila local; None si no está registrada"""
+    return _leer("SELECT origen, remoto_id, modificado FROM sync_rows WHERE tabla = ? AND local_id = ?",
+                 (tabla, local_id), uno=True)
+
+
+def _id_local(tabla, origen, remoto_id):
+    return _leer("SELECT local_id, modificado FROM sync_rows WHERE tabla = ? AND origen = ? AND remoto_id = ?",
+                 (tabla, origen, remoto_id), uno=True)
+
+
+def fetch_changes_since(seq, limit=500):
+    """Cambios locales posteriores a `seq`, uno por fila (el último), listos para subir:
+    [{"tabla", "op", "origen", "id", "modificado", "fila"}] y el último seq leído.
+    `fila` lleva el estado actual; en los pedidos reporte_id va como clave global"""
+    with _db_lock:  # una sola vista: ninguna escritura entre el log y las filas
+        return _cambios_desde(seq, limit)
+
+
+def _cambios_desde(seq, limit):
+    log = _leer("SELECT seq, tabla, op, row_id FROM change_log WHERE seq > ? ORDER BY seq LIMIT ?", (seq, limit))
+    if not log:
+        return [], seq
+    ultimos = {}
+    for s, tabla, op, row_id in log:
+        previo = ultimos.pop((tabla, row_id), None)
+        # Una fila creada en este mismo lote se sube como insert aunque luego cambie
+        ultimos[(tabla, row_id)] = "insert" if previo == "insert" else op
+    cambios = []
+    for (tabla, row_id), op in ultimos.items():
+        columnas = SYNC_COLUMNS[tabla]
+        valores = _leer(f"SELECT {', '.join(columnas)} FROM {tabla} WHERE id = ?", (row_id,), uno=True)
+        clave = _clave_global(tabla, row_id)
+        if valores is None or clave is None:
+            continue
+        fila = dict(zip(columnas, valores))
+        if tabla == "repair_orders" and fila["reporte_id"] is not None:
+            reporte = _clave_global("damage_reports", fila["reporte_id"])
+            fila["reporte_id"] = list(reporte[:2]) if reporte else None
+        cambios.append({"tabla": tabla, "op": op, "origen": clave[0], "id": clave[1],
+                        "modificado": clave[2], "fila": fila})
+    return cambios, log[-1][0]
+
+
+def prune_change_log(seq):
+    """Descarta del change_log lo ya confirmado por el almacén central"""
+    with _transaccion() as cur:
+        cur.execute("DELETE FROM change_log WHERE seq <= ?", (seq,))
+
+
+def apply_remote_changes(cambios):
+    """Aplica cambios bajados del almacén central sin volver a anotarlos en
+    change_log. Regla de conflicto: gana la modificación más reciente y, en
+    empate, la local; los reportes no se modifican tras crearse.
+    Todo el lote va en una transacción. Devuelve cuántos se aplicaron"""
+    propio = get_kiosk_id()
+    publicar = []
+    with _transaccion() as cur:
+        for cambio in cambios:
+            tabla, origen, remoto_id = cambio["tabla"], cambio["origen"], cambio["id"]
+            if tabla not in SYNC_COLUMNS:
+                continue
+            if origen == propio:
+                local = _clave_global(tabla, remoto_id)
+                local = (remoto_id, local[2]) if local else None
+            else:
+                local = _id_local(tabla, origen, remoto_id)
+            if local and local[1] >= cambio["modificado"]:
+                continue  # la versión local es igual o más nueva
+
+            fila = dict(cambio["fila"])
+            if tabla == "repair_orders" and fila.get("reporte_id"):
+                r_origen, r_id = fila["reporte_id"]
+                reporte = (r_id,) if r_origen == propio else _id_local("damage_reports", r_origen, r_id)
+                fila["reporte_id"] = reporte[0] if reporte else None
+            columnas = SYNC_COLUMNS[tabla]
+            valores = [fila.get(col) for col in columnas]
+            if local:
+                cur.execute(f"UPDATE {tabla} SET {', '.join(f'{col} = ?' for col in columnas)} WHERE id = ?",
+                            valores + [local[0]])
+                local_id, op = local[0], "update"
+            else:
+                cur.execute(f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({', '.join('?' * len(columnas))})",
+                            valores)
+                local_id, op = cur.lastrowid, "insert"
+            cur.execute(
+                "INSERT INTO sync_rows (tabla, local_id, origen, remoto_id, modificado) VALUES (?,?,?,?,?) "
+                "ON CONFLICT(tabla, local_id) DO UPDATE SET modificado = excluded.modificado",
+                (tabla, local_id, origen, remoto_id, cambio["modificado"])
+            )
+            publicar.append((tabla, op, local_id))
+    for tabla, op, local_id in publicar:
+        _publicar(tabla, op, local_id)
+    return len(publicar)
+
+
+def backfill_change_log():
+    """Anota como inserts las filas anteriores a la sincronización (una sola vez)"""
+    if get_sync_state("backfill"):
+        return 0
+    total = 0
+    with _transaccion() as cur:
+        for tabla in SYNC_COLUMNS:
+            cur.execute(f"SELECT id FROM {tabla} WHERE id NOT IN (SELECT local_id FROM sync_rows WHERE tabla = ?) ORDER BY id",
+                        (tabla,))
+            ids = [r[0] for r in cur.fetchall()]
+            for row_id in ids:
+                _registrar_cambio(cur, tabla, "insert", row_id)
+            total += len(ids)
+        cur.execute("INSERT OR REPLACE INTO sync_state (clave, valor) VALUES ('backfill', ?)", (_now(),))
+    return total
+
+
+# Las funciones de evidencia se llaman desde los hilos del pool de transcodificación
+EVIDENCE_FIELDS = ("clave", "tipo", "conservar", "derivado", "bytes_original", "bytes_derivado", "estado", "creado")
+
+
+def upsert_evidence(clave, tipo, bytes_original):
+    """Registra un archivo recién copiado al almacén (no toca uno ya registrado)"""
+    with _transaccion() as cur:
+        cur.execute(
+            "INSERT OR IGNORE INTO evidence_files (clave, tipo, bytes_original, estado, creado) VALUES (?,?,?,?,?)",
+            (clave, tipo, bytes_original, "pending", _now())
+        )
+
+
+def fetch_evidence(clave):
+    row = _leer(f"SELECT {', '.join(EVIDENCE_FIELDS)} FROM evidence_files WHERE clave = ?", (clave,), uno=True)
+    return dict(zip(EVIDENCE_FIELDS, row)) if row else None
+
+
+def update_evidence(clave, **campos):
+    """Actualiza columnas de evidence_files (conservar, derivado, bytes_derivado, estado)"""
+    columnas = [k for k in campos if k in EVIDENCE_FIELDS and k != "clave"]
+    if not columnas:
+        return
+    with _transaccion() as cur:
+        cur.execute(f"UPDATE evidence_files SET {', '.join(f'{k} = ?' for k in columnas)} WHERE clave = ?",
+                    [campos[k] for k in columnas] + [clave])
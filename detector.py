@@ -0,0 +1,839 @@
+# DETECTOR DE DAÑOS - TOYOTA DAMAGE PRO
+import json
+import logging
+import os
+import platform
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+
+# Servidor de inferencia compartido (inference_server.py). Si está definido,
+# este proceso no carga YOLO y las detecciones se piden por el socket Unix.
+INFERENCE_SOCKET = os.environ.get("TOYOTA_INFERENCE_SOCKET", "")
+# Si el servidor no responde, cargar el modelo en este proceso en lugar de fallar
+LOCAL_FALLBACK = os.environ.get("TOYOTA_INFERENCE_FALLBACK", "1") != "0"
+# Cascada: triaje barato con OpenCV sobre la imagen reducida; sólo los casos
+# dudosos llegan a YOLO (ver triaje_rapido y cascade_eval.py)
+CASCADE_MODE = os.environ.get("TOYOTA_CASCADE", "1") != "0"
+
+# Umbrales del triaje (medidos sobre la imagen reducida a TRIAGE_WIDTH)
+TRIAGE_WIDTH = 320
+TRIAGE_BLUR_VAR = 15          # varianza del Laplaciano por debajo: foto movida
+TRIAGE_DARK, TRIAGE_BRIGHT = 30, 225
+TRIAGE_CLIPPED = 0.45         # fracción de píxeles saturados (negro o blanco)
+TRIAGE_EMPTY_EDGES = 0.01     # fracción de bordes: escena sin estructura, sin vehículo
+TRIAGE_CLEAN_VAR = 150        # nitidez alta ...
+TRIAGE_CLEAN_EDGES = 0.12     # ... y pocos bordes: superficie limpia, "Perfecto" claro
+
+# Inferencia por tiles: en fotos grandes el recorte de cada auto se pasa a
+# resolución completa, en tiles solapados, por un modelo de daños (coste
+# proporcional al área del auto, no al tamaño de la foto)
+TILED_MODE = os.environ.get("TOYOTA_TILED", "1") != "0"
+TILED_MIN_SIDE = 1600         # sólo fotos con el lado mayor por encima de esto
+TILE_SIZE = 640
+TILE_OVERLAP = 0.2
+TILE_MAX = 48                 # con más tiles el recorte se reduce antes de cortar
+TILE_BATCH = 8
+TILE_NMS_IOU = 0.5
+# Pesos YOLO entrenados con clases de daño (rayón, abolladura, ...). Sin ellos
+# no hay modo por tiles: el criterio Laplaciano/Canny no es fiable en tiles
+# pequeños de pintura lisa y se sigue evaluando el recorte completo.
+DAMAGE_MODEL_PATH = os.environ.get("TOYOTA_DAMAGE_MODEL", "")
+damage_model = None
+
+# Configuración de inferencia por máquina, calibrada con autotune.py
+HW_CONFIG_PATH = os.environ.get(
+    "TOYOTA_HW_CONFIG", os.path.join(os.path.expanduser("~"), ".toyota_damage_pro", "hw_config.json"))
+INFERENCE_IMGSZ = 640         # lado de entrada del modelo
+INFERENCE_BATCH = 8           # imágenes por llamada al modelo
+INFERENCE_THREADS = None      # hilos intra-op de torch (None = defaults)
+
+# Pesos del detector de autos. Se pueden cambiar en caliente (y evaluar uno
+# candidato en sombra) editando MODEL_CONFIG_PATH, ver ModelRegistry
+MODEL_PATH = os.environ.get("TOYOTA_MODEL", "yolov8n.pt")
+MODEL_CONFIG_PATH = os.environ.get(
+    "TOYOTA_MODEL_CONFIG", os.path.join(os.path.expanduser("~"), ".toyota_damage_pro", "models.json"))
+MODEL_WATCH_INTERVAL = 5      # segundos entre comprobaciones de MODEL_CONFIG_PATH
+SHADOW_SAMPLE = float(os.environ.get("TOYOTA_SHADOW_SAMPLE", "0.1"))  # fracción de lotes evaluados en sombra
+SHADOW_MAX_PENDING = 2        # lotes en cola para la sombra; con más se descartan (no frenar bajo carga)
+SHADOW_WINDOW = 1000          # latencias recientes para los percentiles
+SHADOW_LOG_EVERY = 200        # frames comparados entre dos resúmenes en el log
+
+logger = logging.getLogger(__name__)
+
+model = None
+YOLO_AVAILABLE = False
+# True cuando la carga local terminó (con o sin YOLO); mientras tanto otros
+# hilos siguen usando el servidor de inferencia o esperan en _carga_lock
+_modelo_cargado = False
+_carga_lock = threading.Lock()
+
+
+def huella_hardware():
+    """Identifica la máquina para guardar una configuración calibrada por equipo"""
+    return f"{platform.node()}|{platform.machine()}|{os.cpu_count()}cpu"
+
+
+def cargar_config_hw(path=None):
+    """Aplica la configuración calibrada para esta máquina (si existe)"""
+    global INFERENCE_IMGSZ, INFERENCE_BATCH, INFERENCE_THREADS
+    try:
+        with open(path or HW_CONFIG_PATH, encoding="utf-8") as f:
+            config = json.load(f).get(huella_hardware())
+    except (OSError, ValueError):
+        return None
+    if not config:
+        return None
+    INFERENCE_IMGSZ = int(config.get("imgsz", INFERENCE_IMGSZ))
+    INFERENCE_BATCH = int(config.get("batch", INFERENCE_BATCH))
+    INFERENCE_THREADS = config.get("threads") or None
+    logger.info(f"Configuración de inferencia calibrada: imgsz={INFERENCE_IMGSZ} batch={INFERENCE_BATCH} hilos={INFERENCE_THREADS}")
+    return config
+
+
+def aplicar_hilos(threads=None):
+    """Fija los hilos intra-op de torch (sólo con el modelo local)"""
+    threads = threads or INFERENCE_THREADS
+    if not threads:
+        return
+    try:
+        import torch
+        torch.set_num_threads(int(threads))
+    except ImportError:
+        pass
+
+
+def cargar_modelo():
+    """Carga YOLO en este proceso (una sola vez, aunque la pidan varios hilos a la vez)"""
+    global model, YOLO_AVAILABLE, _modelo_cargado
+    if _modelo_cargado:
+        return model
+    with _carga_lock:
+        if not _modelo_cargado:
+            try:
+                model = _abrir_modelo(MODEL_PATH)
+                YOLO_AVAILABLE = True
+                registro.activo = MODEL_PATH
+                aplicar_hilos()
+            except Exception as e:
+                logger.warning(f"YOLO no disponible ({e}), usando el análisis con OpenCV")
+                YOLO_AVAILABLE = False
+                model = None
+            _modelo_cargado = True
+    return model
+
+
+def vigilar_modelos():
+    """Arranca el vigilante de MODEL_CONFIG_PATH si el modelo vive en este proceso.
+    Lo llaman los puntos de entrada (app y servidor de inferencia), no la carga:
+    los procesos auxiliares que importan detector no vigilan nada"""
+    if not (_modelo_cargado and YOLO_AVAILABLE):
+        return False
+    registro.vigilar()
+    return True
+
+
+def _abrir_modelo(ruta):
+    from ultralytics import YOLO
+    return YOLO(ruta)
+
+# Orden de severidad para agregar resultados de varias imágenes/frames
+SEVERIDAD_ORDEN = {"Desconocida": -1, "Perfecto": 0, "Moderada": 1, "Grave": 2}
+
+
+def peor_severidad(a, b):
+    """Devuelve la severidad más alta entre a y b"""
+    return a if SEVERIDAD_ORDEN.get(a, -1) >= SEVERIDAD_ORDEN.get(b, -1) else b
+
+
+def _evaluar_recorte(crop):
+    """Evalúa el recorte de un auto con Laplaciano/Canny.
+    Devuelve (lista de daños, severidad)."""
+    daños = []
+    severidad = "Perfecto"
+
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
+
+    if laplacian_var < 50:
+        daños.append("Daño severo")
+        severidad = "Grave"
+    elif laplacian_var < 80:
+        daños.append("Abolladura")
+        severidad = "Moderada"
+    else:
+        daños.append("Rayones leves")
+
+    edges = cv2.Canny(gray, 50, 150)
+    if np.mean(edges) > 60:
+        daños.append("Cristal roto")
+        severidad = "Grave"
+
+    return daños, severidad
+
+
+def _evaluar_sin_yolo(img):
+    """Modo rápido (sin YOLO): sólo varianza del Laplaciano de la imagen completa"""
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
+
+    if laplacian_var < 50:
+        return "Daño severo detectado", "Grave"
+    elif laplacian_var < 80:
+        return "Abolladura detectada", "Moderada"
+    else:
+        return "Sin daños detectados", "Perfecto"
+
+
+def triaje_rapido(img):
+    """Primer paso de la cascada sobre una versión reducida del frame.
+
+    Devuelve (texto de daños, severidad) si el caso es claro (foto inservible,
+    sin vehículo o auto limpio) o None si hay que escalar al modelo completo."""
+    h, w = img.shape[:2]
+    if w > TRIAGE_WIDTH:
+        img = cv2.resize(img, (TRIAGE_WIDTH, max(1, int(h * TRIAGE_WIDTH / w))), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+
+    brillo = float(gray.mean())
+    saturados = float(np.mean((gray < 8) | (gray > 247)))
+    if brillo < TRIAGE_DARK or brillo > TRIAGE_BRIGHT or saturados > TRIAGE_CLIPPED:
+        return "Foto sub/sobreexpuesta: repetir toma", "Desconocida"
+
+    nitidez = cv2.Laplacian(gray, cv2.CV_64F).var()
+    if nitidez < TRIAGE_BLUR_VAR:
+        return "Foto borrosa: repetir toma", "Desconocida"
+
+    bordes = float(np.mean(cv2.Canny(gray, 50, 150) > 0))
+    if bordes < TRIAGE_EMPTY_EDGES:
+        return "Sin vehículo visible en la foto", "Desconocida"
+    if nitidez >= TRIAGE_CLEAN_VAR and bordes < TRIAGE_CLEAN_EDGES:
+        return "Sin daños visibles", "Perfecto"
+    return None
+
+
+# Contadores de la cascada en este proceso
+CASCADE_STATS = {"triaje": 0, "escaladas": 0}
+
+
+def cargar_modelo_daños():
+    """Carga el modelo de daños para los tiles, si está configurado (una sola vez)"""
+    global damage_model, DAMAGE_MODEL_PATH
+    if damage_model is None and DAMAGE_MODEL_PATH:
+        try:
+            from ultralytics import YOLO
+            damage_model = YOLO(DAMAGE_MODEL_PATH)
+        except Exception as e:
+            logger.error(f"No se pudo cargar el modelo de daños {DAMAGE_MODEL_PATH}: {e}")
+            DAMAGE_MODEL_PATH = ""
+    return damage_model
+
+
+def _tiles(ancho, alto, tile=TILE_SIZE, overlap=TILE_OVERLAP):
+    """Ventanas (x1, y1, x2, y2) solapadas que cubren un área de ancho x alto"""
+    paso = max(1, int(tile * (1 - overlap)))
+
+    def posiciones(total):
+        if total <= tile:
+            return [0]
+        pos = list(range(0, total - tile, paso))
+        return pos + [total - tile]
+
+    return [(x, y, min(x + tile, ancho), min(y + tile, alto))
+            for y in posiciones(alto) for x in posiciones(ancho)]
+
+
+def nms(cajas, scores, iou_threshold=TILE_NMS_IOU):
+    """Supresión de no-máximos; devuelve los índices conservados"""
+    if not cajas:
+        return []
+    rects = [[int(x1), int(y1), int(x2 - x1), int(y2 - y1)] for x1, y1, x2, y2 in cajas]
+    keep = cv2.dnn.NMSBoxes(rects, [float(s) for s in scores], 0.0, iou_threshold)
+    return sorted(int(i) for i in np.array(keep).flatten())
+
+
+def _evaluar_por_tiles(img, box):
+    """Evalúa un auto a resolución completa en tiles solapados.
+
+    Devuelve (daños, severidad, zonas); cada zona es {"box", "conf", "daño",
+    "severidad"} en coordenadas de la imagen, ya fusionadas con NMS entre tiles."""
+    x1, y1, x2, y2 = box
+    crop = img[y1:y2, x1:x2]
+    escala = 1.0
+    # Acotar el trabajo: si el auto necesitaría más de TILE_MAX tiles, reducirlo
+    while len(_tiles(int(crop.shape[1] * escala), int(crop.shape[0] * escala))) > TILE_MAX:
+        escala *= 0.8
+    if escala < 1.0:
+        crop = cv2.resize(crop, (int(crop.shape[1] * escala), int(crop.shape[0] * escala)), interpolation=cv2.INTER_AREA)
+    ventanas = _tiles(crop.shape[1], crop.shape[0])
+    recortes = [crop[ty1:ty2, tx1:tx2] for tx1, ty1, tx2, ty2 in ventanas]
+
+    cajas, scores, etiquetas = [], [], []
+
+    def a_imagen(tx1, ty1, bx1, by1, bx2, by2):
+        return (x1 + int((tx1 + bx1) / escala), y1 + int((ty1 + by1) / escala),
+                x1 + int((tx1 + bx2) / escala), y1 + int((ty1 + by2) / escala))
+
+    modelo = cargar_modelo_daños()
+    for i in range(0, len(recortes), TILE_BATCH):
+        resultados = modelo(recortes[i:i + TILE_BATCH], imgsz=TILE_SIZE, conf=0.25, verbose=False)
+        for (tx1, ty1, _, _), r in zip(ventanas[i:i + TILE_BATCH], resultados):
+            for b in r.boxes:
+                cajas.append(a_imagen(tx1, ty1, *map(float, b.xyxy[0])))
+                scores.append(float(b.conf[0]))
+                etiquetas.append(modelo.names.get(int(b.cls[0]), "daño"))
+
+    zonas = []
+    # NMS por tipo de daño: los tiles solapados ven la misma zona varias veces
+    for etiqueta in sorted(set(etiquetas)):
+        idx = [i for i, e in enumerate(etiquetas) if e == etiqueta]
+        for k in nms([cajas[i] for i in idx], [scores[i] for i in idx]):
+            i = idx[k]
+            zonas.append({"box": cajas[i], "conf": scores[i], "daño": etiqueta,
+                          "severidad": "Grave" if scores[i] > 0.6 else "Moderada"})
+
+    severidad = "Perfecto"
+    for z in zonas:
+        severidad = peor_severidad(severidad, z["severidad"])
+    daños = sorted({z["daño"] for z in zonas}) or ["Sin daños visibles"]
+    return daños, severidad, zonas
+
+
+def _detecciones_de_resultado(img, r, modelo):
+    """Convierte un resultado de YOLO en detecciones de autos evaluadas"""
+    detecciones = []
+    # Foto de alta resolución: el auto se evalúa por tiles en lugar de como un solo recorte
+    por_tiles = TILED_MODE and max(img.shape[:2]) >= TILED_MIN_SIDE and cargar_modelo_daños() is not None
+    for box in r.boxes:
+        cls = int(box.cls[0])
+        conf = float(box.conf[0])
+        label = modelo.names.get(cls, "unknown")
+
+        if label == "car" and conf > 0.6:
+            x1, y1, x2, y2 = map(int, box.xyxy[0])
+            crop = img[y1:y2, x1:x2]
+
+            if crop.size == 0:
+                continue
+
+            det = {"box": (x1, y1, x2, y2), "conf": conf}
+            if por_tiles:
+                det["daños"], det["severidad"], det["zonas"] = _evaluar_por_tiles(img, (x1, y1, x2, y2))
+            else:
+                det["daños"], det["severidad"] = _evaluar_recorte(crop)
+            detecciones.append(det)
+    return detecciones
+
+
+def _detectar_sin_yolo(img):
+    h, w = img.shape[:2]
+    texto, severidad = _evaluar_sin_yolo(img)
+    daños = [] if severidad == "Perfecto" else [texto]
+    return [{"box": (0, 0, w, h), "conf": 1.0, "daños": daños, "severidad": severidad}]
+
+
+def detectar_vehiculos_lote(imgs):
+    """Detección local de un lote de frames en una sola llamada al modelo.
+    Devuelve una lista de detecciones por frame (ver detectar_vehiculos)."""
+    if not YOLO_AVAILABLE:
+        return [_detectar_sin_yolo(img) for img in imgs]
+    imgs = list(imgs)
+    modelo = model  # una sola referencia: un cambio en caliente no parte el lote
+    t0 = time.perf_counter()
+    detecciones = _inferir(modelo, imgs)
+    registro.observar(imgs, detecciones, time.perf_counter() - t0)
+    return detecciones
+
+
+def _inferir(modelo, imgs):
+    detecciones = []
+    for i in range(0, len(imgs), INFERENCE_BATCH):
+        lote = imgs[i:i + INFERENCE_BATCH]
+        results = modelo(lote, conf=0.4, imgsz=INFERENCE_IMGSZ, verbose=False)
+        detecciones.extend(_detecciones_de_resultado(img, r, modelo) for img, r in zip(lote, results))
+    return detecciones
+
+
+def resumir_detecciones(img, detecciones):
+    """(texto de daños, severidad) de un frame a partir de sus detecciones"""
+    if not YOLO_AVAILABLE:
+        return _evaluar_sin_yolo(img)
+
+    daños = []
+    severidad = "Perfecto"
+    for det in detecciones:
+        daños.extend(det["daños"])
+        severidad = peor_severidad(severidad, det["severidad"])
+
+    if not daños:
+        daños = ["Sin daños visibles"]
+        severidad = "Perfecto"
+
+    return " | ".join(set(daños)), severidad
+
+
+# REGISTRO DE MODELOS: CAMBIO EN CALIENTE Y EVALUACIÓN EN SOMBRA
+
+def _iou(a, b):
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _severidad_de(detecciones):
+    severidad = "Perfecto"
+    for det in detecciones:
+        severidad = peor_severidad(severidad, det["severidad"])
+    return severidad
+
+
+def comparar_detecciones(a, b):
+    """Acuerdo entre las detecciones de un frame con dos modelos: (misma
+    severidad, mismo número de autos, IoU medio de las cajas emparejadas o
+    None si alguno no vio ningún auto)"""
+    libres = list(b)
+    ious = []
+    for det in sorted(a, key=lambda d: d["conf"], reverse=True):
+        if not libres:
+            break
+        pareja = max(libres, key=lambda d: _iou(det["box"], d["box"]))
+        ious.append(_iou(det["box"], pareja["box"]))
+        libres.remove(pareja)
+    return (_severidad_de(a) == _severidad_de(b), len(a) == len(b),
+            sum(ious) / len(ious) if ious else None)
+
+
+def _percentil(valores, p):
+    orden = sorted(valores)
+    return round(orden[min(len(orden) - 1, int(p * len(orden)))], 1) if orden else None
+
+
+class ModelRegistry:
+    """Modelo activo del proceso y, opcionalmente, un candidato en sombra.
+
+    - cargar(ruta) abre y calienta los pesos en un hilo aparte y los activa de
+      un golpe (las inferencias en curso terminan con el modelo anterior)
+    - cargar(ruta, sombra=True) los deja como candidato: una fracción
+      `muestra` de los lotes se repite con él en otro hilo, fuera del camino
+      de la respuesta, y se acumulan latencias (ms por frame) y acuerdo de
+      resultados con el activo; promover() lo convierte en el activo
+    - vigilar() aplica MODEL_CONFIG_PATH cuando cambia, p. ej.
+      {"activo": "yolov8s.pt", "sombra": "candidato.pt", "muestra": 0.2}
+
+    La latencia en sombra se mide compitiendo por la CPU con el activo, así
+    que es una cota pesimista."""
+
+    def __init__(self, muestra=SHADOW_SAMPLE):
+        self.activo = None
+        self.muestra = muestra
+        self._sombra = None  # (modelo, ruta)
+        self._lock = threading.Lock()
+        self._cargas = ThreadPoolExecutor(max_workers=1, thread_name_prefix="modelos")
+        self._pool_sombra = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sombra")
+        self._pendientes = 0
+        self._config_mtime = None     # versión de models.json ya aplicada
+        self._config_en_curso = None  # versión cuyas cargas siguen en marcha
+        self._vigilante = None
+        self._reiniciar_stats()
+
+    def _reiniciar_stats(self):
+        self.stats = {"frames": 0, "lotes": 0, "descartados": 0, "errores": 0,
+                      "misma_severidad": 0, "mismos_autos": 0, "iou_total": 0.0, "iou_frames": 0}
+        self._lat_activo = deque(maxlen=SHADOW_WINDOW)
+        self._lat_sombra = deque(maxlen=SHADOW_WINDOW)
+
+    @property
+    def sombra(self):
+        sombra = self._sombra
+        return sombra[1] if sombra else None
+
+    def cargar(self, ruta, sombra=False):
+        """Carga los pesos en segundo plano; devuelve un Future con la ruta. Si
+        fallan, el modelo activo (o la sombra anterior) sigue igual"""
+        return self._cargas.submit(self._cargar, ruta, sombra)
+
+    def _cargar(self, ruta, sombra):
+        global model, YOLO_AVAILABLE
+        try:
+            nuevo = _abrir_modelo(ruta)
+            # Primera inferencia (reserva de memoria, fusión de capas) antes de recibir tráfico
+            nuevo(np.zeros((INFERENCE_IMGSZ, INFERENCE_IMGSZ, 3), dtype=np.uint8), imgsz=INFERENCE_IMGSZ, verbose=False)
+        except Exception as e:
+            logger.error(f"No se pudo cargar el modelo {ruta}: {e}")
+            raise
+        with self._lock:
+            if sombra:
+                self._sombra = (nuevo, ruta)
+                self._reiniciar_stats()
+            else:
+                model = nuevo
+                YOLO_AVAILABLE = True
+                self.activo = ruta
+        logger.info(f"Modelo {ruta} {'en sombra' if sombra else 'activo'}")
+        return ruta
+
+    def promover(self):
+        """La sombra pasa a ser el modelo activo. Devuelve su ruta (None si no hay)"""
+        global model, YOLO_AVAILABLE
+        with self._lock:
+            if self._sombra is None:
+                return None
+            model, self.activo = self._sombra
+            YOLO_AVAILABLE = True
+            self._sombra = None
+        logger.info(f"Modelo {self.activo} promovido a activo")
+        return self.activo
+
+    def retirar_sombra(self):
+        with self._lock:
+            self._sombra = None
+
+    def observar(self, imgs, detecciones, segundos):
+        """Tras una inferencia del activo: con probabilidad `muestra` encola el
+        mismo lote para la sombra"""
+        sombra = self._sombra
+        if sombra is None or not imgs or random.random() >= self.muestra:
+            return
+        with self._lock:
+            if self._pendientes >= SHADOW_MAX_PENDING:
+                self.stats["descartados"] += 1
+                return
+            self._pendientes += 1
+        # Copias: los frames pueden vivir en memoria compartida que se libera al responder
+        copias = [img.copy() for img in imgs]
+        self._pool_sombra.submit(self._comparar, sombra, copias, detecciones, segundos)
+
+    def _comparar(self, sombra, imgs, detecciones, segundos):
+        try:
+            t0 = time.perf_counter()
+            otras = _inferir(sombra[0], imgs)
+            segundos_sombra = time.perf_counter() - t0
+        except Exception as e:
+            logger.warning(f"Error en el modelo en sombra {sombra[1]}: {e}", extra={"sample": "sombra_error"})
+            with self._lock:
+                self._pendientes -= 1
+                self.stats["errores"] += 1
+            return
+        with self._lock:
+            self._pendientes -= 1
+            if self._sombra is not sombra:
+                return  # retirada o reemplazada mientras tanto
+            n = len(imgs)
+            self._lat_activo.append(segundos * 1000 / n)
+            self._lat_sombra.append(segundos_sombra * 1000 / n)
+            self.stats["lotes"] += 1
+            for a, b in zip(detecciones, otras):
+                misma_severidad, mismos_autos, iou = comparar_detecciones(a, b)
+                self.stats["frames"] += 1
+                self.stats["misma_severidad"] += misma_severidad
+                self.stats["mismos_autos"] += mismos_autos
+                if iou is not None:
+                    self.stats["iou_total"] += iou
+                    self.stats["iou_frames"] += 1
+            resumir = self.stats["frames"] // SHADOW_LOG_EVERY != (self.stats["frames"] - n) // SHADOW_LOG_EVERY
+        if resumir:
+            logger.info(f"Sombra {sombra[1]} vs {self.activo}: {json.dumps(self.estadisticas(), ensure_ascii=False)}")
+
+    def estadisticas(self):
+        with self._lock:
+            st = dict(self.stats)
+            lat_activo, lat_sombra = list(self._lat_activo), list(self._lat_sombra)
+        frames = st["frames"]
+        return {
+            "activo": self.activo,
+            "sombra": self.sombra,
+            "muestra": self.muestra,
+            "frames": frames,
+            "lotes": st["lotes"],
+            "descartados": st["descartados"],
+            "errores": st["errores"],
+            "acuerdo_severidad": round(st["misma_severidad"] / frames, 3) if frames else None,
+            "acuerdo_autos": round(st["mismos_autos"] / frames, 3) if frames else None,
+            "iou_medio": round(st["iou_total"] / st["iou_frames"], 3) if st["iou_frames"] else None,
+            "latencia_activo_ms": {"p50": _percentil(lat_activo, 0.5), "p95": _percentil(lat_activo, 0.95)},
+            "latencia_sombra_ms": {"p50": _percentil(lat_sombra, 0.5), "p95": _percentil(lat_sombra, 0.95)},
+        }
+
+    def aplicar_config(self, path=None):
+        """Aplica MODEL_CONFIG_PATH si cambió desde la última vez. Devuelve los
+        Futures de las cargas lanzadas. La versión del archivo sólo se da por
+        aplicada cuando todas sus cargas terminan bien; si alguna falla se
+        reintenta en la siguiente comprobación"""
+        path = path or MODEL_CONFIG_PATH
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return []
+        if mtime in (self._config_mtime, self._config_en_curso):
+            return []
+        try:
+            with open(path, encoding="utf-8") as f:
+                config = json.load(f)
+            muestra = min(1.0, max(0.0, float(config.get("muestra", self.muestra))))
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            logger.warning(f"Configuración de modelos inválida en {path}: {e}", extra={"sample": "models_json"})
+            return []
+        self.muestra = muestra
+        futuros = []
+        if config.get("activo") and config["activo"] != self.activo:
+            futuros.append(self.cargar(config["activo"]))
+        if config.get("sombra") and config["sombra"] != self.sombra:
+            futuros.append(self.cargar(config["sombra"], sombra=True))
+        elif "sombra" in config and not config["sombra"]:
+            self.retirar_sombra()
+        if not futuros:
+            self._config_mtime = mtime
+            return futuros
+
+        self._config_en_curso = mtime
+        pendientes = {"n": len(futuros), "fallo": False}
+
+        def terminada(fut):
+            with self._lock:
+                pendientes["n"] -= 1
+                pendientes["fallo"] |= fut.exception() is not None
+                if pendientes["n"]:
+                    return
+                self._config_en_curso = None
+                if not pendientes["fallo"]:
+                    self._config_mtime = mtime
+        for fut in futuros:
+            fut.add_done_callback(terminada)
+        return futuros
+
+    def vigilar(self, intervalo=MODEL_WATCH_INTERVAL):
+        """Hilo que aplica MODEL_CONFIG_PATH al cambiar (idempotente)"""
+        with self._lock:
+            if self._vigilante is not None:
+                return
+            self._vigilante = threading.Thread(target=self._vigilar, args=(intervalo,), daemon=True, name="modelos-config")
+        self._vigilante.start()
+
+    def _vigilar(self, intervalo):
+        while True:
+            self.aplicar_config()
+            time.sleep(intervalo)
+
+
+registro = ModelRegistry()
+
+
+def _cliente():
+    from inference_server import get_client
+    return get_client(INFERENCE_SOCKET)
+
+
+def _servidor_caido(e):
+    """Decide qué hacer si el servidor de inferencia no responde.
+    Devuelve True si se debe continuar con el modelo local."""
+    if not LOCAL_FALLBACK:
+        return False
+    logger.warning(f"Servidor de inferencia no disponible ({e}), usando modelo local", extra={"sample": "servidor_caido"})
+    cargar_modelo()
+    return True
+
+
+def detectar_vehiculos(img):
+    """Detecta autos en un frame ya decodificado y evalúa cada uno.
+
+    Devuelve una lista de dicts {"box": (x1, y1, x2, y2), "conf", "daños", "severidad"}.
+    Sin YOLO se devuelve una sola detección que cubre el frame completo."""
+    if INFERENCE_SOCKET and not _modelo_cargado:
+        try:
+            return _cliente().detectar_frame(img)["detecciones"]
+        except (OSError, ConnectionError) as e:
+            if not _servidor_caido(e):
+                raise
+    return detectar_vehiculos_lote([img])[0]
+
+
+# Colores BGR por severidad (mismos que la UI: verde, naranja, rojo)
+SEVERIDAD_COLORES = {
+    "Perfecto": (80, 175, 76),
+    "Moderada": (38, 167, 255),
+    "Grave": (82, 82, 255),
+}
+
+
+def dibujar_detecciones(img, detecciones):
+    """Dibuja cajas y etiquetas de detectar_vehiculos sobre una copia del frame"""
+    out = img.copy()
+    for det in detecciones:
+        x1, y1, x2, y2 = (int(v) for v in det["box"])
+        color = SEVERIDAD_COLORES.get(det["severidad"], (200, 200, 200))
+        cv2.rectangle(out, (x1, y1), (x2, y2), color, 3)
+        texto = f"{det['severidad']}: {', '.join(det['daños']) or 'OK'}"
+        (tw, th), _ = cv2.getTextSize(texto, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
+        ty = max(th + 6, y1)
+        cv2.rectangle(out, (x1, ty - th - 6), (x1 + tw + 6, ty), color, -1)
+        cv2.putText(out, texto, (x1 + 3, ty - 4), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+        # Zonas de daño localizadas por tiles
+        for zona in det.get("zonas", []):
+            zx1, zy1, zx2, zy2 = (int(v) for v in zona["box"])
+            cv2.rectangle(out, (zx1, zy1), (zx2, zy2), SEVERIDAD_COLORES.get(zona["severidad"], color), 2)
+    return out
+
+
+def _triaje_cascada(img):
+    """Triaje si la cascada está activa y hay modelo al que escalar (None = escalar)"""
+    if not (CASCADE_MODE and YOLO_AVAILABLE):
+        return None
+    r = triaje_rapido(img)
+    CASCADE_STATS["triaje" if r else "escaladas"] += 1
+    return r
+
+
+def analizar_imagen(img, cascada=True):
+    """Detección de daños sobre un frame ya decodificado (BGR).
+    Devuelve (texto de daños, severidad). Con `cascada` los casos claros se
+    resuelven con triaje_rapido sin pasar por el modelo."""
+    if cascada:
+        r = _triaje_cascada(img)
+        if r:
+            return r
+
+    if INFERENCE_SOCKET and not _modelo_cargado:
+        try:
+            r = _cliente().detectar_frame(img)
+            return r["daños"], r["severidad"]
+        except (OSError, ConnectionError) as e:
+            if not _servidor_caido(e):
+                return f"Error: servidor de inferencia no disponible ({e})", "Desconocida"
+
+    if not YOLO_AVAILABLE:
+        return _evaluar_sin_yolo(img)
+    return resumir_detecciones(img, detectar_vehiculos_lote([img])[0])
+
+
+def detectar_daños(ruta_foto, cascada=True):
+    """Detección de daños con YOLO y OpenCV"""
+    if cascada and CASCADE_MODE and YOLO_AVAILABLE:
+        # El triaje se hace sobre una decodificación a 1/4: las fotos claras
+        # no llegan a decodificarse a resolución completa
+        reducida = cv2.imread(ruta_foto, cv2.IMREAD_REDUCED_COLOR_4)
+        if reducida is not None:
+            r = _triaje_cascada(reducida)
+            if r:
+                return r
+
+    if INFERENCE_SOCKET and not _modelo_cargado:
+        try:
+            r = _cliente().detectar_archivo(ruta_foto)
+            return r["daños"], r["severidad"]
+        except (OSError, ConnectionError) as e:
+            if not _servidor_caido(e):
+                return f"Error: servidor de inferencia no disponible ({e})", "Desconocida"
+
+    try:
+        img = cv2.imread(ruta_foto)
+        if img is None:
+            return "Error: No se pudo cargar la imagen", "Desconocida"
+
+        return analizar_imagen(img, cascada=False)
+
+    except Exception as e:
+        return f"Error: {str(e)}", "Desconocida"
+
+
+# Evidencia anotada de los reportes: se dibuja una sola vez al analizar
+ANNOTATED_MAX_SIDE = 1280
+ANNOTATED_QUALITY = 75
+
+
+def codificar_anotada(img, detecciones, max_side=ANNOTATED_MAX_SIDE, calidad=ANNOTATED_QUALITY):
+    """Dibuja las detecciones y devuelve la imagen reducida en WebP (bytes)"""
+    out = dibujar_detecciones(img, detecciones)
+    h, w = out.shape[:2]
+    escala = max_side / max(h, w)
+    if escala < 1:
+        out = cv2.resize(out, (int(w * escala), int(h * escala)), interpolation=cv2.INTER_AREA)
+    ok, buf = cv2.imencode(".webp", out, [cv2.IMWRITE_WEBP_QUALITY, calidad])
+    return buf.tobytes() if ok else None
+
+
+def detectar_y_anotar(ruta_foto, cascada=True):
+    """Como detectar_daños, pero con el frame aún decodificado dibuja también
+    las cajas (en el mismo worker que infiere). Devuelve (daños, severidad,
+    anotada) con `anotada` en WebP, o None si no hay cajas que dibujar
+    (resuelta por el triaje, sin YOLO o error)"""
+    if cascada and CASCADE_MODE and YOLO_AVAILABLE:
+        reducida = cv2.imread(ruta_foto, cv2.IMREAD_REDUCED_COLOR_4)
+        if reducida is not None:
+            r = _triaje_cascada(reducida)
+            if r:
+                return r[0], r[1], None
+
+    try:
+        img = cv2.imread(ruta_foto)
+        if img is None:
+            return "Error: No se pudo cargar la imagen", "Desconocida", None
+        if not YOLO_AVAILABLE:
+            daños, severidad = _evaluar_sin_yolo(img)
+            return daños, severidad, None
+        detecciones = detectar_vehiculos(img)
+        daños, severidad = resumir_detecciones(img, detecciones)
+        return daños, severidad, codificar_anotada(img, detecciones)
+    except Exception as e:
+        return f"Error: {str(e)}", "Desconocida", None
+
+
+def extract_video_frames(video_path, num_frames=5):
+    """Extrae frames de un video para análisis (repartidos uniformemente).
+    Para decodificar directamente en memoria compartida ver frame_arena.frames_en_arena"""
+    frames = []
+    try:
+        cap = cv2.VideoCapture(video_path)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        
+        if total_frames < 1:
+            cap.release()
+            return frames
+
+        # Extraer frames distribuidos uniformemente
+        frame_indices = np.linspace(0, total_frames-1, num_frames, dtype=int)
+
+        for idx in frame_indices:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
+            ret, frame = cap.read()
+            if ret:
+                frames.append(frame)
+
+        cap.release()
+    except Exception as e:
+        logger.error(f"Error extrayendo frames de video: {e}")
+
+    return frames
+
+
+def iter_video_frames(video_path):
+    """Recorre un video de forma secuencial (sin seeks) devolviendo (idx, frame)"""
+    cap = cv2.VideoCapture(video_path)
+    try:
+        idx = 0
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield idx, frame
+            idx += 1
+    finally:
+        cap.release()
+
+
+cargar_config_hw()
+
+# Con servidor de inferencia el modelo vive en otro proceso; si no responde
+# al arrancar se carga aquí (LOCAL_FALLBACK) para no dejar la app sin detector.
+if INFERENCE_SOCKET:
+    try:
+        YOLO_AVAILABLE = _cliente().info()["yolo"]
+    except (OSError, ConnectionError) as e:
+        _servidor_caido(e)
+else:
+    cargar_modelo()
@@ -0,0 +1,283 @@
+# DESCARGA CONCURRENTE DE IMÁGENES POR URL
+"""
+Capa de descarga asyncio para analizar imágenes remotas:
+
+- Pool de conexiones HTTP keep-alive por host (http.client), único por proceso
+  (get_pool) y reutilizado entre descargas y entre llamadas.
+- Concurrencia acotada con un semáforo (MAX_CONCURRENT).
+- Límite de tamaño (MAX_BYTES): por Content-Length y contando bytes al leer.
+  Los cuerpos de redirecciones y 304 se descartan sólo hasta DISCARD_MAX_BYTES;
+  si son más grandes la conexión se cierra en lugar de leerlos.
+- El cuerpo se escribe en streaming al almacén direccionado por contenido (media_store).
+- Cache HTTP en disco: se revalida con If-None-Match / If-Modified-Since y un
+  304 reutiliza el archivo ya descargado.
+- Listas de URLs de exportaciones del DMS (CSV o texto) para análisis masivo.
+"""
+import asyncio
+import hashlib
+import http.client
+import json
+import os
+import re
+import threading
+from urllib.parse import urljoin, urlsplit
+
+import media_store
+
+MAX_CONCURRENT = 8
+MAX_BYTES = 25 * 1024 * 1024
+TIMEOUT = 20
+MAX_REDIRECTS = 5
+# Cuerpo máximo que se lee (y descarta) de una redirección o un 304 para reutilizar la conexión
+DISCARD_MAX_BYTES = 64 * 1024
+USER_AGENT = "ToyotaDamagePro/2025"
+
+CONTENT_TYPES = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/webp": ".webp",
+    "image/gif": ".gif",
+    "image/bmp": ".bmp",
+    "image/tiff": ".tiff",
+    "image/heic": ".heic",
+    "video/mp4": ".mp4",
+    "video/quicktime": ".mov",
+}
+
+URL_RE = re.compile(r"https?://[^\s,;\"'<>]+")
+
+
+class DownloadError(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Conexiones keep-alive reutilizables por (esquema, host, puerto)"""
+
+    def __init__(self, per_host=MAX_CONCURRENT, timeout=TIMEOUT):
+        self.per_host = per_host
+        self.timeout = timeout
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, scheme, host, port):
+        key = (scheme, host, port)
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+        cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        return cls(host, port, timeout=self.timeout)
+
+    def release(self, scheme, host, port, conn):
+        key = (scheme, host, port)
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self._lock:
+            for conns in self._idle.values():
+                for conn in conns:
+                    conn.close()
+            self._idle.clear()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Pool de conexiones compartido por todas las descargas del proceso"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+        return _pool
+
+
+def _descartar_cuerpo(resp, limite=DISCARD_MAX_BYTES):
+    """Lee y descarta el cuerpo de una respuesta que no interesa (redirección,
+    304). True si la conexión queda reutilizable; con un cuerpo de más de
+    `limite` bytes no se sigue leyendo y la conexión debe cerrarse"""
+    length = resp.getheader("Content-Length")
+    if length and length.isdigit() and int(length) > limite:
+        return False
+    leido = 0
+    while True:
+        chunk = resp.read(min(media_store.CHUNK_SIZE, limite + 1 - leido))
+        if not chunk:
+            return not resp.will_close
+        leido += len(chunk)
+        if leido > limite:
+            return False
+
+
+def _cache_dir():
+    return os.path.join(media_store.STORE_DIR, "http_cache")
+
+
+def _cache_file(url):
+    return os.path.join(_cache_dir(), hashlib.sha1(url.encode("utf-8")).hexdigest() + ".json")
+
+
+def _load_cache(url):
+    try:
+        with open(_cache_file(url), encoding="utf-8") as f:
+            entry = json.load(f)
+        if os.path.exists(entry.get("path", "")):
+            return entry
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _save_cache(url, entry):
+    os.makedirs(_cache_dir(), exist_ok=True)
+    tmp = _cache_file(url) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(entry, f)
+    os.replace(tmp, _cache_file(url))
+
+
+def _extension(url, content_type):
+    ext = CONTENT_TYPES.get((content_type or "").split(";")[0].strip().lower())
+    if ext:
+        return ext
+    ext = os.path.splitext(urlsplit(url).path)[1].lower()
+    return ext if 1 < len(ext) <= 5 else ""
+
+
+def _fetch(pool, url, max_bytes):
+    """Descarga bloqueante (se ejecuta en un hilo). Devuelve dict con path/sha256/cached"""
+    cached = _load_cache(url)
+    current = url
+    for _ in range(MAX_REDIRECTS + 1):
+        parts = urlsplit(current)
+        if parts.scheme not in ("http", "https"):
+            raise DownloadError(f"Esquema no soportado: {parts.scheme}")
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        target = parts.path or "/"
+        if parts.query:
+            target += "?" + parts.query
+
+        headers = {"User-Agent": USER_AGENT, "Accept": "image/*,video/*"}
+        if cached and current == url:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        conn = pool.acquire(parts.scheme, parts.hostname, port)
+        reusable = False
+        try:
+            try:
+                conn.request("GET", target, headers=headers)
+                resp = conn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # Conexión keep-alive cerrada por el servidor: reintentar con una nueva
+                conn.close()
+                conn.request("GET", target, headers=headers)
+                resp = conn.getresponse()
+
+            if resp.status in (301, 302, 303, 307, 308) and resp.getheader("Location"):
+                reusable = _descartar_cuerpo(resp)
+                current = urljoin(current, resp.getheader("Location"))
+                continue
+
+            if resp.status == 304 and cached:
+                reusable = _descartar_cuerpo(resp)
+                return {"url": url, "path": cached["path"], "sha256": cached["sha256"], "cached": True}
+
+            if resp.status != 200:
+                raise DownloadError(f"HTTP {resp.status} en {url}")
+
+            length = resp.getheader("Content-Length")
+            if length and length.isdigit() and int(length) > max_bytes:
+                raise DownloadError(f"Archivo demasiado grande ({int(length) // 1024} KB)")
+
+            digest = hashlib.sha256()
+            tmp = media_store.temp_path()
+            total = 0
+            try:
+                with open(tmp, "wb") as f:
+                    while True:
+                        chunk = resp.read(media_store.CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        total += len(chunk)
+                        if total > max_bytes:
+                            raise DownloadError(f"Archivo demasiado grande (> {max_bytes // 1024} KB)")
+                        digest.update(chunk)
+                        f.write(chunk)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+
+            reusable = not resp.will_close
+            sha = digest.hexdigest()
+            path = media_store.ingest_temp(tmp, sha, _extension(current, resp.getheader("Content-Type")))
+            # La cache apunta a este archivo: la compactación de evidencia no debe borrarlo
+            media_store.retener(path)
+            _save_cache(url, {
+                "etag": resp.getheader("ETag"),
+                "last_modified": resp.getheader("Last-Modified"),
+                "sha256": sha,
+                "path": path,
+            })
+            return {"url": url, "path": path, "sha256": sha, "cached": False}
+        finally:
+            if reusable:
+                pool.release(parts.scheme, parts.hostname, port, conn)
+            else:
+                conn.close()
+    raise DownloadError(f"Demasiadas redirecciones: {url}")
+
+
+async def descargar_todas(urls, max_concurrent=MAX_CONCURRENT, max_bytes=MAX_BYTES, pool=None):
+    """Descarga varias URLs en paralelo (acotado). Devuelve un resultado por URL, en orden.
+
+    Cada resultado es {"url", "path", "sha256", "cached"} o {"url", "error"}.
+    Sin `pool` se usa el del proceso (get_pool), así las conexiones keep-alive
+    sobreviven entre llamadas"""
+    pool = pool or get_pool()
+    sem = asyncio.Semaphore(max_concurrent)
+
+    async def one(url):
+        async with sem:
+            try:
+                return await asyncio.to_thread(_fetch, pool, url, max_bytes)
+            except Exception as e:
+                return {"url": url, "error": str(e)}
+
+    return await asyncio.gather(*(one(u) for u in urls))
+
+
+def descargar(url, max_bytes=MAX_BYTES):
+    """Versión síncrona para una sola URL (para handlers de la UI). Lanza DownloadError"""
+    result = asyncio.run(descargar_todas([url], max_concurrent=1, max_bytes=max_bytes))[0]
+    if "error" in result:
+        raise DownloadError(result["error"])
+    return result
+
+
+def descargar_lista(urls, max_concurrent=MAX_CONCURRENT):
+    """Versión síncrona para listas de URLs (análisis masivo)"""
+    return asyncio.run(descargar_todas(urls, max_concurrent=max_concurrent))
+
+
+def leer_lista_urls(path):
+    """Extrae las URLs http(s) de una exportación del DMS (CSV, TXT...), sin duplicados"""
+    urls = []
+    vistos = set()
+    with open(path, encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            for url in URL_RE.findall(line):
+                if url not in vistos:
+                    vistos.add(url)
+                    urls.append(url)
+    return urls
@@ -0,0 +1,292 @@
+# EVIDENCIA GESTIONADA (FOTOS Y VIDEOS DE LOS REPORTES)
+"""
+Al guardar un reporte, sus archivos (que suelen estar en
+tempfile.gettempdir()/toyota_uploads o en el Escritorio) se copian al almacén
+direccionado por contenido de media_store y el reporte guarda sus claves
+("<sha256>.<ext>") en foto_path en lugar de rutas absolutas.
+
+En segundo plano, un pool de EVIDENCE_WORKERS hilos genera la versión
+compacta de cada archivo junto al original:
+
+    fotos   <sha>.min.webp (o .min.avif) con lado mayor <= EVIDENCE_MAX_SIDE
+    videos  <sha>.proxy.mp4 a PROXY_HEIGHT px y PROXY_BITRATE (ffmpeg si está
+            instalado; si no, OpenCV sin audio)
+
+El original sólo se conserva si algún reporte que lo usa es Grave o si el
+archivo está retenido en media_store (p. ej. por la cache de descargas); en los
+demás casos se borra en cuanto existe la versión compacta.
+
+    store = get_evidence_store()
+    reporte_id = insert_report(..., ", ".join(media_list))
+    store.ingresar_reporte(reporte_id, media_list, severidad)   # copia, enlace y
+                                                                # transcodificación en el pool
+    ruta = store.resolver(clave)                      # mejor archivo disponible
+
+(ingresar() es la copia síncrona, para quien ya está fuera del hilo de la UI.)
+Hasta que termina la copia el reporte guarda las rutas originales, que
+resolver() también acepta.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import media_store
+from db_utils import upsert_evidence, fetch_evidence, update_evidence, update_report_foto, insert_report_annotations
+
+EVIDENCE_FORMAT = os.environ.get("TOYOTA_EVIDENCE_FORMAT", "webp")  # webp | avif
+EVIDENCE_QUALITY = int(os.environ.get("TOYOTA_EVIDENCE_QUALITY", "80"))
+EVIDENCE_MAX_SIDE = 2048
+EVIDENCE_WORKERS = int(os.environ.get("TOYOTA_EVIDENCE_WORKERS", "2"))
+PROXY_HEIGHT = 480
+PROXY_BITRATE = "600k"
+PROXY_FPS = 15
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+# Severidad cuyos originales se conservan además de la versión compacta
+KEEP_ORIGINALS = "Grave"
+
+logger = logging.getLogger(__name__)
+
+
+def es_video(clave):
+    return os.path.splitext(clave)[1].lower() in VIDEO_EXTENSIONS
+
+
+def ruta_en_almacen(nombre):
+    """Ruta de un archivo del almacén a partir de su nombre ('<sha><sufijo>')"""
+    return media_store.path_for(nombre[:64], nombre[64:])
+
+
+def _derivado(clave):
+    sha, ext = os.path.splitext(clave)
+    if ext.lower() in VIDEO_EXTENSIONS:
+        return media_store.path_for(sha, ".proxy.mp4")
+    return media_store.path_for(sha, ".min." + EVIDENCE_FORMAT)
+
+
+def copiar_al_almacen(ruta):
+    """Copia (hash y escritura en una pasada) y devuelve la clave '<sha>.<ext>'"""
+    ext = os.path.splitext(ruta)[1].lower()
+    h = hashlib.sha256()
+    tmp = media_store.temp_path()
+    with open(ruta, "rb") as src, open(tmp, "wb") as dst:
+        for chunk in iter(lambda: src.read(media_store.CHUNK_SIZE), b""):
+            h.update(chunk)
+            dst.write(chunk)
+    sha = h.hexdigest()
+    media_store.ingest_temp(tmp, sha, ext)
+    return sha + ext
+
+
+def guardar_bytes(datos, ext):
+    """Guarda un derivado ya codificado en memoria (p. ej. la evidencia anotada)
+    y devuelve su clave '<sha>.<ext>'"""
+    sha = hashlib.sha256(datos).hexdigest()
+    tmp = media_store.temp_path()
+    with open(tmp, "wb") as f:
+        f.write(datos)
+    media_store.ingest_temp(tmp, sha, ext)
+    return sha + ext
+
+
+def transcodificar_foto(origen, destino, formato=EVIDENCE_FORMAT, calidad=EVIDENCE_QUALITY, max_side=EVIDENCE_MAX_SIDE):
+    """Reescala y codifica a WebP/AVIF. Devuelve la ruta escrita (AVIF cae a
+    WebP si OpenCV no trae libavif)"""
+    import cv2
+    img = cv2.imread(origen, cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError(f"No se pudo leer {origen}")
+    h, w = img.shape[:2]
+    escala = max_side / max(h, w)
+    if escala < 1:
+        img = cv2.resize(img, (int(w * escala), int(h * escala)), interpolation=cv2.INTER_AREA)
+    if formato == "avif":
+        ok, buf = (cv2.imencode(".avif", img, [cv2.IMWRITE_AVIF_QUALITY, calidad])
+                   if hasattr(cv2, "IMWRITE_AVIF_QUALITY") else (False, None))
+        if ok:
+            return _escribir(destino, buf)
+        destino = os.path.splitext(destino)[0] + ".webp"
+    ok, buf = cv2.imencode(".webp", img, [cv2.IMWRITE_WEBP_QUALITY, calidad])
+    if not ok:
+        raise ValueError(f"No se pudo codificar {origen}")
+    return _escribir(destino, buf)
+
+
+def _escribir(destino, buf):
+    tmp = destino + ".part"
+    with open(tmp, "wb") as f:
+        f.write(buf.tobytes())
+    os.replace(tmp, destino)
+    return destino
+
+
+def proxy_video(origen, destino, altura=PROXY_HEIGHT, bitrate=PROXY_BITRATE, fps=PROXY_FPS):
+    """Proxy H.264 de baja tasa con ffmpeg; sin ffmpeg, MPEG-4 con OpenCV"""
+    tmp = destino + ".part.mp4"
+    ffmpeg_path = shutil.which("ffmpeg")
+    if ffmpeg_path:
+        cmd = [ffmpeg_path, "-y", "-loglevel", "error", "-i", origen,
+               "-vf", f"scale=-2:'min({altura},ih)'", "-r", str(fps),
+               "-c:v", "libx264", "-preset", "veryfast", "-b:v", bitrate, "-maxrate", bitrate, "-bufsize", bitrate,
+               "-c:a", "aac", "-b:a", "64k", "-movflags", "+faststart", tmp]
+        subprocess.run(cmd, check=True, capture_output=True, timeout=3600)
+    else:
+        import cv2
+        cap = cv2.VideoCapture(origen)
+        fps_origen = cap.get(cv2.CAP_PROP_FPS) or 30
+        paso = max(1, round(fps_origen / fps))
+        writer = None
+        i = 0
+        try:
+            while True:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                i += 1
+                if (i - 1) % paso:
+                    continue
+                h, w = frame.shape[:2]
+                if h > altura:
+                    frame = cv2.resize(frame, (int(w * altura / h) // 2 * 2, altura), interpolation=cv2.INTER_AREA)
+                if writer is None:
+                    writer = cv2.VideoWriter(tmp, cv2.VideoWriter_fourcc(*"mp4v"), fps_origen / paso,
+                                             (frame.shape[1], frame.shape[0]))
+                writer.write(frame)
+        finally:
+            cap.release()
+            if writer is not None:
+                writer.release()
+        if writer is None:
+            raise ValueError(f"No se pudo leer {origen}")
+    os.replace(tmp, destino)
+    return destino
+
+
+class EvidenceStore:
+    def __init__(self, workers=EVIDENCE_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="evidence")
+        self._lock = threading.Lock()
+        self._en_curso = {}  # clave -> Future
+
+    def ingresar(self, rutas):
+        """Copia los archivos al almacén y devuelve sus claves (en el mismo orden).
+        Las rutas que ya son claves del almacén se devuelven tal cual; si un
+        archivo no se puede copiar se conserva su ruta para no perder el reporte"""
+        claves = []
+        for ruta in rutas:
+            if not os.path.isabs(ruta) and self.resolver(ruta):
+                claves.append(ruta)
+                continue
+            try:
+                clave = copiar_al_almacen(ruta)
+            except OSError as e:
+                logger.warning(f"No se pudo copiar {ruta} al almacén de evidencia: {e}")
+                claves.append(ruta)
+                continue
+            upsert_evidence(clave, "video" if es_video(clave) else "foto", os.path.getsize(self.original(clave)))
+            claves.append(clave)
+        return claves
+
+    def ingresar_reporte(self, reporte_id, rutas, severidad, anotadas=()):
+        """Copia en el pool la evidencia de un reporte ya guardado con sus rutas
+        originales, y al terminar enlaza las claves: foto_path del reporte, sus
+        imágenes anotadas (`anotadas` = [(ruta, clave_anotada, severidad)]) y
+        la versión compacta de cada archivo. Devuelve un Future con las claves"""
+        return self._pool.submit(self._ingresar_reporte, reporte_id, list(rutas), severidad, list(anotadas))
+
+    def _ingresar_reporte(self, reporte_id, rutas, severidad, anotadas):
+        try:
+            claves = self.ingresar(rutas)
+            clave_de = dict(zip(rutas, claves))
+            update_report_foto(reporte_id, ", ".join(claves))
+            if anotadas:
+                insert_report_annotations(reporte_id, [(clave_de.get(r, r), an, sev) for r, an, sev in anotadas])
+            self.procesar(claves, severidad)
+            return claves
+        except Exception as e:
+            logger.error(f"No se pudo guardar la evidencia del reporte {reporte_id}: {e}")
+            raise
+
+    def procesar(self, claves, severidad):
+        """Encola la versión compacta de cada clave. Con severidad Grave se
+        marca el original para conservarlo"""
+        futuros = []
+        for clave in claves:
+            if fetch_evidence(clave) is None:
+                continue  # ruta sin copiar (ver ingresar)
+            if severidad == KEEP_ORIGINALS:
+                update_evidence(clave, conservar=1)
+            with self._lock:
+                futuro = self._en_curso.get(clave)
+                if futuro is None or futuro.done():
+                    futuro = self._pool.submit(self._transcodificar, clave)
+                    self._en_curso[clave] = futuro
+            futuros.append(futuro)
+        return futuros
+
+    def _transcodificar(self, clave):
+        fila = fetch_evidence(clave)
+        original = self.original(clave)
+        derivado = fila["derivado"] if fila else None
+        try:
+            if not derivado or not os.path.exists(ruta_en_almacen(derivado)):
+                if not os.path.exists(original):
+                    raise FileNotFoundError(original)
+                escrito = (proxy_video if es_video(clave) else transcodificar_foto)(original, _derivado(clave))
+                derivado = os.path.basename(escrito)
+                update_evidence(clave, derivado=derivado, bytes_derivado=os.path.getsize(escrito), estado="done")
+            # Releer: un reporte Grave pudo marcarlo mientras se transcodificaba
+            if (not fetch_evidence(clave)["conservar"] and not media_store.retenido(original)
+                    and os.path.exists(original)):
+                os.remove(original)
+            return derivado
+        except Exception as e:
+            update_evidence(clave, estado="error")
+            logger.warning(f"No se pudo transcodificar {clave}: {e}")
+            raise
+        finally:
+            with self._lock:
+                self._en_curso.pop(clave, None)
+
+    @staticmethod
+    def original(clave):
+        return ruta_en_almacen(clave)
+
+    def resolver(self, clave):
+        """Ruta del mejor archivo disponible para una clave: la versión compacta
+        o, mientras no exista (o si se conservó), el original. Las rutas absolutas
+        (evidencia aún sin copiar o que no se pudo copiar) se devuelven si existen.
+        None si no hay nada"""
+        if os.path.isabs(clave):
+            return clave if os.path.exists(clave) else None
+        fila = fetch_evidence(clave)
+        if fila and fila["derivado"]:
+            derivado = ruta_en_almacen(fila["derivado"])
+            if os.path.exists(derivado):
+                return derivado
+        original = self.original(clave)
+        return original if os.path.exists(original) else None
+
+    def pendientes(self):
+        with self._lock:
+            return sum(1 for f in self._en_curso.values() if not f.done())
+
+
+def claves_de(foto_path):
+    """Claves de evidencia de un foto_path (lista separada por comas)"""
+    return [p.strip() for p in (foto_path or "").split(",") if p.strip()]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_evidence_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = EvidenceStore()
+        return _store
@@ -0,0 +1,291 @@
+# ARENA DE FRAMES EN MEMORIA COMPARTIDA
+"""
+Pool de slots de multiprocessing.shared_memory para pasar frames decodificados
+entre procesos sin copiarlos.
+
+El decodificador escribe directamente en un slot (cap.read() sobre la vista del
+slot) y entre procesos sólo viaja un FrameRef de unos pocos bytes; quien lo
+recibe mapea el mismo buffer como ndarray. Los slots llevan conteo de
+referencias en un bloque de control compartido: vuelven al pool cuando el
+último usuario los libera.
+
+    arena = FrameArena(slots=8)
+    for ref in frames_en_arena(video, arena):
+        try: ... arena.view(ref) ...
+        finally: arena.release(ref)
+
+Los workers de analizar_videos_paralelo nunca cargan YOLO: con servidor de
+inferencia (TOYOTA_INFERENCE_SOCKET) le pasan cada slot por detectar_shm; sin
+servidor sólo decodifican y la inferencia se hace en el proceso principal.
+"""
+import logging
+import multiprocessing as mp
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+from multiprocessing import shared_memory
+
+from inference_server import attach_shm, get_client
+
+logger = logging.getLogger(__name__)
+
+# Tamaño por defecto de un slot: un frame 1080p BGR (analizar_videos_paralelo
+# dimensiona la suya según el video más grande)
+DEFAULT_SLOT_BYTES = 1920 * 1080 * 3
+DEFAULT_SLOTS = 8
+# Espera máxima por un slot libre (s); un consumidor colgado no bloquea para siempre
+ACQUIRE_TIMEOUT = float(os.environ.get("TOYOTA_ARENA_TIMEOUT", "30"))
+
+# Referencia serializable a un frame dentro de un slot
+FrameRef = namedtuple("FrameRef", ["slot", "shm_name", "shape", "dtype"])
+
+
+class ArenaFullError(Exception):
+    pass
+
+
+class FrameArena:
+    """Pool de slots en memoria compartida con conteo de referencias entre procesos.
+
+    El proceso que la crea es el dueño (unlink en close()); los workers la reciben
+    por herencia (initializer del pool) y sólo se adjuntan a los bloques."""
+
+    def __init__(self, slots=DEFAULT_SLOTS, slot_bytes=DEFAULT_SLOT_BYTES, ctx=None):
+        ctx = ctx or mp.get_context()
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self._owner = os.getpid()
+        self._lock = ctx.Lock()
+        self._free = ctx.Semaphore(slots)
+        self._control = shared_memory.SharedMemory(create=True, size=4 * slots)
+        self._blocks = [shared_memory.SharedMemory(create=True, size=slot_bytes) for _ in range(slots)]
+        self._names = [b.name for b in self._blocks]
+        self._refcounts()[:] = 0
+
+    # Al enviarse a otro proceso sólo viajan los nombres y las primitivas de sincronización
+    def __getstate__(self):
+        return {
+            "slots": self.slots, "slot_bytes": self.slot_bytes, "_owner": self._owner,
+            "_lock": self._lock, "_free": self._free,
+            "_control_name": self._control.name, "_names": self._names,
+        }
+
+    def __setstate__(self, state):
+        control_name = state.pop("_control_name")
+        self.__dict__.update(state)
+        self._control = attach_shm(control_name)
+        self._blocks = [attach_shm(n) for n in self._names]
+
+    def _refcounts(self):
+        return np.ndarray((self.slots,), dtype=np.int32, buffer=self._control.buf)
+
+    def acquire(self, timeout=ACQUIRE_TIMEOUT):
+        """Reserva un slot libre (refcount = 1). Espera hasta `timeout` segundos
+        (None = sin límite) y lanza ArenaFullError si no se libera ninguno"""
+        if not self._free.acquire(timeout=timeout):
+            raise ArenaFullError("No hay slots libres en la arena de frames")
+        with self._lock:
+            counts = self._refcounts()
+            for i in range(self.slots):
+                if counts[i] == 0:
+                    counts[i] = 1
+                    return i
+        self._free.release()
+        raise ArenaFullError("Arena inconsistente: semáforo libre sin slot libre")
+
+    def retain(self, slot):
+        with self._lock:
+            self._refcounts()[slot] += 1
+
+    def release(self, ref_or_slot):
+        """Suelta una referencia; el slot vuelve al pool al llegar a 0"""
+        slot = ref_or_slot.slot if isinstance(ref_or_slot, FrameRef) else ref_or_slot
+        with self._lock:
+            counts = self._refcounts()
+            if counts[slot] <= 0:
+                return
+            counts[slot] -= 1
+            libre = counts[slot] == 0
+        if libre:
+            self._free.release()
+
+    def buffer(self, slot, shape, dtype=np.uint8):
+        """Vista ndarray (sin copia) sobre un slot, para que el decodificador escriba en ella"""
+        dtype = np.dtype(dtype)
+        if int(np.prod(shape)) * dtype.itemsize > self.slot_bytes:
+            raise ValueError(f"Frame {shape} no cabe en un slot de {self.slot_bytes} bytes")
+        return np.ndarray(tuple(shape), dtype=dtype, buffer=self._blocks[slot].buf)
+
+    def ref(self, slot, shape, dtype=np.uint8):
+        return FrameRef(slot, self._names[slot], tuple(int(v) for v in shape), str(np.dtype(dtype)))
+
+    def put(self, frame, timeout=ACQUIRE_TIMEOUT):
+        """Copia un frame ya decodificado a un slot nuevo y devuelve su FrameRef"""
+        slot = self.acquire(timeout)
+        try:
+            self.buffer(slot, frame.shape, frame.dtype)[...] = frame
+        except Exception:
+            self.release(slot)
+            raise
+        return self.ref(slot, frame.shape, frame.dtype)
+
+    def view(self, ref):
+        """ndarray sin copia sobre el frame referenciado (válido hasta release)"""
+        return self.buffer(ref.slot, ref.shape, ref.dtype)
+
+    def in_use(self):
+        with self._lock:
+            return int((self._refcounts() > 0).sum())
+
+    def close(self):
+        for b in self._blocks:
+            b.close()
+        self._control.close()
+        if os.getpid() == self._owner:
+            for b in self._blocks:
+                b.unlink()
+            self._control.unlink()
+
+
+def frames_en_arena(video_path, arena, num_frames=5, timeout=ACQUIRE_TIMEOUT):
+    """Decodifica `num_frames` frames repartidos del video directamente en slots
+    de la arena. Genera FrameRef; cada uno debe liberarlo quien lo consume"""
+    cap = cv2.VideoCapture(video_path)
+    try:
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if total < 1:
+            return
+        shape = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), 3)
+        for idx in np.linspace(0, total - 1, num_frames, dtype=int):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
+            slot = arena.acquire(timeout)
+            try:
+                dst = arena.buffer(slot, shape)
+                ret, decoded = cap.read(dst)
+            except Exception:
+                arena.release(slot)
+                raise
+            if not ret:
+                arena.release(slot)
+                continue
+            if decoded is not dst:
+                # El decodificador devolvió otro tamaño/tipo: copiar al slot
+                arena.release(slot)
+                yield arena.put(decoded, timeout)
+            else:
+                yield arena.ref(slot, shape, dst.dtype)
+    finally:
+        cap.release()
+
+
+# ---------------------------------------------------------------- workers
+
+_worker_arena = None
+
+
+def _init_worker(arena):
+    # Sólo se adjunta a la arena: los workers no importan detector ni cargan YOLO
+    global _worker_arena
+    _worker_arena = arena
+
+
+def _decodificar_video(path, num_frames):
+    """Sin servidor: el worker sólo decodifica; los slots los libera el proceso principal"""
+    refs = []
+    try:
+        for ref in frames_en_arena(path, _worker_arena, num_frames):
+            refs.append(ref)
+    except Exception:
+        for ref in refs:
+            _worker_arena.release(ref)
+        raise
+    return refs
+
+
+def _analizar_video_servidor(path, num_frames, socket_path):
+    """Con servidor: cada slot se pasa al servidor de inferencia, que se adjunta al
+    mismo bloque (el frame no se copia ni se re-codifica), y se libera enseguida"""
+    cliente = get_client(socket_path)
+    resultados = []
+    for ref in frames_en_arena(path, _worker_arena, num_frames):
+        try:
+            r = cliente.detectar_shm(ref.shm_name, ref.shape, ref.dtype)
+            resultados.append((r["daños"], r["severidad"]))
+        finally:
+            _worker_arena.release(ref)
+    return resultados
+
+
+def _servidor_disponible():
+    """Ruta del servidor de inferencia si está configurado y responde, si no None"""
+    socket_path = os.environ.get("TOYOTA_INFERENCE_SOCKET", "")
+    if not socket_path:
+        return None
+    try:
+        get_client(socket_path).info()
+        return socket_path
+    except (OSError, ConnectionError) as e:
+        logger.warning(f"Servidor de inferencia no disponible ({e}): inferencia en el proceso principal")
+        return None
+
+
+def _inferir_refs(arena, refs, analizar):
+    try:
+        return [analizar(arena.view(ref)) for ref in refs]
+    finally:
+        for ref in refs:
+            arena.release(ref)
+
+
+def bytes_por_frame(video_paths):
+    """Bytes del frame BGR más grande entre los videos (mínimo DEFAULT_SLOT_BYTES)"""
+    mayor = DEFAULT_SLOT_BYTES
+    for path in video_paths:
+        cap = cv2.VideoCapture(path)
+        try:
+            w, h = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        finally:
+            cap.release()
+        mayor = max(mayor, w * h * 3)
+    return mayor
+
+
+def analizar_videos_paralelo(video_paths, num_frames=5, workers=None, arena=None, analizar=None):
+    """Analiza varios videos en paralelo: los procesos worker decodifican
+    directamente en la arena y la inferencia la hace el servidor de inferencia
+    (si hay) o `analizar(img)` en este proceso (por defecto detector.analizar_imagen).
+
+    Devuelve {video_path: [(daños, severidad), ...]} en el orden de los frames.
+    Los videos que fallan no aparecen en el resultado (se analizan en secuencia)."""
+    workers = workers or max(1, min(4, (os.cpu_count() or 2) - 1))
+    socket_path = _servidor_disponible()
+    if socket_path is None and analizar is None:
+        from detector import analizar_imagen as analizar
+    # spawn: el proceso principal tiene hilos (UI, scheduler) y fork no es seguro
+    ctx = mp.get_context("spawn")
+    propia = arena is None
+    # Sin servidor cada worker retiene los frames de un video entero hasta que se infieren
+    if propia:
+        arena = FrameArena(slots=max(DEFAULT_SLOTS, workers * (2 if socket_path else num_frames)),
+                           slot_bytes=bytes_por_frame(video_paths), ctx=ctx)
+    resultados = {}
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker, initargs=(arena,)) as pool:
+            if socket_path:
+                futuros = {pool.submit(_analizar_video_servidor, path, num_frames, socket_path): path for path in video_paths}
+            else:
+                futuros = {pool.submit(_decodificar_video, path, num_frames): path for path in video_paths}
+            for fut in as_completed(futuros):
+                path = futuros[fut]
+                try:
+                    r = fut.result()
+                    resultados[path] = r if socket_path else _inferir_refs(arena, r, analizar)
+                except Exception as e:
+                    logger.warning(f"Error analizando video {path} en paralelo: {e}")
+    finally:
+        if propia:
+            arena.close()
+    return resultados
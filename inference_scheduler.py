@@ -0,0 +1,185 @@
+# PLANIFICADOR DE INFERENCIA CON PRIORIDADES
+"""
+Todas las llamadas al detector de la app pasan por una cola única con tres
+clases de prioridad:
+
+    INTERACTIVE  una foto que el asesor está esperando (analyze_photo_from_url)
+    BATCH        galerías y videos (analyze_all_media)
+    BACKGROUND   trabajo descartable o re-procesado (frames del modo en vivo)
+
+El worker siempre atiende la clase más alta con trabajo pendiente y, dentro de
+una clase, alterna entre sesiones (round-robin) para que la galería de 20
+videos de un compañero no monopolice el modelo. Los lotes se encolan imagen a
+imagen, así que una foto interactiva espera como mucho la inferencia en curso.
+
+La cola está acotada (MAX_QUEUE). Si está llena, una petición de mayor
+prioridad desaloja la más reciente de la clase más baja; si no hay nada que
+desalojar se rechaza con SchedulerBusyError para que la UI pida reintentar.
+
+    resultado, espera_ms = get_scheduler().run(detector.detectar_daños, ruta,
+                                               priority=INTERACTIVE, session=page.session_id)
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+INTERACTIVE, BATCH, BACKGROUND = 0, 1, 2
+PRIORITY_NAMES = {INTERACTIVE: "interactiva", BATCH: "lote", BACKGROUND: "fondo"}
+
+# Peticiones en espera (todas las clases y sesiones)
+MAX_QUEUE = int(os.environ.get("TOYOTA_INFERENCE_QUEUE", "64"))
+# Hilos que ejecutan inferencias a la vez (el modelo YOLO es uno por proceso)
+INFERENCE_WORKERS = int(os.environ.get("TOYOTA_INFERENCE_WORKERS", "1"))
+# Esperas recientes por clase para calcular percentiles
+WAIT_SAMPLES = 500
+
+
+class SchedulerBusyError(Exception):
+    pass
+
+
+class Ticket:
+    """Una petición encolada; `future` entrega el resultado o la excepción"""
+
+    __slots__ = ("fn", "args", "kwargs", "priority", "session", "future", "enqueued", "started")
+
+    def __init__(self, fn, args, kwargs, priority, session):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.session = session
+        self.future = Future()
+        self.enqueued = time.monotonic()
+        self.started = None
+
+    @property
+    def wait_ms(self):
+        fin = self.started if self.started is not None else time.monotonic()
+        return (fin - self.enqueued) * 1000
+
+
+def _percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))]
+
+
+class InferenceScheduler:
+    def __init__(self, workers=INFERENCE_WORKERS, max_queue=MAX_QUEUE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._cond = threading.Condition()
+        # Por prioridad: sesión -> deque de tickets; el orden del OrderedDict es el turno
+        self._queues = {p: OrderedDict() for p in PRIORITY_NAMES}
+        self._size = 0
+        self._threads = []
+        self._waits = {p: deque(maxlen=WAIT_SAMPLES) for p in PRIORITY_NAMES}
+        self._shed = {p: 0 for p in PRIORITY_NAMES}
+        self._done = {p: 0 for p in PRIORITY_NAMES}
+
+    def submit(self, fn, *args, priority=BATCH, session=None, **kwargs):
+        ticket = Ticket(fn, args, kwargs, priority, session)
+        with self._cond:
+            if self._size >= self.max_queue and not self._desalojar(priority):
+                self._shed[priority] += 1
+                raise SchedulerBusyError(
+                    f"Cola de inferencia llena ({self._size} en espera), reintenta en unos segundos")
+            self._queues[priority].setdefault(session, deque()).append(ticket)
+            self._size += 1
+            if len(self._threads) < self.workers:
+                t = threading.Thread(target=self._worker, daemon=True, name=f"inference-{len(self._threads)}")
+                self._threads.append(t)
+                t.start()
+            self._cond.notify()
+        return ticket
+
+    def run(self, fn, *args, priority=BATCH, session=None, timeout=None, **kwargs):
+        """Encola y espera. Devuelve (resultado, espera en cola en ms)"""
+        ticket = self.submit(fn, *args, priority=priority, session=session, **kwargs)
+        return ticket.future.result(timeout), ticket.wait_ms
+
+    def _desalojar(self, priority):
+        """Con la cola llena: descarta la petición más reciente de la clase más baja
+        que `priority`. Devuelve True si liberó un hueco"""
+        for p in sorted(self._queues, reverse=True):
+            if p <= priority:
+                break
+            sesiones = self._queues[p]
+            if not sesiones:
+                continue
+            session = next(reversed(sesiones))
+            ticket = sesiones[session].pop()
+            if not sesiones[session]:
+                del sesiones[session]
+            self._size -= 1
+            self._shed[p] += 1
+            ticket.future.set_exception(SchedulerBusyError("Desplazada por una petición de mayor prioridad"))
+            return True
+        return False
+
+    def _siguiente(self):
+        for p in sorted(self._queues):
+            sesiones = self._queues[p]
+            if not sesiones:
+                continue
+            session, cola = next(iter(sesiones.items()))
+            ticket = cola.popleft()
+            if cola:
+                sesiones.move_to_end(session)  # turno de la siguiente sesión
+            else:
+                del sesiones[session]
+            self._size -= 1
+            return ticket
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while self._size == 0:
+                    self._cond.wait()
+                ticket = self._siguiente()
+                ticket.started = time.monotonic()
+                self._waits[ticket.priority].append(ticket.wait_ms)
+            if not ticket.future.set_running_or_notify_cancel():
+                continue
+            try:
+                ticket.future.set_result(ticket.fn(*ticket.args, **ticket.kwargs))
+            except Exception as e:
+                ticket.future.set_exception(e)
+            with self._cond:
+                self._done[ticket.priority] += 1
+
+    def queued(self):
+        with self._cond:
+            return self._size
+
+    def stats(self):
+        """Por clase: en cola, completadas, rechazadas y espera p50/p95 (ms)"""
+        with self._cond:
+            return {
+                PRIORITY_NAMES[p]: {
+                    "queued": sum(len(c) for c in self._queues[p].values()),
+                    "done": self._done[p],
+                    "shed": self._shed[p],
+                    "p50_wait_ms": round(_percentil(self._waits[p], 0.50), 1),
+                    "p95_wait_ms": round(_percentil(self._waits[p], 0.95), 1),
+                }
+                for p in PRIORITY_NAMES
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Planificador compartido por todas las sesiones del proceso"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = InferenceScheduler()
+        return _scheduler
@@ -0,0 +1,297 @@
+# SERVIDOR DE INFERENCIA COMPARTIDO (SOCKET UNIX)
+"""
+Un único proceso carga YOLO y atiende a todos los procesos de la UI por un
+socket Unix, en lugar de que cada servidor Flet cargue su propia copia del modelo.
+
+Protocolo (por mensaje): 4 bytes big-endian con la longitud de una cabecera JSON,
+la cabecera, y `len` bytes de payload.
+
+    {"op": "info"}                                      -> {"ok", "yolo", "batches", "requests", "modelos"}
+    {"op": "detect", "kind": "bytes", "len": N} + JPEG  -> {"ok", "detecciones", "daños", "severidad"}
+    {"op": "detect", "kind": "shm", "name", "shape", "dtype"}  (frame ya decodificado en memoria compartida)
+
+Las peticiones concurrentes de todos los clientes se agrupan en micro-lotes
+(hasta MAX_BATCH imágenes o BATCH_WINDOW_MS de espera) y se pasan al modelo
+en una sola llamada.
+
+El modelo se cambia sin reiniciar el servidor editando
+~/.toyota_damage_pro/models.json (ver detector.ModelRegistry); "modelos" en
+info trae las estadísticas de la evaluación en sombra.
+
+Uso: python inference_server.py [--socket /tmp/toyota_inference.sock]
+     export TOYOTA_INFERENCE_SOCKET=/tmp/toyota_inference.sock   (en los procesos de la UI)
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+DEFAULT_SOCKET = "/tmp/toyota_inference.sock"
+MAX_BATCH = 8
+BATCH_WINDOW_MS = 10
+CLIENT_TIMEOUT = 60
+
+_HEADER = struct.Struct(">I")
+
+logger = logging.getLogger(__name__)
+
+
+def _encode(header, payload=b""):
+    data = json.dumps(header).encode("utf-8")
+    return _HEADER.pack(len(data)) + data + payload
+
+
+def _recv_exact(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("Conexión cerrada por el servidor de inferencia")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def _serializar(detecciones):
+    salida = []
+    for d in detecciones:
+        det = {"box": [int(v) for v in d["box"]], "conf": float(d["conf"]), "daños": list(d["daños"]), "severidad": d["severidad"]}
+        if "zonas" in d:
+            det["zonas"] = [{"box": [int(v) for v in z["box"]], "conf": float(z["conf"]), "daño": z["daño"], "severidad": z["severidad"]}
+                            for z in d["zonas"]]
+        salida.append(det)
+    return salida
+
+
+def attach_shm(name):
+    """Abre un bloque de memoria compartida creado por otro proceso sin
+    registrarlo en el resource_tracker (si no, lo borraría al salir este proceso)"""
+    from multiprocessing import resource_tracker
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    return shm
+
+
+# ---------------------------------------------------------------- cliente
+
+class InferenceClient:
+    """Cliente síncrono; una conexión persistente por hilo"""
+
+    def __init__(self, path=DEFAULT_SOCKET, timeout=CLIENT_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _sock(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            self._local.sock = sock
+        return sock
+
+    def _close(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def request(self, header, payload=b""):
+        """Envía una petición y devuelve la cabecera de respuesta (reintenta una vez)"""
+        for intento in range(2):
+            try:
+                sock = self._sock()
+                sock.sendall(_encode(header, payload))
+                (n,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+                return json.loads(_recv_exact(sock, n))
+            except (OSError, ConnectionError):
+                self._close()
+                if intento:
+                    raise
+
+    def info(self):
+        return self.request({"op": "info"})
+
+    def detectar_bytes(self, data):
+        return self.request({"op": "detect", "kind": "bytes", "len": len(data)}, data)
+
+    def detectar_archivo(self, path):
+        with open(path, "rb") as f:
+            return self.detectar_bytes(f.read())
+
+    def detectar_shm(self, name, shape, dtype):
+        """Detección sobre un frame que ya está en memoria compartida (p. ej. un slot de FrameArena)"""
+        return self.request({"op": "detect", "kind": "shm", "name": name,
+                             "shape": list(shape), "dtype": str(dtype)})
+
+    def detectar_frame(self, img):
+        """Envía un frame decodificado por memoria compartida (sin re-codificar a JPEG)"""
+        shm = shared_memory.SharedMemory(create=True, size=max(1, img.nbytes))
+        try:
+            np.ndarray(img.shape, dtype=img.dtype, buffer=shm.buf)[...] = img
+            return self.detectar_shm(shm.name, img.shape, img.dtype)
+        finally:
+            shm.close()
+            shm.unlink()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(path=DEFAULT_SOCKET):
+    with _clients_lock:
+        if path not in _clients:
+            _clients[path] = InferenceClient(path)
+        return _clients[path]
+
+
+# ---------------------------------------------------------------- servidor
+
+class InferenceServer:
+    """Servidor asyncio con micro-batching de peticiones de varios clientes"""
+
+    def __init__(self, path=DEFAULT_SOCKET, max_batch=None, window_ms=BATCH_WINDOW_MS):
+        self.path = path
+        self.max_batch = max_batch
+        self.window = window_ms / 1000.0
+        self.queue = None
+        self.batches = 0
+        self.requests = 0
+
+    async def serve(self):
+        import detector
+        detector.cargar_modelo()
+        detector.vigilar_modelos()
+        # Sin --max-batch se usa el lote calibrado para esta máquina (autotune.py)
+        self.max_batch = self.max_batch or detector.INFERENCE_BATCH or MAX_BATCH
+        logger.info(f"Modelo cargado (YOLO: {detector.YOLO_AVAILABLE}, lote {self.max_batch})")
+
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.queue = asyncio.Queue()
+        server = await asyncio.start_unix_server(self._handle, path=self.path)
+        os.chmod(self.path, 0o660)
+        batcher = asyncio.create_task(self._batcher())
+        logger.info(f"Servidor de inferencia escuchando en {self.path}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    (n,) = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+                except asyncio.IncompleteReadError:
+                    break
+                header = json.loads(await reader.readexactly(n))
+                payload = await reader.readexactly(header.get("len", 0)) if header.get("kind") == "bytes" else b""
+                writer.write(_encode(await self._dispatch(header, payload)))
+                await writer.drain()
+        except (ConnectionError, ValueError) as e:
+            logger.warning(f"Cliente desconectado: {e}")
+        finally:
+            writer.close()
+
+    async def _dispatch(self, header, payload):
+        import detector
+        op = header.get("op")
+        if op == "info":
+            return {"ok": True, "yolo": detector.YOLO_AVAILABLE, "batches": self.batches, "requests": self.requests,
+                    "modelos": detector.registro.estadisticas()}
+        if op != "detect":
+            return {"ok": False, "error": f"Operación desconocida: {op}"}
+
+        shm = None
+        try:
+            if header.get("kind") == "shm":
+                shm = attach_shm(header["name"])
+                img = np.ndarray(tuple(header["shape"]), dtype=header["dtype"], buffer=shm.buf)
+            else:
+                img = cv2.imdecode(np.frombuffer(payload, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if img is None:
+                return {"ok": True, "detecciones": [], "daños": "Error: No se pudo cargar la imagen", "severidad": "Desconocida"}
+
+            fut = asyncio.get_running_loop().create_future()
+            await self.queue.put((img, fut))
+            detecciones, daños, severidad = await fut
+            return {"ok": True, "detecciones": _serializar(detecciones), "daños": daños, "severidad": severidad}
+        except Exception as e:
+            return {"ok": True, "detecciones": [], "daños": f"Error: {str(e)}", "severidad": "Desconocida"}
+        finally:
+            if shm is not None:
+                img = None
+                shm.close()
+
+    async def _batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            lote = [await self.queue.get()]
+            limite = time.monotonic() + self.window
+            while len(lote) < self.max_batch:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(await asyncio.wait_for(self.queue.get(), restante))
+                except asyncio.TimeoutError:
+                    break
+
+            imgs = [img for img, _ in lote]
+            try:
+                resultados = await loop.run_in_executor(None, _procesar_lote, imgs)
+                for (_, fut), res in zip(lote, resultados):
+                    if not fut.done():
+                        fut.set_result(res)
+            except Exception as e:
+                for _, fut in lote:
+                    if not fut.done():
+                        fut.set_exception(e)
+            self.batches += 1
+            self.requests += len(lote)
+            # Soltar las referencias a los frames (en memoria compartida) antes de esperar
+            lote = imgs = None
+
+
+def _procesar_lote(imgs):
+    import detector
+    lote = detector.detectar_vehiculos_lote(imgs)
+    return [(dets,) + detector.resumir_detecciones(img, dets) for img, dets in zip(imgs, lote)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor de inferencia Toyota Damage Pro")
+    parser.add_argument("--socket", default=os.environ.get("TOYOTA_INFERENCE_SOCKET", DEFAULT_SOCKET))
+    parser.add_argument("--max-batch", type=int, default=None)
+    parser.add_argument("--window-ms", type=float, default=BATCH_WINDOW_MS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    # El servidor siempre usa el modelo local
+    os.environ.pop("TOYOTA_INFERENCE_SOCKET", None)
+    server = InferenceServer(args.socket, args.max_batch, args.window_ms)
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# INSPECCIÓN EN VIVO CON LA CÁMARA DEL KIOSCO
+"""
+Modo en vivo sobre el servicio de captura persistente:
+
+- La cámara deja cada frame en una cola de tamaño 1 (LatestFrameQueue): si la
+  inferencia no ha consumido el anterior, se descarta. Nunca se acumula backlog,
+  así que la latencia cámara -> resultado queda acotada a ~1 inferencia.
+- El hilo de inferencia mide la latencia del modelo (media exponencial) y se
+  limita a un ciclo de trabajo, dejando CPU libre para la UI y la captura.
+- El preview anotado se envía a la página Flet a un máximo de PREVIEW_FPS.
+"""
+import base64
+import logging
+import threading
+import time
+
+import cv2
+
+from detector import detectar_vehiculos, dibujar_detecciones
+
+logger = logging.getLogger(__name__)
+
+# FPS máximo del preview enviado por websocket
+PREVIEW_FPS = 8
+# Fracción máxima del tiempo que el hilo de inferencia puede estar ocupado
+DUTY_CYCLE = 0.7
+# Resultados de frames más viejos que esto (s) no se muestran
+MAX_RESULT_AGE = 2.0
+# Ancho del JPEG del preview
+PREVIEW_WIDTH = 640
+
+
+class LatestFrameQueue:
+    """Cola acotada a un elemento: put() reemplaza el frame pendiente (y lo cuenta como descartado)"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self.dropped = 0
+
+    def put(self, frame, timestamp):
+        with self._cond:
+            if self._item is not None:
+                self.dropped += 1
+            self._item = (frame, timestamp)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Devuelve (frame, timestamp) o None si vence el timeout"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._item is not None, timeout=timeout):
+                return None
+            item, self._item = self._item, None
+            return item
+
+
+def frame_to_data_url(frame, width=PREVIEW_WIDTH, quality=70):
+    """Codifica un frame como JPEG reducido en data URL para ft.Image"""
+    h, w = frame.shape[:2]
+    if w > width:
+        frame = cv2.resize(frame, (width, int(h * width / w)), interpolation=cv2.INTER_AREA)
+    ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        return ""
+    return "data:image/jpeg;base64," + base64.b64encode(buf.tobytes()).decode("ascii")
+
+
+class LiveInspector:
+    """Bucle de inferencia en vivo con descarte de frames y ritmo adaptativo.
+
+    `on_preview(data_url, detecciones, stats)` se llama como mucho PREVIEW_FPS
+    veces por segundo desde un hilo de fondo."""
+
+    def __init__(self, service, on_preview, preview_fps=PREVIEW_FPS, duty_cycle=DUTY_CYCLE, detectar=None):
+        self.service = service
+        self.on_preview = on_preview
+        self.detectar = detectar or detectar_vehiculos
+        self.preview_interval = 1.0 / preview_fps
+        self.duty_cycle = duty_cycle
+        self.queue = LatestFrameQueue()
+        self._running = False
+        self._threads = []
+        self._lock = threading.Lock()
+        self._detecciones = []
+        self._result_ts = 0.0
+        self.latency_ms = 0.0
+        self.end_to_end_ms = 0.0
+        self.inferences = 0
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self.service.add_listener(self.queue.put)
+        self._threads = [
+            threading.Thread(target=self._infer_loop, name="live-infer", daemon=True),
+            threading.Thread(target=self._preview_loop, name="live-preview", daemon=True),
+        ]
+        for t in self._threads:
+            t.start()
+
+    def stop(self):
+        self._running = False
+        self.service.remove_listener(self.queue.put)
+        for t in self._threads:
+            t.join(timeout=2.0)
+        self._threads = []
+
+    @property
+    def running(self):
+        return self._running
+
+    def stats(self):
+        return {
+            "latency_ms": round(self.latency_ms, 1),
+            "end_to_end_ms": round(self.end_to_end_ms, 1),
+            "dropped": self.queue.dropped,
+            "inferences": self.inferences,
+        }
+
+    def _infer_loop(self):
+        while self._running:
+            item = self.queue.get(timeout=0.5)
+            if item is None:
+                continue
+            frame, ts = item
+
+            t0 = time.monotonic()
+            try:
+                detecciones = self.detectar(frame)
+            except Exception as e:
+                logger.warning(f"Error en inferencia en vivo: {e}", extra={"sample": "live_inferencia"})
+                continue
+            t1 = time.monotonic()
+
+            elapsed = t1 - t0
+            self.latency_ms = elapsed * 1000 if not self.inferences else 0.8 * self.latency_ms + 0.2 * elapsed * 1000
+            self.end_to_end_ms = (t1 - ts) * 1000
+            self.inferences += 1
+            with self._lock:
+                self._detecciones = detecciones
+                self._result_ts = ts
+
+            # Ritmo adaptativo: descansar lo necesario para no superar el ciclo de trabajo
+            descanso = elapsed * (1.0 / self.duty_cycle - 1.0)
+            if descanso > 0:
+                time.sleep(descanso)
+
+    def _preview_loop(self):
+        siguiente = time.monotonic()
+        while self._running:
+            ahora = time.monotonic()
+            if ahora < siguiente:
+                time.sleep(siguiente - ahora)
+            siguiente = time.monotonic() + self.preview_interval
+
+            frame = self.service.latest()
+            if frame is None:
+                continue
+            with self._lock:
+                detecciones = self._detecciones if time.monotonic() - self._result_ts <= MAX_RESULT_AGE else []
+            try:
+                self.on_preview(frame_to_data_url(dibujar_detecciones(frame, detecciones)), detecciones, self.stats())
+            except Exception as e:
+                logger.warning(f"Error enviando preview en vivo: {e}", extra={"sample": "live_preview"})
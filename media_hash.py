@@ -0,0 +1,114 @@
+# HASH PERCEPTUAL (dHash) PARA AGRUPAR FOTOS CASI IDÉNTICAS
+"""
+Índice de dHash de 64 bits sobre la galería actual. Las fotos cuyo hash
+difiere en pocos bits son la misma toma del mismo panel: se analiza una
+representante por grupo y su resultado se reutiliza para el resto.
+
+La imagen se decodifica a 1/8 de resolución directamente en escala de
+grises (IMREAD_REDUCED_GRAYSCALE_8), así que calcular el hash de una foto
+de 12 MP cuesta unos pocos milisegundos y puede hacerse durante el upload.
+OpenCV se importa al calcular el primer hash, no al importar el módulo.
+"""
+import os
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+# Distancia de Hamming máxima (de 64 bits) para considerar dos fotos duplicadas
+DUPLICATE_THRESHOLD = 6
+
+
+def dhash(img, size=8):
+    """dHash de un frame en escala de grises o BGR. Devuelve un int de size*size bits"""
+    import cv2
+    if img.ndim == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(img, (size + 1, size), interpolation=cv2.INTER_AREA)
+    diff = small[:, 1:] > small[:, :-1]
+    value = 0
+    for bit in diff.flatten():
+        value = (value << 1) | int(bit)
+    return value
+
+
+def dhash_file(path):
+    """dHash de un archivo de imagen (None para videos o si no se puede leer)"""
+    if os.path.splitext(path)[1].lower() in VIDEO_EXTENSIONS:
+        return None
+    import cv2
+    img = cv2.imread(path, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if img is None:
+        return None
+    return dhash(img)
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+def to_hex(h):
+    return f"{h:016x}"
+
+
+def from_hex(s):
+    return int(s, 16)
+
+
+class HashIndex:
+    """Cache de hashes por ruta (invalidada por mtime/tamaño) y agrupación de duplicados"""
+
+    def __init__(self, threshold=DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+        self._cache = {}
+
+    def get(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        key = (st.st_mtime_ns, st.st_size)
+        cached = self._cache.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+        h = dhash_file(path)
+        self._cache[path] = (key, h)
+        return h
+
+    def forget(self, path):
+        self._cache.pop(path, None)
+
+    def agrupar(self, paths):
+        """Agrupa rutas casi duplicadas conservando el orden.
+
+        Devuelve una lista de grupos (listas de rutas); el primer elemento de
+        cada grupo es su representante. Videos y archivos ilegibles van solos."""
+        grupos = []
+        representantes = []  # (hash, índice de grupo)
+        for path in paths:
+            h = self.get(path)
+            destino = None
+            if h is not None:
+                for rep_hash, gi in representantes:
+                    if hamming(h, rep_hash) <= self.threshold:
+                        destino = gi
+                        break
+            if destino is None:
+                grupos.append([path])
+                if h is not None:
+                    representantes.append((h, len(grupos) - 1))
+            else:
+                grupos[destino].append(path)
+        return grupos
+
+    def buscar_previo(self, path, previos):
+        """Busca la foto en reportes previos del vehículo.
+
+        `previos` son filas (dhash, path, fecha, daños, severidad) de
+        fetch_media_hashes. Devuelve la fila más parecida dentro del umbral o None."""
+        h = self.get(path)
+        if h is None:
+            return None
+        mejor, mejor_dist = None, self.threshold + 1
+        for row in previos:
+            dist = hamming(h, from_hex(row[0]))
+            if dist < mejor_dist:
+                mejor, mejor_dist = row, dist
+        return mejor
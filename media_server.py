@@ -0,0 +1,212 @@
+# SERVIDOR HTTP DE MEDIOS (PREVIEWS Y VIDEO)
+"""
+Sirve fotos y videos al navegador por HTTP en lugar de incrustarlos en base64
+en los controles Flet (que viajan por el websocket). Corre en un hilo junto a
+la app, en MEDIA_PORT (si está ocupado, en un puerto libre que elige el sistema):
+
+    url = get_media_server().url_for(ruta, host)   # http://host:8001/m/<token>/foto.jpg
+    preview.src = url
+
+Sólo se sirven archivos registrados con url_for (el token es un HMAC de la
+ruta con un secreto del proceso, no se puede adivinar otra ruta). Soporta:
+
+- Range: bytes=a-b / a- / -n (un rango; 206 + Content-Range, 416 si no cabe),
+  necesario para que <video> pueda saltar sin descargar todo
+- ETag (tamaño + mtime), If-None-Match -> 304, If-Range, Last-Modified
+- cuerpo con socket.sendfile (sendfile(2) del kernel donde existe)
+"""
+import email.utils
+import hashlib
+import hmac
+import logging
+import mimetypes
+import os
+import re
+import secrets
+import threading
+import urllib.parse
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+MEDIA_HOST = os.environ.get("TOYOTA_MEDIA_HOST", "0.0.0.0")
+MEDIA_PORT = int(os.environ.get("TOYOTA_MEDIA_PORT", "8001"))
+# URL base que ve el navegador si no coincide con host:MEDIA_PORT (proxy, TLS...)
+MEDIA_PUBLIC_URL = os.environ.get("TOYOTA_MEDIA_PUBLIC_URL")
+CACHE_MAX_AGE = 3600
+MAX_REGISTERED = 10000
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+mimetypes.add_type("image/webp", ".webp")
+mimetypes.add_type("image/avif", ".avif")
+mimetypes.add_type("video/x-matroska", ".mkv")
+
+
+def etag_for(st):
+    return f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+
+def parse_range(header, size):
+    """(inicio, fin) inclusivos de un Range de un solo tramo; None si no hay
+    Range utilizable y ValueError si no se puede satisfacer"""
+    m = _RANGE_RE.match((header or "").strip())
+    if not m or (not m.group(1) and not m.group(2)):
+        return None
+    if not m.group(1):  # sufijo: los últimos n bytes
+        n = int(m.group(2))
+        if n == 0:
+            raise ValueError("rango vacío")
+        return max(0, size - n), size - 1
+    inicio = int(m.group(1))
+    fin = int(m.group(2)) if m.group(2) else size - 1
+    if inicio >= size or fin < inicio:
+        raise ValueError("rango fuera del archivo")
+    return inicio, min(fin, size - 1)
+
+
+class MediaServer:
+    def __init__(self, host=MEDIA_HOST, port=MEDIA_PORT):
+        self.host = host
+        self.port = port
+        self._secret = secrets.token_bytes(16)
+        self._lock = threading.Lock()
+        self._rutas = OrderedDict()  # token -> ruta
+        self._httpd = None
+
+    def token_for(self, path):
+        real = os.path.realpath(path)
+        token = hmac.new(self._secret, real.encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+        with self._lock:
+            self._rutas[token] = real
+            self._rutas.move_to_end(token)
+            while len(self._rutas) > MAX_REGISTERED:
+                self._rutas.popitem(last=False)
+        return token
+
+    def resolve(self, token):
+        with self._lock:
+            return self._rutas.get(token)
+
+    def url_for(self, path, host=None):
+        """URL para el navegador; "" si el archivo no existe"""
+        if not path or not os.path.exists(path):
+            return ""
+        base = MEDIA_PUBLIC_URL or f"http://{host or 'localhost'}:{self.port}"
+        nombre = urllib.parse.quote(os.path.basename(path))
+        return f"{base.rstrip('/')}/m/{self.token_for(path)}/{nombre}"
+
+    def _bind(self):
+        try:
+            return ThreadingHTTPServer((self.host, self.port), _handler_for(self))
+        except OSError as e:
+            if self.port == 0:
+                logger.error(f"Servidor de medios: no se pudo abrir {self.host}: {e}")
+                raise
+            # Otro proceso (u otra instancia de la app) tiene el puerto: usar uno libre
+            logger.warning(f"Servidor de medios: puerto {self.port} no disponible ({e}), usando uno libre")
+            if MEDIA_PUBLIC_URL:
+                logger.warning(f"TOYOTA_MEDIA_PUBLIC_URL={MEDIA_PUBLIC_URL} apunta al puerto {self.port}, que no es el del servidor")
+            self.port = 0
+            return self._bind()
+
+    def start(self):
+        if self._httpd is None:
+            self._httpd = self._bind()
+            self._httpd.daemon_threads = True
+            self.port = self._httpd.server_address[1]
+            threading.Thread(target=self._httpd.serve_forever, daemon=True, name="media-server").start()
+            logger.info(f"Servidor de medios en {self.host}:{self.port}")
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+
+def _handler_for(server):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_HEAD(self):
+            self._servir(cuerpo=False)
+
+        def do_GET(self):
+            self._servir(cuerpo=True)
+
+        def _error(self, code, cabeceras=None):
+            self.send_response(code)
+            for k, v in (cabeceras or {}).items():
+                self.send_header(k, v)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def _servir(self, cuerpo):
+            partes = urllib.parse.urlparse(self.path).path.split("/")
+            ruta = server.resolve(partes[2]) if len(partes) >= 3 and partes[1] == "m" else None
+            if not ruta:
+                self._error(404)
+                return
+            try:
+                f = open(ruta, "rb")
+            except OSError:
+                self._error(404)
+                return
+            with f:
+                st = os.fstat(f.fileno())
+                etag = etag_for(st)
+                comunes = {
+                    "ETag": etag,
+                    "Last-Modified": email.utils.formatdate(st.st_mtime, usegmt=True),
+                    "Cache-Control": f"private, max-age={CACHE_MAX_AGE}",
+                    "Accept-Ranges": "bytes",
+                }
+                if etag in [t.strip() for t in self.headers.get("If-None-Match", "").split(",")]:
+                    self._error(304, comunes)
+                    return
+
+                rango = None
+                if self.headers.get("Range") and self.headers.get("If-Range", etag) == etag:
+                    try:
+                        rango = parse_range(self.headers["Range"], st.st_size)
+                    except ValueError:
+                        self._error(416, dict(comunes, **{"Content-Range": f"bytes */{st.st_size}"}))
+                        return
+                inicio, fin = rango if rango else (0, st.st_size - 1)
+                longitud = max(0, fin - inicio + 1)
+
+                self.send_response(206 if rango else 200)
+                for k, v in comunes.items():
+                    self.send_header(k, v)
+                self.send_header("Content-Type", mimetypes.guess_type(ruta)[0] or "application/octet-stream")
+                self.send_header("Content-Length", str(longitud))
+                if rango:
+                    self.send_header("Content-Range", f"bytes {inicio}-{fin}/{st.st_size}")
+                self.end_headers()
+                if cuerpo and longitud:
+                    try:
+                        self.connection.sendfile(f, inicio, longitud)
+                    except (BrokenPipeError, ConnectionResetError):
+                        pass  # el navegador cortó (p. ej. al saltar en el video)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def get_media_server():
+    """Servidor de medios del proceso, arrancado en el primer uso"""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = MediaServer().start()
+        return _server
@@ -0,0 +1,60 @@
+# ALMACÉN DE MEDIOS DIRECCIONADO POR CONTENIDO
+"""
+Los archivos se guardan bajo su SHA-256: ~/toyota_media/ab/abcdef....jpg
+El mismo contenido descargado o subido dos veces ocupa un solo archivo.
+
+Un archivo compartido puede estar en uso fuera de la evidencia de los reportes
+(p. ej. la cache HTTP de downloader): retener() lo marca para que la
+compactación de evidencia no borre el original.
+"""
+import hashlib
+import os
+
+STORE_DIR = os.path.join(os.path.expanduser("~"), "toyota_media")
+CHUNK_SIZE = 64 * 1024
+
+
+def path_for(digest, ext=""):
+    """Ruta dentro del almacén para un digest SHA-256 (hex)"""
+    return os.path.join(STORE_DIR, digest[:2], digest + ext)
+
+
+def ingest_temp(tmp_path, digest, ext=""):
+    """Mueve un archivo temporal ya hasheado a su ruta definitiva (idempotente)"""
+    final = path_for(digest, ext)
+    os.makedirs(os.path.dirname(final), exist_ok=True)
+    if os.path.exists(final):
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, final)
+    return final
+
+
+def sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _marca(path):
+    return os.path.join(STORE_DIR, "refs", os.path.basename(path))
+
+
+def retener(path):
+    """Marca un archivo del almacén como referenciado fuera de la evidencia"""
+    marca = _marca(path)
+    os.makedirs(os.path.dirname(marca), exist_ok=True)
+    open(marca, "a").close()
+
+
+def retenido(path):
+    return os.path.exists(_marca(path))
+
+
+def temp_path():
+    """Archivo temporal dentro del almacén (mismo disco, así os.replace es atómico)"""
+    tmp_dir = os.path.join(STORE_DIR, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    return os.path.join(tmp_dir, f"{os.getpid()}-{os.urandom(6).hex()}.part")
@@ -0,0 +1,406 @@
+# REPORTES DE INSPECCIÓN EN PDF
+"""
+Genera el PDF de un reporte (datos del vehículo, daños, evidencia anotada,
+miniaturas de las demás fotos y videos, y pedidos de reparación vinculados).
+
+El PDF se cachea en REPORTS_DIR como reporte_<id>_<versión>.pdf, donde la
+versión es un hash del contenido (fila del reporte, pedidos, anotaciones,
+evidencia disponible y RENDERER_VERSION): si nada cambió se devuelve el mismo
+archivo; si cambia p. ej. el estado de un pedido se genera uno nuevo y se
+borran las versiones anteriores.
+
+    futuro = get_report_renderer().solicitar(reporte_id)   # pool en segundo plano
+    ruta = futuro.result()
+
+    generar_dia("2025-12-04")   # todos los reportes del día, en paralelo por núcleos
+
+No hay dependencia de PDF: el escritor de este módulo sólo usa texto
+Helvetica (WinAnsi), rectángulos e imágenes JPEG (DCTDecode), suficiente para
+el reporte. Las miniaturas se recodifican a JPEG con OpenCV; sin OpenCV la
+evidencia se lista por nombre.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing as mp
+import os
+import textwrap
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from db_utils import fetch_report, fetch_report_orders, fetch_report_annotations, fetch_reports
+from evidence_store import get_evidence_store, ruta_en_almacen, claves_de, es_video
+
+REPORTS_DIR = os.environ.get("TOYOTA_REPORTS_DIR") or os.path.join(os.path.expanduser("~"), "toyota_reports")
+PDF_WORKERS = int(os.environ.get("TOYOTA_PDF_WORKERS", "2"))
+# Subir al cambiar el diseño para invalidar los PDFs cacheados
+RENDERER_VERSION = 1
+THUMB_MAX_SIDE = 900
+THUMB_QUALITY = 80
+
+# A4 en puntos
+PAGE_W, PAGE_H = 595, 842
+MARGIN = 40
+TOYOTA_RED = "#c41e3a"
+SEVERITY_COLORS = {"Perfecto": "#4CAF50", "Moderada": "#FFA726", "Grave": "#ff5252"}
+
+logger = logging.getLogger(__name__)
+
+
+def _rgb(color):
+    color = color.lstrip("#")
+    return " ".join(f"{int(color[i:i + 2], 16) / 255:.3f}" for i in (0, 2, 4))
+
+
+def _texto_pdf(texto):
+    """Cadena literal PDF en WinAnsi (se descartan emojis y caracteres sin equivalente)"""
+    datos = str(texto).encode("cp1252", "ignore")
+    return b"(" + datos.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+class PdfWriter:
+    """Escritor PDF mínimo: páginas A4 con texto, rectángulos e imágenes JPEG"""
+
+    def __init__(self):
+        self.paginas = []
+        self.imagenes = []  # (ancho_px, alto_px, jpeg)
+        self.nueva_pagina()
+
+    def nueva_pagina(self):
+        self.paginas.append([])
+        return len(self.paginas) - 1
+
+    def texto(self, x, y, texto, size=10, bold=False, color="#333333", pagina=-1):
+        self.paginas[pagina].append(
+            b"BT /%s %d Tf %s rg %.2f %.2f Td " % (b"F2" if bold else b"F1", size, _rgb(color).encode(), x, y)
+            + _texto_pdf(texto) + b" Tj ET")
+
+    def rect(self, x, y, w, h, color):
+        self.paginas[-1].append(b"%s rg %.2f %.2f %.2f %.2f re f" % (_rgb(color).encode(), x, y, w, h))
+
+    def imagen(self, jpeg, ancho_px, alto_px, x, y, w, h):
+        self.imagenes.append((ancho_px, alto_px, jpeg))
+        self.paginas[-1].append(b"q %.2f 0 0 %.2f %.2f %.2f cm /Im%d Do Q" % (w, h, x, y, len(self.imagenes) - 1))
+
+    def to_bytes(self):
+        objetos = [None, None]  # 1 catálogo, 2 árbol de páginas
+
+        def agregar(datos):
+            objetos.append(datos)
+            return len(objetos)
+
+        f1 = agregar(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+        f2 = agregar(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>")
+        xobjects = b" ".join(
+            b"/Im%d %d 0 R" % (i, agregar(
+                b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceRGB "
+                b"/BitsPerComponent 8 /Filter /DCTDecode /Length %d >>\nstream\n" % (w, h, len(jpeg))
+                + jpeg + b"\nendstream"))
+            for i, (w, h, jpeg) in enumerate(self.imagenes))
+        kids = []
+        for ops in self.paginas:
+            contenido = zlib.compress(b"\n".join(ops))
+            cont = agregar(b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(contenido) + contenido + b"\nendstream")
+            kids.append(agregar(
+                b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Resources << /Font << /F1 %d 0 R /F2 %d 0 R >> "
+                b"/XObject << %s >> >> /Contents %d 0 R >>" % (PAGE_W, PAGE_H, f1, f2, xobjects, cont)))
+        objetos[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+        objetos[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % k for k in kids), len(kids))
+
+        salida = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        offsets = []
+        for i, obj in enumerate(objetos, 1):
+            offsets.append(len(salida))
+            salida += b"%d 0 obj\n" % i + obj + b"\nendobj\n"
+        xref = len(salida)
+        salida += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objetos) + 1)
+        salida += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+        salida += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objetos) + 1, xref)
+        return bytes(salida)
+
+
+def miniatura_jpeg(ruta, max_side=THUMB_MAX_SIDE, calidad=THUMB_QUALITY):
+    """(jpeg, ancho, alto) de una foto o del frame central de un video; None si
+    no se puede leer (o no hay OpenCV)"""
+    try:
+        import cv2
+    except ImportError:
+        return None
+    if es_video(ruta):
+        cap = cv2.VideoCapture(ruta)
+        try:
+            total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+            if total > 1:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, total // 2)
+            ok, img = cap.read()
+        finally:
+            cap.release()
+        if not ok:
+            return None
+    else:
+        img = cv2.imread(ruta, cv2.IMREAD_COLOR)
+        if img is None:
+            return None
+    h, w = img.shape[:2]
+    escala = max_side / max(h, w)
+    if escala < 1:
+        img = cv2.resize(img, (int(w * escala), int(h * escala)), interpolation=cv2.INTER_AREA)
+    ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, calidad])
+    if not ok:
+        return None
+    return buf.tobytes(), img.shape[1], img.shape[0]
+
+
+def cargar_datos(reporte_id):
+    """Todo lo que entra en el PDF de un reporte; None si el reporte no existe"""
+    reporte = fetch_report(reporte_id)
+    if reporte is None:
+        return None
+    store = get_evidence_store()
+    evidencia = []
+    for clave in claves_de(reporte[6] if len(reporte) > 6 else ""):
+        ruta = store.resolver(clave)
+        if ruta is None and os.path.isabs(clave) and os.path.exists(clave):
+            ruta = clave  # reporte anterior al almacén de evidencia
+        evidencia.append((clave, ruta))
+    anotaciones = []
+    for ev, anotada, severidad in fetch_report_annotations(reporte_id):
+        ruta = ruta_en_almacen(anotada)
+        anotaciones.append((ev, ruta if os.path.exists(ruta) else None, severidad))
+    return {
+        "reporte": tuple(reporte),
+        "ordenes": [tuple(o) for o in fetch_report_orders(reporte_id)],
+        "anotaciones": anotaciones,
+        "evidencia": evidencia,
+    }
+
+
+def version_de(datos):
+    """Hash del contenido del PDF: cambia con el reporte, sus pedidos, sus
+    anotaciones, la evidencia disponible (original o compacta) o el diseño"""
+    clave = [
+        RENDERER_VERSION, datos["reporte"], datos["ordenes"],
+        [(ev, os.path.basename(r) if r else None, sev) for ev, r, sev in datos["anotaciones"]],
+        [(c, os.path.basename(r) if r else None) for c, r in datos["evidencia"]],
+    ]
+    return hashlib.sha1(json.dumps(clave, default=str, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+def render_pdf(datos, version=""):
+    """Bytes del PDF de un reporte (ver cargar_datos)"""
+    report_id, vin, placa, fecha, daños, severidad = datos["reporte"][:6]
+    pdf = PdfWriter()
+    ancho = PAGE_W - 2 * MARGIN
+    y = PAGE_H - MARGIN
+
+    def espacio(alto):
+        nonlocal y
+        if y - alto < MARGIN + 20:
+            pdf.nueva_pagina()
+            y = PAGE_H - MARGIN
+
+    def seccion(titulo):
+        nonlocal y
+        espacio(40)
+        y -= 24
+        pdf.texto(MARGIN, y, titulo, size=13, bold=True, color=TOYOTA_RED)
+        y -= 8
+
+    # Cabecera
+    pdf.rect(0, PAGE_H - 72, PAGE_W, 72, TOYOTA_RED)
+    pdf.texto(MARGIN, PAGE_H - 38, "TOYOTA DAMAGE PRO", size=18, bold=True, color="#ffffff")
+    pdf.texto(MARGIN, PAGE_H - 58, f"Reporte de inspección #{report_id}", size=11, color="#ffffff")
+    y = PAGE_H - 100
+
+    for etiqueta, valor, color in (("VIN", vin, None), ("Placa", placa, None), ("Fecha", fecha, None),
+                                   ("Severidad", severidad, SEVERITY_COLORS.get(severidad, "#333333"))):
+        pdf.texto(MARGIN, y, f"{etiqueta}:", size=11, bold=True)
+        pdf.texto(MARGIN + 80, y, valor or "-", size=11, bold=color is not None, color=color or "#333333")
+        y -= 16
+
+    seccion("Daños detectados")
+    for linea in textwrap.wrap(daños or "-", width=int(ancho / (10 * 0.5))) or ["-"]:
+        espacio(14)
+        y -= 14
+        pdf.texto(MARGIN, y, linea, size=10)
+
+    # Evidencia: primero las anotadas (la más grave primero), luego el resto
+    anotadas = {ev for ev, ruta, _ in datos["anotaciones"] if ruta}
+    celdas = [(ruta, f"Anotada - {sev}") for ev, ruta, sev in datos["anotaciones"] if ruta]
+    celdas += [(ruta, ("Video: " if es_video(clave) else "") + os.path.basename(clave)[:40])
+               for clave, ruta in datos["evidencia"] if ruta and clave not in anotadas]
+    sin_archivo = [clave for clave, ruta in datos["evidencia"] if not ruta]
+    if celdas or sin_archivo:
+        seccion("Evidencia")
+        columna, gap = 0, 12
+        celda_w = (ancho - gap) / 2
+        celda_h = 190
+        for ruta, leyenda in celdas:
+            mini = miniatura_jpeg(ruta)
+            if mini is None:
+                sin_archivo.append(leyenda)
+                continue
+            if columna == 0:
+                espacio(celda_h + 24)
+                y -= celda_h + 8
+            jpeg, w_px, h_px = mini
+            escala = min(celda_w / w_px, celda_h / h_px)
+            x = MARGIN + columna * (celda_w + gap)
+            pdf.imagen(jpeg, w_px, h_px, x, y + celda_h - h_px * escala, w_px * escala, h_px * escala)
+            pdf.texto(x, y - 10, leyenda, size=8, color="#666666")
+            columna = 1 - columna
+            if columna == 0:
+                y -= 14
+        if columna == 1:
+            y -= 14
+        for nombre in sin_archivo:
+            espacio(14)
+            y -= 14
+            pdf.texto(MARGIN, y, f"Sin vista previa: {os.path.basename(nombre)}", size=9, color="#999999")
+
+    seccion("Pedidos de reparación")
+    columnas = ((0, "ID"), (40, "Fecha"), (120, "Tipo"), (210, "Descripción"), (440, "Estado"))
+    if not datos["ordenes"]:
+        y -= 14
+        pdf.texto(MARGIN, y, "Sin pedidos", size=10, color="#999999")
+    else:
+        y -= 14
+        for dx, titulo in columnas:
+            pdf.texto(MARGIN + dx, y, titulo, size=9, bold=True)
+        for order_id, _, fecha_pedido, tipo, descripcion, estado in (o[:6] for o in datos["ordenes"]):
+            espacio(14)
+            y -= 14
+            valores = (f"#{order_id}", fecha_pedido, tipo, (descripcion or "")[:45], estado)
+            for (dx, _), valor in zip(columnas, valores):
+                pdf.texto(MARGIN + dx, y, valor or "-", size=9,
+                          color="#4CAF50" if valor == "Completado" else "#333333")
+
+    generado = datetime.now().strftime("%Y-%m-%d %H:%M")
+    for i in range(len(pdf.paginas)):
+        pdf.texto(MARGIN, 20, f"Reporte #{report_id} - generado {generado} - versión {version} - "
+                              f"página {i + 1}/{len(pdf.paginas)}", size=7, color="#999999", pagina=i)
+    return pdf.to_bytes()
+
+
+def generar_pdf(reporte_id, directorio=None):
+    """Ruta del PDF del reporte: el cacheado si su versión sigue vigente o uno
+    nuevo. LookupError si el reporte no existe"""
+    directorio = directorio or REPORTS_DIR
+    datos = cargar_datos(reporte_id)
+    if datos is None:
+        raise LookupError(f"El reporte #{reporte_id} no existe")
+    version = version_de(datos)
+    prefijo = f"reporte_{reporte_id}_"
+    ruta = os.path.join(directorio, f"{prefijo}{version}.pdf")
+    if os.path.exists(ruta):
+        return ruta
+    contenido = render_pdf(datos, version)
+    os.makedirs(directorio, exist_ok=True)
+    tmp = f"{ruta}.{os.getpid()}.{threading.get_ident()}.part"
+    with open(tmp, "wb") as f:
+        f.write(contenido)
+    os.replace(tmp, ruta)
+    for nombre in os.listdir(directorio):
+        if nombre.startswith(prefijo) and nombre.endswith(".pdf") and nombre != os.path.basename(ruta):
+            try:
+                os.remove(os.path.join(directorio, nombre))  # versión anterior
+            except OSError:
+                pass
+    logger.info(f"PDF del reporte #{reporte_id} generado: {ruta}")
+    return ruta
+
+
+class ReportRenderer:
+    """Pool de hilos que genera PDFs sin bloquear la UI; una petición por
+    reporte en curso (las repetidas comparten el mismo Future)"""
+
+    def __init__(self, workers=PDF_WORKERS, directorio=None):
+        self.directorio = directorio
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pdf")
+        self._lock = threading.Lock()
+        self._en_curso = {}  # reporte_id -> Future
+
+    def solicitar(self, reporte_id):
+        with self._lock:
+            futuro = self._en_curso.get(reporte_id)
+            if futuro is None or futuro.done():
+                futuro = self._pool.submit(self._generar, reporte_id)
+                self._en_curso[reporte_id] = futuro
+            return futuro
+
+    def _generar(self, reporte_id):
+        try:
+            return generar_pdf(reporte_id, self.directorio)
+        finally:
+            with self._lock:
+                self._en_curso.pop(reporte_id, None)
+
+
+def generar_dia(fecha, workers=None, directorio=None):
+    """PDFs de todos los reportes de un día ('AAAA-MM-DD'), repartidos en
+    procesos (uno por núcleo menos uno). Devuelve {reporte_id: ruta | None}"""
+    ids = [r[0] for r in fetch_reports(desde=fecha, hasta=fecha)]
+    if not ids:
+        return {}
+    workers = workers or max(1, min(len(ids), (os.cpu_count() or 2) - 1))
+    rutas = {}
+    if workers == 1:
+        for reporte_id in ids:
+            try:
+                rutas[reporte_id] = generar_pdf(reporte_id, directorio)
+            except Exception as e:
+                logger.error(f"PDF del reporte #{reporte_id}: {e}")
+                rutas[reporte_id] = None
+        return rutas
+    # spawn: el proceso padre tiene hilos (UI, pools, servidor de medios) y fork no es seguro
+    ctx = mp.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        futuros = {pool.submit(generar_pdf, reporte_id, directorio): reporte_id for reporte_id in ids}
+        for futuro in as_completed(futuros):
+            reporte_id = futuros[futuro]
+            try:
+                rutas[reporte_id] = futuro.result()
+            except Exception as e:
+                logger.error(f"PDF del reporte #{reporte_id}: {e}")
+                rutas[reporte_id] = None
+    return rutas
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def get_report_renderer():
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None:
+            _renderer = ReportRenderer()
+        return _renderer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reportes de inspección en PDF")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_reporte = sub.add_parser("report", help="PDF de un reporte")
+    p_reporte.add_argument("reporte_id", type=int)
+    p_dia = sub.add_parser("day", help="PDFs de todos los reportes de un día, en paralelo")
+    p_dia.add_argument("fecha", help="AAAA-MM-DD")
+    p_dia.add_argument("--workers", type=int)
+    for p in (p_reporte, p_dia):
+        p.add_argument("--dir", help=f"Directorio de salida (por defecto {REPORTS_DIR})")
+    args = parser.parse_args()
+
+    if args.cmd == "report":
+        print(f"✅ {generar_pdf(args.reporte_id, args.dir)}")
+    elif args.cmd == "day":
+        resultado = generar_dia(args.fecha, args.workers, args.dir)
+        for reporte_id, ruta in sorted(resultado.items()):
+            print(f"#{reporte_id}: {ruta or '❌ error'}")
+        print(f"✅ {sum(1 for r in resultado.values() if r)}/{len(resultado)} PDF(s)")
+
+
+if __name__ == "__main__":
+    main()
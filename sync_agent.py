@@ -0,0 +1,123 @@
+# AGENTE DE SINCRONIZACIÓN DEL KIOSCO
+"""
+Sube el change_log local al almacén central y baja lo que escribieron los
+demás kioscos, de forma incremental:
+
+    push: cambios con seq > cursor "pushed_seq", en lotes de SYNC_BATCH
+          comprimidos; confirmado el lote, avanza el cursor y se poda el log
+    pull: cambios centrales con seq > cursor "pulled_seq"; se aplican con la
+          regla de conflicto de db_utils.apply_remote_changes
+
+Sin conexión no se pierde nada: el change_log se acumula y se sube al volver.
+Las filas bajadas se publican en el feed de cambios, así que las sesiones
+abiertas las ven aparecer sin recargar.
+
+Se activa con TOYOTA_SYNC_URL: una URL http(s) del servidor central o la ruta
+de un archivo SQLite compartido.
+"""
+import logging
+import os
+import threading
+import time
+
+from db_utils import (get_kiosk_id, get_sync_state, set_sync_state, fetch_changes_since, prune_change_log,
+                      apply_remote_changes, backfill_change_log)
+from sync_central import CentralStore, HttpCentral, comprimir, descomprimir
+
+SYNC_URL = os.environ.get("TOYOTA_SYNC_URL")
+SYNC_INTERVAL_S = int(os.environ.get("TOYOTA_SYNC_INTERVAL", "60"))
+SYNC_BATCH = 500
+
+logger = logging.getLogger(__name__)
+
+
+def abrir_central(url):
+    if url.startswith(("http://", "https://")):
+        return HttpCentral(url)
+    return CentralStore(url)
+
+
+class SyncAgent:
+    def __init__(self, store, interval_s=SYNC_INTERVAL_S, batch=SYNC_BATCH):
+        self.store = store
+        self.interval_s = interval_s
+        self.batch = batch
+        self.kiosko = get_kiosk_id()
+        self.ultimo = None  # resumen de la última sincronización
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def push(self):
+        subidos = rechazados = 0
+        cursor = int(get_sync_state("pushed_seq", 0))
+        while True:
+            cambios, hasta = fetch_changes_since(cursor, self.batch)
+            if hasta == cursor:
+                break
+            if cambios:
+                resultado = self.store.push(self.kiosko, comprimir(cambios))
+                subidos += resultado["aceptados"]
+                rechazados += resultado["rechazados"]
+            cursor = hasta
+            set_sync_state("pushed_seq", cursor)
+            prune_change_log(cursor)
+        return subidos, rechazados
+
+    def pull(self):
+        aplicados = 0
+        cursor = int(get_sync_state("pulled_seq", 0))
+        while True:
+            lote, hasta = self.store.pull(self.kiosko, cursor, self.batch)
+            if hasta == cursor:
+                break
+            aplicados += apply_remote_changes(descomprimir(lote))
+            cursor = hasta
+            set_sync_state("pulled_seq", cursor)
+        return aplicados
+
+    def sincronizar(self):
+        """Un ciclo completo push + pull. Devuelve el resumen"""
+        with self._lock:
+            t0 = time.monotonic()
+            backfill_change_log()
+            subidos, rechazados = self.push()
+            bajados = self.pull()
+            self.ultimo = {"subidos": subidos, "rechazados": rechazados, "bajados": bajados,
+                           "ms": round((time.monotonic() - t0) * 1000, 1)}
+            return self.ultimo
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True, name="kiosk-sync")
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        espera = 0
+        while not self._stop.wait(espera):
+            try:
+                r = self.sincronizar()
+                if r["subidos"] or r["rechazados"] or r["bajados"]:
+                    logger.info(f"Sincronización: {r['subidos']} subidos, {r['rechazados']} rechazados, "
+                                f"{r['bajados']} bajados", extra={"timings": {"sync_ms": r["ms"]}})
+            except Exception as e:
+                # Sin red o central caído: el change_log sigue acumulando
+                logger.warning(f"Sincronización pendiente: {e}", extra={"sample": "sync_error"})
+            espera = self.interval_s
+
+
+_agent = None
+_agent_lock = threading.Lock()
+
+
+def iniciar_sync(url=SYNC_URL):
+    """Arranca el agente del proceso si hay central configurado (idempotente)"""
+    global _agent
+    with _agent_lock:
+        if _agent is None and url:
+            _agent = SyncAgent(abrir_central(url)).start()
+        return _agent
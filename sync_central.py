@@ -0,0 +1,170 @@
+# ALMACÉN CENTRAL DE SINCRONIZACIÓN
+"""
+Destino común de los kioscos. Guarda cada fila por su clave global
+(tabla, origen, id) y un registro de cambios con seq propio: los kioscos suben
+lotes comprimidos (push) y bajan lo posterior a su cursor (pull), nunca la
+base entera.
+
+Dos implementaciones con la misma interfaz:
+
+    CentralStore("/srv/toyota_central.db")          archivo SQLite compartido
+    HttpCentral("http://central:8765")              cliente del servidor HTTP
+
+        store.push(kiosko, lote)        -> {"aceptados": n, "rechazados": m}
+        store.pull(kiosko, desde, limite) -> (lote, ultimo_seq)
+
+Regla de conflicto (también en el kiosco al aplicar): gana la versión con
+`modificado` más reciente y, en empate, la que ya estaba; la otra se rechaza
+y el kiosco que la envió recibe la ganadora en su siguiente pull.
+
+Servidor de pruebas: python sync_central.py central.db [--port 8765]
+"""
+import argparse
+import json
+import sqlite3
+import threading
+import urllib.parse
+import urllib.request
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PULL_LIMIT = 500
+HTTP_TIMEOUT = 30
+
+
+def comprimir(cambios):
+    return zlib.compress(json.dumps(cambios, ensure_ascii=False).encode("utf-8"), 6)
+
+
+def descomprimir(lote):
+    return json.loads(zlib.decompress(lote).decode("utf-8")) if lote else []
+
+
+class CentralStore:
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS filas (
+            tabla TEXT,
+            origen TEXT,
+            id INTEGER,
+            modificado TEXT,
+            fila TEXT,
+            PRIMARY KEY(tabla, origen, id)
+        )''')
+        # emisor: kiosco que subió el cambio (no tiene por qué ser el origen de la fila)
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS cambios (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            emisor TEXT,
+            tabla TEXT,
+            op TEXT,
+            origen TEXT,
+            id INTEGER,
+            modificado TEXT,
+            fila TEXT
+        )''')
+        self.conn.commit()
+
+    def push(self, kiosko, lote):
+        aceptados = rechazados = 0
+        with self._lock, self.conn:
+            for cambio in descomprimir(lote):
+                clave = (cambio["tabla"], cambio["origen"], cambio["id"])
+                actual = self.conn.execute(
+                    "SELECT modificado FROM filas WHERE tabla = ? AND origen = ? AND id = ?", clave).fetchone()
+                if actual and actual[0] >= cambio["modificado"]:
+                    rechazados += 1
+                    continue
+                fila = json.dumps(cambio["fila"], ensure_ascii=False)
+                self.conn.execute("INSERT OR REPLACE INTO filas (tabla, origen, id, modificado, fila) VALUES (?,?,?,?,?)",
+                                  clave + (cambio["modificado"], fila))
+                self.conn.execute(
+                    "INSERT INTO cambios (emisor, tabla, op, origen, id, modificado, fila) VALUES (?,?,?,?,?,?,?)",
+                    (kiosko, cambio["tabla"], cambio["op"], cambio["origen"], cambio["id"], cambio["modificado"], fila))
+                aceptados += 1
+        return {"aceptados": aceptados, "rechazados": rechazados}
+
+    def pull(self, kiosko, desde, limite=PULL_LIMIT):
+        """Cambios de otros kioscos posteriores a `desde`. El cursor devuelto
+        avanza también sobre los propios para no volver a leerlos"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT seq, emisor, tabla, op, origen, id, modificado, fila FROM cambios WHERE seq > ? ORDER BY seq LIMIT ?",
+                (desde, limite)).fetchall()
+        cambios = [
+            {"tabla": tabla, "op": op, "origen": origen, "id": id_, "modificado": modificado, "fila": json.loads(fila)}
+            for _, emisor, tabla, op, origen, id_, modificado, fila in rows if emisor != kiosko
+        ]
+        return comprimir(cambios), (rows[-1][0] if rows else desde)
+
+
+class HttpCentral:
+    """Cliente del servidor HTTP de este módulo (misma interfaz que CentralStore)"""
+
+    def __init__(self, url, timeout=HTTP_TIMEOUT):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def push(self, kiosko, lote):
+        req = urllib.request.Request(f"{self.url}/push?{urllib.parse.urlencode({'kiosko': kiosko})}", data=lote,
+                                     headers={"Content-Type": "application/octet-stream"}, method="POST")
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            return json.loads(resp.read().decode("utf-8"))
+
+    def pull(self, kiosko, desde, limite=PULL_LIMIT):
+        query = urllib.parse.urlencode({"kiosko": kiosko, "desde": desde, "limite": limite})
+        with urllib.request.urlopen(f"{self.url}/pull?{query}", timeout=self.timeout) as resp:
+            return resp.read(), int(resp.headers["X-Ultimo-Seq"])
+
+
+def crear_servidor(store, host="127.0.0.1", port=8765):
+    """Servidor HTTP delante de un CentralStore (sustituto local del central real)"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def _params(self):
+            return {k: v[0] for k, v in urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query).items()}
+
+        def _responder(self, cuerpo, tipo, cabeceras=None):
+            self.send_response(200)
+            self.send_header("Content-Type", tipo)
+            self.send_header("Content-Length", str(len(cuerpo)))
+            for k, v in (cabeceras or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def do_POST(self):
+            if urllib.parse.urlparse(self.path).path != "/push":
+                self.send_error(404)
+                return
+            lote = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            resultado = store.push(self._params()["kiosko"], lote)
+            self._responder(json.dumps(resultado).encode("utf-8"), "application/json")
+
+        def do_GET(self):
+            if urllib.parse.urlparse(self.path).path != "/pull":
+                self.send_error(404)
+                return
+            p = self._params()
+            lote, ultimo = store.pull(p["kiosko"], int(p.get("desde", 0)), int(p.get("limite", PULL_LIMIT)))
+            self._responder(lote, "application/octet-stream", {"X-Ultimo-Seq": str(ultimo)})
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Almacén central de sincronización (servidor HTTP de pruebas)")
+    parser.add_argument("db", help="Archivo SQLite del almacén central")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    servidor = crear_servidor(CentralStore(args.db), args.host, args.port)
+    print(f"✅ Almacén central en http://{args.host}:{args.port} ({args.db})")
+    servidor.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Tests for annotated evidence: stored once, linked to the report, read back
+without running the detector
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("TOYOTA_DB_PATH", os.path.join(tempfile.mkdtemp(), "toyota_test.db"))
+
+import db_utils
+import evidence_store
+import media_store
+
+
+def test_annotated_bytes_are_content_addressed(tmp_path, monkeypatch):
+    monkeypatch.setattr(media_store, "STORE_DIR", str(tmp_path))
+    clave = evidence_store.guardar_bytes(b"RIFF-webp", ".webp")
+    assert clave == evidence_store.guardar_bytes(b"RIFF-webp", ".webp")
+    assert open(evidence_store.ruta_en_almacen(clave), "rb").read() == b"RIFF-webp"
+
+
+def test_report_annotations_roundtrip():
+    reporte_id = db_utils.insert_report("ANN1", "ANN001", "Abolladura", "Grave", "a.jpg, b.jpg")
+    db_utils.insert_report_annotations(reporte_id, [("a.jpg", "a-ann.webp", "Grave"), ("b.jpg", "b-ann.webp", "Moderada")])
+    assert db_utils.fetch_report_annotations(reporte_id) == [
+        ("a.jpg", "a-ann.webp", "Grave"), ("b.jpg", "b-ann.webp", "Moderada")]
+    assert db_utils.fetch_report_annotations(reporte_id + 1000) == []
+
+
+def test_detectar_y_anotar_returns_webp(tmp_path, monkeypatch):
+    cv2 = pytest.importorskip("cv2")
+    np = pytest.importorskip("numpy")
+    import detector
+    monkeypatch.setattr(media_store, "STORE_DIR", str(tmp_path / "almacen"))
+    # Detector falso: una caja fija, sin depender de que haya modelo YOLO
+    det = {"box": (100, 100, 600, 400), "conf": 0.9, "daños": ["Abolladura"], "severidad": "Grave"}
+    monkeypatch.setattr(detector, "YOLO_AVAILABLE", True)
+    monkeypatch.setattr(detector, "detectar_vehiculos", lambda img: [det])
+    monkeypatch.setattr(detector, "resumir_detecciones", lambda img, dets: ("Abolladura", "Grave"))
+
+    ruta = str(tmp_path / "auto.jpg")
+    original = np.full((720, 1280, 3), 150, dtype=np.uint8)
+    cv2.imwrite(ruta, original)
+    daños, severidad, anotada = detector.detectar_y_anotar(ruta, cascada=False)
+    assert (daños, severidad) == ("Abolladura", "Grave")
+    assert anotada[:4] == b"RIFF" and anotada[8:12] == b"WEBP"
+
+    img = cv2.imdecode(np.frombuffer(anotada, dtype=np.uint8), cv2.IMREAD_COLOR)
+    escala = min(1.0, detector.ANNOTATED_MAX_SIDE / 1280)
+    assert img.shape == (int(720 * escala), int(1280 * escala), 3)
+    # El borde de la caja lleva el color de la severidad; el resto queda como el original
+    borde = img[int(250 * escala), int(100 * escala)].astype(int)
+    assert np.abs(borde - detector.SEVERIDAD_COLORES["Grave"]).max() < 40
+    assert np.abs(img[int(600 * escala), int(1100 * escala)].astype(int) - 150).max() < 10
+
+    # Se guarda y se enlaza al reporte como en la galería
+    clave = evidence_store.guardar_bytes(anotada, ".webp")
+    reporte_id = db_utils.insert_report("ANN2", "ANN002", daños, severidad, ruta)
+    store = evidence_store.EvidenceStore(workers=1)
+    claves = store.ingresar_reporte(reporte_id, [ruta], severidad, [(ruta, clave, severidad)]).result(timeout=10)
+    assert db_utils.fetch_report_annotations(reporte_id) == [(claves[0], clave, "Grave")]
+    guardada = cv2.imread(evidence_store.ruta_en_almacen(clave))
+    assert guardada is not None and guardada.shape == img.shape
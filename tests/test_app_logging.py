@@ -0,0 +1,56 @@
+"""
+Tests for the structured logging pipeline (filters and JSON formatter)
+"""
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app_logging import ContextFilter, JsonFormatter, SamplingFilter, StageTimer, log_context
+
+
+def _record(msg="hola", **extra):
+    record = logging.LogRecord("test", logging.INFO, __file__, 1, msg, None, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_context_and_timings_end_up_in_json():
+    with log_context(session="s1", job="galeria-1"):
+        record = _record(timings={"yolo_ms": 12.5})
+        ContextFilter().filter(record)
+    data = json.loads(JsonFormatter().format(record))
+    assert data["msg"] == "hola"
+    assert data["session"] == "s1"
+    assert data["job"] == "galeria-1"
+    assert data["timings"] == {"yolo_ms": 12.5}
+
+    outside = _record()
+    ContextFilter().filter(outside)
+    assert outside.session is None and outside.job is None
+
+
+def test_sampling_limits_per_key_and_reports_suppressed():
+    f = SamplingFilter(interval=0.05)
+    assert f.filter(_record(sample="frame"))
+    assert not any(f.filter(_record(sample="frame")) for _ in range(9))
+    assert f.filter(_record(sample="otro"))
+    assert f.filter(_record())  # sin clave: nunca se muestrea
+    time.sleep(0.06)
+    record = _record(sample="frame")
+    assert f.filter(record)
+    assert record.suppressed == 9
+
+
+def test_stage_timer_laps():
+    timer = StageTimer()
+    time.sleep(0.01)
+    timer.lap("a")
+    with timer.stage("b"):
+        time.sleep(0.01)
+    ms = timer.ms()
+    assert set(ms) == {"a_ms", "b_ms"}
+    assert ms["a_ms"] >= 10 and ms["b_ms"] >= 10
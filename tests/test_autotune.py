@@ -0,0 +1,39 @@
+"""
+Tests for the hardware autotuner selection and persisted per-machine config
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+pytest.importorskip("cv2")
+
+import autotune
+import detector
+
+
+def _m(batch, imgsz, threads, ips, p95):
+    return {"batch": batch, "imgsz": imgsz, "threads": threads, "imgs_por_s": ips, "p50_ms": p95 / 2, "p95_ms": p95}
+
+
+def test_elegir_respects_budget_and_prefers_larger_imgsz():
+    mediciones = [
+        _m(16, 640, 4, 40.0, 1500),   # más rápida pero fuera de presupuesto
+        _m(8, 480, 4, 30.0, 600),
+        _m(8, 640, 4, 29.0, 700),     # dentro del 5%: gana por imgsz
+        _m(4, 320, 4, 50.0, 200),     # imgsz por debajo del mínimo
+    ]
+    mejor = autotune.elegir(mediciones, budget_ms=800, min_imgsz=480)
+    assert (mejor["batch"], mejor["imgsz"]) == (8, 640)
+
+
+def test_saved_config_is_loaded_for_this_machine(tmp_path, monkeypatch):
+    path = str(tmp_path / "hw.json")
+    autotune.guardar({"batch": 4, "imgsz": 480, "threads": 2}, path)
+    monkeypatch.setattr(detector, "INFERENCE_BATCH", 8)
+    monkeypatch.setattr(detector, "INFERENCE_IMGSZ", 640)
+    monkeypatch.setattr(detector, "INFERENCE_THREADS", None)
+    assert detector.cargar_config_hw(path)["batch"] == 4
+    assert (detector.INFERENCE_BATCH, detector.INFERENCE_IMGSZ, detector.INFERENCE_THREADS) == (4, 480, 2)
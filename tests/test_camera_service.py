@@ -0,0 +1,75 @@
+"""
+Tests for the persistent capture service driven by FileCaptureDevice: ring
+buffer, burst capture and sharpest-frame selection
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+np = pytest.importorskip("numpy")
+cv2 = pytest.importorskip("cv2")
+
+import camera_service
+from camera_service import CaptureService, FileCaptureDevice, sharpness
+
+
+def _video(path, frames=12, size=(160, 120)):
+    """Alterna frames nítidos (textura aleatoria) y la misma textura muy desenfocada"""
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 30, size)
+    if not writer.isOpened():
+        pytest.skip("OpenCV sin codificador de video")
+    textura = np.random.default_rng(0).integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+    for i in range(frames):
+        frame = textura if i % 2 == 0 else cv2.GaussianBlur(textura, (31, 31), 0)
+        writer.write(frame)
+    writer.release()
+    return str(path)
+
+
+@pytest.fixture
+def servicio(tmp_path):
+    video = _video(tmp_path / "cam.avi")
+    srv = CaptureService(lambda: FileCaptureDevice(video, fps=60), ring_size=4)
+    assert srv.start()
+    yield srv
+    srv.stop()
+
+
+def test_ring_buffer_keeps_recent_frames(servicio):
+    assert servicio.burst(6, timeout=5)  # dejar pasar más frames que el tamaño del buffer
+    assert len(servicio._ring) == 4
+    assert servicio.latest() is servicio._ring[-1][2]
+
+
+def test_burst_returns_new_frames_sharpest_first(servicio):
+    frames = servicio.burst(4, timeout=5)
+    assert len(frames) == 4
+    notas = [sharpness(f) for f in frames]
+    assert notas == sorted(notas, reverse=True)
+    assert notas[0] > 3 * notas[-1]  # hay nítidos y desenfocados en la ráfaga
+
+
+def test_latest_sharp_prefers_sharp_frame(servicio):
+    servicio.burst(4, timeout=5)
+    notas = sorted(e[1] for e in servicio._ring)
+    umbral = (notas[0] + notas[-1]) / 2
+    assert sharpness(servicio.latest_sharp(max_age=5, threshold=umbral)) >= umbral
+    # Ninguno supera el umbral: el más nítido de la ventana
+    mejor = servicio.latest_sharp(max_age=5, threshold=float("inf"))
+    assert sharpness(mejor) == pytest.approx(max(sharpness(e[2]) for e in servicio._ring), rel=0.2)
+
+
+def test_capture_to_file_and_stop(servicio, tmp_path):
+    ruta = servicio.capture_to_file(str(tmp_path / "foto.jpg"))
+    assert ruta and cv2.imread(ruta) is not None
+    servicio.stop()
+    assert not servicio.running and servicio.latest() is None
+
+
+def test_unopenable_device_does_not_start(tmp_path):
+    srv = CaptureService(lambda: FileCaptureDevice(str(tmp_path / "no_existe.avi")))
+    assert not srv.start()
+    assert camera_service.get_capture_service(lambda: None) is None
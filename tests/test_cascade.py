@@ -0,0 +1,44 @@
+"""
+Tests for the detector cascade triage and tiled-inference helpers
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+import detector
+
+
+def test_underexposed_photo_is_answered_by_triage():
+    img = np.zeros((1200, 1600, 3), dtype=np.uint8)
+    daños, severidad = detector.triaje_rapido(img)
+    assert "expuesta" in daños and severidad == "Desconocida"
+
+
+def test_featureless_photo_is_rejected_without_model():
+    img = np.full((1200, 1600, 3), 128, dtype=np.uint8)
+    assert detector.triaje_rapido(img)[1] == "Desconocida"
+
+
+def test_busy_photo_escalates_to_model():
+    tile = np.kron([[0, 1] * 20, [1, 0] * 20] * 15, np.ones((8, 8))).astype(np.uint8) * 200 + 20
+    img = np.dstack([tile] * 3)
+    assert detector.triaje_rapido(img) is None
+
+
+def test_tiles_cover_area_with_overlap():
+    tiles = detector._tiles(1500, 700, tile=640, overlap=0.2)
+    assert tiles[0][:2] == (0, 0)
+    assert max(t[2] for t in tiles) == 1500 and max(t[3] for t in tiles) == 700
+    assert all(t[2] - t[0] <= 640 and t[3] - t[1] <= 640 for t in tiles)
+    assert len(detector._tiles(500, 400)) == 1
+
+
+def test_nms_merges_overlapping_tile_boxes():
+    cajas = [(100, 100, 200, 200), (105, 102, 205, 198), (400, 400, 450, 450)]
+    assert detector.nms(cajas, [0.9, 0.7, 0.8]) == [0, 2]
@@ -0,0 +1,62 @@
+"""
+Tests for the in-process change feed
+"""
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from change_feed import ChangeFeed
+
+
+def _collector(expected):
+    got, done = [], threading.Event()
+
+    def on_change(change):
+        got.append(change)
+        if len(got) >= expected:
+            done.set()
+    return on_change, got, done
+
+
+def test_subscribers_receive_changes_in_order():
+    feed = ChangeFeed()
+    cb_a, got_a, done_a = _collector(2)
+    cb_b, got_b, done_b = _collector(2)
+    feed.subscribe(cb_a)
+    feed.subscribe(cb_b)
+    feed.publish("repair_orders", "insert", 7, [7, None, "2025-01-01", "Reparación", "x", "Pendiente"])
+    feed.publish("repair_orders", "update", 7, [7, None, "2025-01-01", "Reparación", "x", "Completado"])
+    assert done_a.wait(2) and done_b.wait(2)
+    assert [ch.op for ch in got_a] == ["insert", "update"]
+    assert got_a[0].seq < got_a[1].seq
+    assert got_b[1].row[5] == "Completado"
+
+
+def test_failing_subscriber_does_not_block_others(caplog):
+    feed = ChangeFeed()
+
+    def broken(change):
+        raise RuntimeError("boom")
+
+    cb, got, done = _collector(1)
+    feed.subscribe(broken)
+    feed.subscribe(cb)
+    feed.publish("damage_reports", "insert", 1, (1,))
+    assert done.wait(2)
+    # El error queda en el log con su traceback
+    fallos = [r for r in caplog.records if r.name == "change_feed"]
+    assert fallos and "damage_reports#1" in fallos[0].getMessage() and fallos[0].exc_info
+
+
+def test_unsubscribed_callback_stops_receiving():
+    feed = ChangeFeed()
+    cb, got, done = _collector(1)
+    feed.subscribe(cb)
+    feed.unsubscribe(cb)
+    keep, got_keep, done_keep = _collector(1)
+    feed.subscribe(keep)
+    feed.publish("damage_reports", "insert", 1, (1,))
+    assert done_keep.wait(2)
+    assert got == []
@@ -0,0 +1,92 @@
+"""
+Tests for monthly archive partitions and query fan-out
+"""
+import os
+import sys
+import tempfile
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("TOYOTA_DB_PATH", os.path.join(tempfile.mkdtemp(), "toyota_test.db"))
+
+import db_archive
+import db_utils
+
+
+def _reporte(vin, fecha):
+    return db_utils.insert_report(vin, "ARC001", "Rayón", "Moderada", "x.jpg", fecha=fecha)
+
+
+def _en_change_log(tabla, row_id):
+    db_utils.c.execute("SELECT COUNT(*) FROM change_log WHERE tabla = ? AND row_id = ?", (tabla, row_id))
+    return db_utils.c.fetchone()[0] > 0
+
+
+def test_mes_corte():
+    assert db_archive.mes_corte(3, date(2025, 2, 15)) == "2024-11"
+    assert db_archive.mes_corte(0, date(2025, 2, 15)) == "2025-02"
+
+
+def test_archive_moves_old_months_and_queries_fan_out(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_utils.archivo, "directorio", str(tmp_path))
+    viejo_1 = _reporte("ARCH-A", "2019-03-10 10:00:00")
+    viejo_2 = _reporte("ARCH-B", "2019-04-02 09:00:00")
+    viejo_3 = _reporte("ARCH-D", "2019-03-15 08:00:00")
+    reciente = _reporte("ARCH-C", "2019-12-20 12:00:00")
+    db_utils.insert_order(viejo_2, "2019-04-05 10:00:00", "Pintura", "Puerta", "Pendiente")
+    db_utils.insert_order(reciente, "2019-12-21 10:00:00", "Pintura", "Capó", "Pendiente")
+
+    # Sin almacén central el change_log nunca se poda: no debe retener nada
+    movidas = db_archive.archivar(db_utils.conn, hot_months=3, directorio=str(tmp_path), vacuum=False,
+                                  hoy=date(2020, 1, 10), sync=False)
+    assert movidas == {"2019-03": 2, "2019-04": 2}
+    assert db_archive.listar_particiones(str(tmp_path)) == ["2019-04", "2019-03"]
+
+    db_utils.c.execute("SELECT id FROM damage_reports WHERE placa = 'ARC001' ORDER BY id")
+    assert [r[0] for r in db_utils.c.fetchall()] == [reciente]
+    assert not _en_change_log("damage_reports", viejo_1) and _en_change_log("damage_reports", reciente)
+
+    filas = db_utils.fetch_reports(desde="2019-03-01", hasta="2019-04-30")
+    assert [r[0] for r in filas if r[2] == "ARC001"] == [viejo_2, viejo_3, viejo_1]
+    assert [r[1] for r in db_utils.fetch_orders(desde="2019-04-01", hasta="2019-04-30")] == [viejo_2]
+    # Sólo abril: la partición de marzo no hace falta
+    assert [r[1] for r in db_utils.search_reports("ARCH-", desde="2019-04-01", hasta="2019-04-30")] == ["ARCH-B"]
+    # Sin rango, con limit: se completa desde el archivo, más reciente primero
+    assert [r[1] for r in db_utils.search_reports("ARCH-", limit=3)] == ["ARCH-C", "ARCH-B", "ARCH-D"]
+
+    # Los pedidos archivados son de sólo lectura
+    pedido = db_utils.fetch_orders(desde="2019-04-01", hasta="2019-04-30")[0][0]
+    assert db_utils.update_order_estado(pedido, "Completado") is False
+
+
+def test_archiving_merges_into_existing_partition(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_utils.archivo, "directorio", str(tmp_path))
+    primero = _reporte("MERGE-A", "2018-06-01 10:00:00")
+    _reporte("MERGE-Z", "2018-12-01 10:00:00")
+    db_archive.archivar(db_utils.conn, directorio=str(tmp_path), vacuum=False, hoy=date(2019, 1, 1), sync=False)
+    # La app ya tiene abierta la partición cuando la CLI vuelve a archivar el mes
+    assert [r[0] for r in db_utils.search_reports("MERGE-", desde="2018-06-01", hasta="2018-06-30")] == [primero]
+    segundo = _reporte("MERGE-B", "2018-06-20 10:00:00")
+    _reporte("MERGE-C", "2018-12-20 10:00:00")  # mantiene en caliente el id más alto
+    db_archive.archivar(db_utils.conn, directorio=str(tmp_path), vacuum=False, hoy=date(2019, 1, 1), sync=False)
+
+    filas = db_utils.search_reports("MERGE-", desde="2018-06-01", hasta="2018-06-30")
+    assert [r[0] for r in filas] == [segundo, primero]
+
+
+def test_unsynced_rows_stay_hot_when_sync_is_configured(tmp_path):
+    previo = db_utils.get_sync_state("pushed_seq", 0)
+    try:
+        subido = _reporte("SYNC-A", "2016-05-01 10:00:00")
+        db_utils.c.execute("SELECT MAX(seq) FROM change_log")
+        db_utils.set_sync_state("pushed_seq", db_utils.c.fetchone()[0])
+        sin_subir = _reporte("SYNC-B", "2016-05-02 10:00:00")
+        _reporte("SYNC-C", "2016-12-01 10:00:00")  # mantiene en caliente el id más alto
+        movidas = db_archive.archivar(db_utils.conn, directorio=str(tmp_path), vacuum=False,
+                                      hoy=date(2017, 1, 1), sync=True)
+        assert movidas == {"2016-05": 1}
+        db_utils.c.execute("SELECT id FROM damage_reports WHERE vin LIKE 'SYNC-%' ORDER BY id")
+        assert [r[0] for r in db_utils.c.fetchall()][:1] == [sin_subir]
+        assert not _en_change_log("damage_reports", subido) and _en_change_log("damage_reports", sin_subir)
+    finally:
+        db_utils.set_sync_state("pushed_seq", previo)
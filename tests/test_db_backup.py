@@ -0,0 +1,69 @@
+"""
+Tests for online SQLite backups, rotation, verify and restore
+"""
+import gzip
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import db_backup
+
+
+def _base(path, filas=500):
+    db = sqlite3.connect(path, check_same_thread=False)
+    db.execute("CREATE TABLE damage_reports (id INTEGER PRIMARY KEY, vin TEXT, detalle TEXT)")
+    db.executemany("INSERT INTO damage_reports (vin, detalle) VALUES (?, ?)",
+                   [(f"VIN{i}", "x" * 200) for i in range(filas)])
+    db.commit()
+    return db
+
+
+def test_backup_in_steps_is_consistent_and_verifiable(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_backup, "PAGES_PER_STEP", 4)
+    db = _base(str(tmp_path / "app.db"))
+    pasos = []
+    snapshot = db_backup.crear_backup(db, str(tmp_path / "bk"), on_progress=lambda hechas, total: pasos.append((hechas, total)))
+
+    assert snapshot.endswith(".db.gz") and os.path.exists(snapshot)
+    assert len(pasos) > 1 and pasos[-1][0] == pasos[-1][1]
+    r = db_backup.verificar(snapshot)
+    assert r["ok"] and r["tablas"] == {"damage_reports": 500}
+
+
+def test_rotation_keeps_newest(tmp_path):
+    carpeta = tmp_path / "bk"
+    carpeta.mkdir()
+    for i in range(5):
+        (carpeta / f"toyota_2025010{i}_000000.db.gz").write_bytes(b"")
+    db_backup.rotar(str(carpeta), conservar=2)
+    assert [os.path.basename(p) for p in db_backup.listar_backups(str(carpeta))] == [
+        "toyota_20250104_000000.db.gz", "toyota_20250103_000000.db.gz"]
+
+
+def test_corrupt_snapshot_fails_verify_and_restore(tmp_path):
+    malo = tmp_path / "toyota_20250101_000000.db.gz"
+    with gzip.open(malo, "wb") as f:
+        f.write(b"no es una base sqlite" * 100)
+    assert not db_backup.verificar(str(malo))["ok"]
+
+    destino = str(tmp_path / "destino.db")
+    _base(destino, filas=3).close()
+    try:
+        db_backup.restaurar(str(malo), destino)
+        assert False, "debió rechazar el snapshot"
+    except sqlite3.DatabaseError:
+        pass
+    assert sqlite3.connect(destino).execute("SELECT COUNT(*) FROM damage_reports").fetchone()[0] == 3
+
+
+def test_restore_replaces_contents(tmp_path):
+    db = _base(str(tmp_path / "app.db"), filas=10)
+    snapshot = db_backup.crear_backup(db, str(tmp_path / "bk"))
+    db.execute("DELETE FROM damage_reports")
+    db.commit()
+    db.close()
+
+    db_backup.restaurar(snapshot, str(tmp_path / "app.db"))
+    assert sqlite3.connect(str(tmp_path / "app.db")).execute("SELECT COUNT(*) FROM damage_reports").fetchone()[0] == 10
@@ -0,0 +1,152 @@
+"""
+Tests for the async image downloader (against a local HTTP server)
+"""
+import asyncio
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import downloader
+import media_store
+
+PAYLOAD = b"\xff\xd8\xff" + b"toyota" * 1000
+ETAG = '"v1"'
+BIG_BODY = b"x" * (2 * 1024 * 1024)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    hits = []
+    conexiones = []
+
+    def do_GET(self):
+        Handler.hits.append((self.path, self.headers.get("If-None-Match")))
+        Handler.conexiones.append(self.client_address[1])
+        if self.path == "/big-redirect.jpg":
+            # Redirección con un cuerpo enorme: el cliente no debe leerlo entero
+            self.send_response(302)
+            self.send_header("Location", "/car.jpg")
+            self.send_header("Content-Length", str(len(BIG_BODY)))
+            self.end_headers()
+            try:
+                self.wfile.write(BIG_BODY)
+            except OSError:
+                self.close_connection = True
+            return
+        if self.path == "/redirect.jpg":
+            self.send_response(302)
+            self.send_header("Location", "/car.jpg")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path == "/missing.jpg":
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.send_header("ETag", ETAG)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(PAYLOAD)))
+        self.send_header("ETag", ETAG)
+        self.end_headers()
+        self.wfile.write(PAYLOAD)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    Handler.hits = []
+    Handler.conexiones = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    httpd.handle_error = lambda request, client_address: None  # clientes que cortan a propósito
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(media_store, "STORE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_downloads_into_content_addressed_store(server):
+    result = downloader.descargar(server + "/car.jpg")
+
+    assert result["cached"] is False
+    assert result["path"] == media_store.path_for(result["sha256"], ".jpg")
+    with open(result["path"], "rb") as f:
+        assert f.read() == PAYLOAD
+
+
+def test_revalidates_with_etag(server):
+    first = downloader.descargar(server + "/car.jpg")
+    second = downloader.descargar(server + "/car.jpg")
+
+    assert second["cached"] is True
+    assert second["path"] == first["path"]
+    assert media_store.retenido(first["path"])  # la compactación de evidencia no lo borra
+    assert Handler.hits[-1] == ("/car.jpg", ETAG)
+
+
+def test_rejects_oversized_files(server):
+    with pytest.raises(downloader.DownloadError):
+        downloader.descargar(server + "/car.jpg", max_bytes=100)
+    tmp_dir = os.path.join(media_store.STORE_DIR, "tmp")
+    assert not os.path.isdir(tmp_dir) or os.listdir(tmp_dir) == []
+
+
+def test_bulk_download_keeps_order_and_reports_errors(server):
+    urls = [server + "/car.jpg", server + "/missing.jpg", server + "/redirect.jpg"]
+    results = asyncio.run(downloader.descargar_todas(urls, max_concurrent=2))
+
+    assert [r["url"] for r in results] == urls
+    assert "error" in results[1]
+    assert results[0]["sha256"] == results[2]["sha256"]
+
+
+def test_connections_are_reused_across_calls(server):
+    downloader.descargar(server + "/car.jpg")
+    downloader.descargar(server + "/redirect.jpg")
+    downloader.descargar_lista([server + "/car.jpg"])
+    # Pool del proceso: todas las peticiones viajan por la misma conexión keep-alive
+    assert len(Handler.conexiones) == 4 and len(set(Handler.conexiones)) == 1
+
+
+def test_large_redirect_body_is_not_read(server):
+    result = downloader.descargar(server + "/big-redirect.jpg")
+    with open(result["path"], "rb") as f:
+        assert f.read() == PAYLOAD
+    # La conexión de la redirección se cerró en lugar de drenar 2 MB
+    assert Handler.conexiones[0] != Handler.conexiones[1]
+
+
+def test_reads_urls_from_dms_export(tmp_path):
+    export = tmp_path / "dms.csv"
+    export.write_text(
+        "vin,foto\n"
+        "JT123,https://dms.example.com/a.jpg\n"
+        "JT456,\"https://dms.example.com/b.jpg\"\n"
+        "JT123,https://dms.example.com/a.jpg\n",
+        encoding="utf-8",
+    )
+
+    assert downloader.leer_lista_urls(str(export)) == [
+        "https://dms.example.com/a.jpg",
+        "https://dms.example.com/b.jpg",
+    ]
@@ -0,0 +1,101 @@
+"""
+Tests for the managed evidence store (content-addressed copy, compact
+versions and the keep-originals-only-for-Grave policy)
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("TOYOTA_DB_PATH", os.path.join(tempfile.mkdtemp(), "toyota_test.db"))
+
+import db_utils
+import evidence_store
+import media_store
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(media_store, "STORE_DIR", str(tmp_path / "media"))
+
+    def copia_compacta(origen, destino, **kwargs):
+        # Sustituto de la codificación: basta con que produzca el archivo derivado
+        shutil.copyfile(origen, destino)
+        return destino
+
+    monkeypatch.setattr(evidence_store, "transcodificar_foto", copia_compacta)
+    return evidence_store.EvidenceStore(workers=1)
+
+
+def _foto(tmp_path, nombre, contenido):
+    ruta = tmp_path / nombre
+    ruta.write_bytes(contenido)
+    return str(ruta)
+
+
+def test_ingest_is_content_addressed_and_survives_temp_cleanup(store, tmp_path):
+    a = _foto(tmp_path, "a.jpg", b"foto-a" * 100)
+    copia = _foto(tmp_path, "copia.JPG", b"foto-a" * 100)
+    claves = store.ingresar([a, copia])
+    assert claves[0] == claves[1] and len(claves[0]) == 64 + len(".jpg")
+
+    os.remove(a)
+    os.remove(copia)
+    assert open(store.resolver(claves[0]), "rb").read() == b"foto-a" * 100
+    # Ya es una clave del almacén: no se vuelve a copiar
+    assert store.ingresar(claves[:1]) == claves[:1]
+
+
+def test_originals_kept_only_for_grave(store, tmp_path):
+    moderada, grave = store.ingresar([_foto(tmp_path, "moderada.jpg", b"moderada"), _foto(tmp_path, "grave.jpg", b"grave")])
+    for futuro in store.procesar([moderada], "Moderada") + store.procesar([grave], "Grave"):
+        futuro.result(timeout=10)
+
+    assert not os.path.exists(store.original(moderada))
+    assert store.resolver(moderada).endswith(".min.webp")
+    assert os.path.exists(store.original(grave))
+    assert evidence_store.fetch_evidence(grave)["estado"] == "done"
+
+
+def test_original_referenced_by_download_cache_is_kept(store, tmp_path):
+    clave = store.ingresar([_foto(tmp_path, "descargada.jpg", b"descargada")])[0]
+    media_store.retener(store.original(clave))  # como hace downloader al guardar su cache
+    for futuro in store.procesar([clave], "Moderada"):
+        futuro.result(timeout=10)
+    assert os.path.exists(store.original(clave))
+    assert store.resolver(clave).endswith(".min.webp")
+
+
+def test_missing_file_keeps_its_path(store, tmp_path):
+    falta = str(tmp_path / "no_existe.jpg")
+    assert store.ingresar([falta]) == [falta]
+    assert store.procesar([falta], "Moderada") == []
+    assert store.resolver(falta) is None
+
+
+def test_report_evidence_is_copied_and_linked_in_background(store, tmp_path):
+    foto = _foto(tmp_path, "panel.jpg", b"panel" * 50)
+    anotada = evidence_store.guardar_bytes(b"webp-anotada", ".webp")
+    reporte_id = db_utils.insert_report("EVI1", "EVI001", "Rayón", "Moderada", foto)
+    # Mientras se copia, el reporte apunta a la ruta original y ésta se resuelve
+    assert store.resolver(db_utils.fetch_report(reporte_id)[6]) == foto
+
+    claves = store.ingresar_reporte(reporte_id, [foto], "Moderada", [(foto, anotada, "Moderada")]).result(timeout=10)
+    assert len(claves) == 1 and claves[0] != foto
+    assert db_utils.fetch_report(reporte_id)[6] == claves[0]
+    assert db_utils.fetch_report_annotations(reporte_id) == [(claves[0], anotada, "Moderada")]
+    for futuro in store.procesar(claves, "Moderada"):  # la compacta ya estaba encolada
+        futuro.result(timeout=10)
+    assert store.resolver(claves[0]).endswith(".min.webp")
+
+
+def test_real_webp_transcode(tmp_path):
+    cv2 = pytest.importorskip("cv2")
+    np = pytest.importorskip("numpy")
+    origen = str(tmp_path / "grande.png")
+    cv2.imwrite(origen, np.full((3000, 1500, 3), 128, dtype=np.uint8))
+    escrito = evidence_store.transcodificar_foto(origen, str(tmp_path / "x.min.webp"), max_side=1000)
+    assert cv2.imread(escrito).shape[:2] == (1000, 500)
@@ -0,0 +1,145 @@
+"""
+Tests for the shared-memory frame arena: refcounts shared across processes,
+bounded waits for a free slot and parallel video decoding without a local
+model in the workers
+"""
+import inspect
+import multiprocessing as mp
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+np = pytest.importorskip("numpy")
+cv2 = pytest.importorskip("cv2")
+
+import frame_arena
+from frame_arena import ArenaFullError, FrameArena
+
+
+def _escribir_y_soltar(arena, ref, valor):
+    # Se ejecuta en otro proceso: escribe en el slot y suelta su referencia
+    arena.view(ref)[...] = valor
+    arena.release(ref)
+
+
+def _adquirir(arena, cola):
+    cola.put(arena.acquire(timeout=5))
+
+
+def _video(path, frames=12, size=(160, 120)):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 10, size)
+    if not writer.isOpened():
+        pytest.skip("OpenCV sin codificador de video")
+    for i in range(frames):
+        writer.write(np.full((size[1], size[0], 3), 10 * i, dtype=np.uint8))
+    writer.release()
+    return str(path)
+
+
+@pytest.fixture
+def ctx():
+    return mp.get_context("spawn")
+
+
+def test_refcount_shared_across_processes(ctx):
+    arena = FrameArena(slots=2, slot_bytes=64, ctx=ctx)
+    try:
+        slot = arena.acquire()
+        arena.retain(slot)  # referencia para el proceso hijo
+        ref = arena.ref(slot, (4, 4), np.uint8)
+        p = ctx.Process(target=_escribir_y_soltar, args=(arena, ref, 7))
+        p.start()
+        p.join(30)
+        assert p.exitcode == 0
+        assert (arena.view(ref) == 7).all()
+        assert arena.in_use() == 1  # aún queda la referencia de este proceso
+        arena.release(ref)
+        assert arena.in_use() == 0
+        arena.release(ref)  # liberar de más no deja el conteo negativo
+        assert arena.in_use() == 0
+    finally:
+        arena.close()
+
+
+def test_slot_released_in_parent_is_acquired_by_child(ctx):
+    arena = FrameArena(slots=1, slot_bytes=64, ctx=ctx)
+    try:
+        slot = arena.acquire()
+        with pytest.raises(ArenaFullError):
+            arena.acquire(timeout=0.05)
+        cola = ctx.Queue()
+        p = ctx.Process(target=_adquirir, args=(arena, cola))
+        p.start()
+        arena.release(slot)
+        assert cola.get(timeout=30) == slot
+        p.join(30)
+        assert arena.in_use() == 1  # el hijo salió sin soltarlo
+    finally:
+        arena.close()
+
+
+def test_acquire_waits_a_bounded_time():
+    assert inspect.signature(FrameArena.acquire).parameters["timeout"].default == frame_arena.ACQUIRE_TIMEOUT
+    assert frame_arena.ACQUIRE_TIMEOUT is not None
+
+    arena = FrameArena(slots=1, slot_bytes=64)
+    try:
+        ref = arena.put(np.zeros((2, 2), dtype=np.uint8))
+        with pytest.raises(ArenaFullError):
+            arena.put(np.zeros((2, 2), dtype=np.uint8), timeout=0.05)
+        arena.release(ref)
+        with pytest.raises(ValueError):
+            arena.put(np.zeros((100, 100), dtype=np.uint8))
+        assert arena.in_use() == 0  # el slot del frame que no cabía se devolvió
+    finally:
+        arena.close()
+
+
+def test_frames_decoded_into_slots(tmp_path):
+    video = _video(tmp_path / "a.avi")
+    arena = FrameArena(slots=3, slot_bytes=160 * 120 * 3)
+    try:
+        refs = list(frame_arena.frames_en_arena(video, arena, num_frames=3))
+        assert len(refs) == 3 and arena.in_use() == 3
+        assert all(r.shape == (120, 160, 3) for r in refs)
+        medias = [float(arena.view(r).mean()) for r in refs]
+        assert medias[0] < medias[1] < medias[2]
+        for r in refs:
+            arena.release(r)
+        assert arena.in_use() == 0
+    finally:
+        arena.close()
+
+
+def test_slots_sized_for_largest_video(tmp_path):
+    chico = _video(tmp_path / "chico.avi", frames=2)
+    grande = _video(tmp_path / "4k.avi", frames=2, size=(3840, 2160))
+    assert frame_arena.bytes_por_frame([chico]) == frame_arena.DEFAULT_SLOT_BYTES
+    assert frame_arena.bytes_por_frame([chico, grande, str(tmp_path / "no_existe.avi")]) == 3840 * 2160 * 3
+
+
+def test_parallel_videos_infer_in_parent_without_server(tmp_path, monkeypatch):
+    monkeypatch.delenv("TOYOTA_INFERENCE_SOCKET", raising=False)
+    videos = [_video(tmp_path / f"v{i}.avi") for i in range(2)]
+    roto = str(tmp_path / "roto.avi")
+    open(roto, "wb").write(b"no es un video")
+    vistos = []
+
+    def analizar(img):
+        vistos.append(os.getpid())
+        return f"media {img.mean():.0f}", "Perfecto"
+
+    arena = FrameArena(slots=4, slot_bytes=160 * 120 * 3, ctx=mp.get_context("spawn"))
+    try:
+        r = frame_arena.analizar_videos_paralelo(videos + [roto], num_frames=2, workers=2,
+                                                 arena=arena, analizar=analizar)
+        assert arena.in_use() == 0
+    finally:
+        arena.close()
+    assert set(r) >= set(videos)
+    assert all(len(r[v]) == 2 for v in videos)
+    assert r.get(roto, []) == []
+    assert set(vistos) == {os.getpid()}  # la inferencia no ocurre en los workers
@@ -0,0 +1,71 @@
+"""
+Cold-start budget: importing the app module must stay cheap so the page can
+render before cv2 / ultralytics load in the background.
+"""
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+# Budget for `import toyota_damage_pro` (cumulative, microseconds); override per machine
+IMPORT_BUDGET_US = int(os.environ.get("TOYOTA_IMPORT_BUDGET_US", "1500000"))
+# Modules that must not be imported on the startup path
+HEAVY_MODULES = ("cv2", "numpy", "ultralytics", "torch", "detector")
+
+LINE_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+# Sin flet instalado se sustituye por un módulo vacío: lo que se mide es el resto del arranque
+FLET_STUB = (
+    "import importlib.util, sys, types\n"
+    "if importlib.util.find_spec('flet') is None:\n"
+    "    ft = types.ModuleType('flet')\n"
+    "    ft.__getattr__ = lambda name: type(name, (), {})\n"
+    "    sys.modules['flet'] = ft\n"
+)
+
+
+def _importtime(module, home):
+    env = dict(os.environ, HOME=str(home), PYTHONDONTWRITEBYTECODE="1")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", FLET_STUB + f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=120,
+    )
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    times = {}
+    for line in proc.stderr.splitlines():
+        m = LINE_RE.match(line)
+        if m:
+            times[m.group(4)] = int(m.group(2))
+    return times
+
+
+@pytest.fixture(scope="module")
+def importtimes(tmp_path_factory):
+    return _importtime("toyota_damage_pro", tmp_path_factory.mktemp("home"))
+
+
+def test_cold_start_within_budget(importtimes):
+    assert importtimes["toyota_damage_pro"] <= IMPORT_BUDGET_US, (
+        f"import toyota_damage_pro took {importtimes['toyota_damage_pro'] / 1000:.0f} ms "
+        f"(budget {IMPORT_BUDGET_US / 1000:.0f} ms)"
+    )
+
+
+def test_heavy_modules_are_lazy(importtimes):
+    loaded = [m for m in HEAVY_MODULES if m in importtimes]
+    assert loaded == [], f"imported at startup: {loaded}"
+
+
+def test_import_does_not_configure_logging(tmp_path):
+    # Los workers spawn reimportan el módulo principal: importar no debe abrir el log
+    env = dict(os.environ, HOME=str(tmp_path), PYTHONDONTWRITEBYTECODE="1")
+    proc = subprocess.run(
+        [sys.executable, "-c", FLET_STUB + "import app_logging, toyota_damage_pro; print(app_logging._listener)"],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=120,
+    )
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    assert proc.stdout.strip() == "None"
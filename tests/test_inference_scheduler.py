@@ -0,0 +1,74 @@
+"""
+Tests for the priority-aware inference scheduler
+"""
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from inference_scheduler import BACKGROUND, BATCH, INTERACTIVE, InferenceScheduler, SchedulerBusyError
+
+
+def _blocked(scheduler):
+    """Ocupa el worker hasta que se libere el evento devuelto"""
+    gate, started = threading.Event(), threading.Event()
+
+    def bloquear():
+        started.set()
+        gate.wait(5)
+    scheduler.submit(bloquear, priority=BACKGROUND, session="x")
+    assert started.wait(5)
+    return gate
+
+
+def test_interactive_runs_before_queued_batch_work():
+    s = InferenceScheduler(workers=1, max_queue=100)
+    gate = _blocked(s)
+    orden = []
+    batch = [s.submit(orden.append, f"b{i}", priority=BATCH, session="lote") for i in range(5)]
+    inter = s.submit(orden.append, "i", priority=INTERACTIVE, session="asesor")
+    gate.set()
+    for t in batch + [inter]:
+        t.future.result(5)
+    assert orden[0] == "i"
+    assert s.stats()["interactiva"]["done"] == 1
+
+
+def test_sessions_take_turns_within_a_class():
+    s = InferenceScheduler(workers=1, max_queue=100)
+    gate = _blocked(s)
+    orden = []
+    tickets = [s.submit(orden.append, f"a{i}", priority=BATCH, session="a") for i in range(3)]
+    tickets += [s.submit(orden.append, f"b{i}", priority=BATCH, session="b") for i in range(3)]
+    gate.set()
+    for t in tickets:
+        t.future.result(5)
+    assert orden == ["a0", "b0", "a1", "b1", "a2", "b2"]
+
+
+def test_full_queue_sheds_lowest_priority_then_rejects():
+    s = InferenceScheduler(workers=1, max_queue=2)
+    gate = _blocked(s)
+    fondo = s.submit(lambda: "f", priority=BACKGROUND, session="kiosco")
+    s.submit(lambda: "b", priority=BATCH, session="lote")
+    # Cola llena: la interactiva desplaza la de fondo
+    inter = s.submit(lambda: "i", priority=INTERACTIVE, session="asesor")
+    with pytest.raises(SchedulerBusyError):
+        fondo.future.result(1)
+    # Sin nada de menor prioridad que desalojar: rechazo
+    with pytest.raises(SchedulerBusyError):
+        s.submit(lambda: "b2", priority=BATCH, session="lote")
+    gate.set()
+    assert inter.future.result(5) == "i"
+    stats = s.stats()
+    assert stats["fondo"]["shed"] == 1 and stats["lote"]["shed"] == 1
+
+
+def test_run_returns_result_and_wait():
+    s = InferenceScheduler(workers=1)
+    resultado, espera_ms = s.run(lambda x: x * 2, 21, priority=INTERACTIVE)
+    assert resultado == 42
+    assert espera_ms >= 0
@@ -0,0 +1,104 @@
+"""
+Tests for the shared inference server: length-prefixed protocol, frames passed
+through shared memory and micro-batching of concurrent clients
+"""
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+np = pytest.importorskip("numpy")
+cv2 = pytest.importorskip("cv2")
+
+import detector
+import inference_server
+from inference_server import InferenceClient, InferenceServer
+
+
+@pytest.fixture
+def lotes(monkeypatch):
+    """Sustituye el modelo: registra cada lote (media de cada frame) y devuelve un auto por frame"""
+    vistos = []
+
+    def detectar_lote(imgs):
+        vistos.append([round(float(img.mean())) for img in imgs])
+        return [[{"box": (0, 0, 8, 8), "conf": 0.9, "daños": ["Rayón"], "severidad": "Moderada"}] for _ in imgs]
+
+    monkeypatch.setattr(detector, "cargar_modelo", lambda: None)
+    monkeypatch.setattr(detector, "detectar_vehiculos_lote", detectar_lote)
+    monkeypatch.setattr(detector, "resumir_detecciones", lambda img, dets: ("Rayón", "Moderada"))
+    return vistos
+
+
+@pytest.fixture
+def servidor(lotes):
+    # Ruta corta: los sockets Unix admiten ~100 caracteres
+    directorio = tempfile.mkdtemp(prefix="tdp")
+    srv = InferenceServer(os.path.join(directorio, "inf.sock"), max_batch=8, window_ms=300)
+    loop = asyncio.new_event_loop()
+    tarea = loop.create_task(srv.serve())
+
+    def correr():
+        try:
+            loop.run_until_complete(tarea)
+        except asyncio.CancelledError:
+            pass
+
+    hilo = threading.Thread(target=correr, daemon=True)
+    hilo.start()
+    limite = time.monotonic() + 10
+    while not os.path.exists(srv.path) and time.monotonic() < limite:
+        time.sleep(0.01)
+    yield srv
+    loop.call_soon_threadsafe(tarea.cancel)
+    hilo.join(5)
+    loop.close()
+    shutil.rmtree(directorio, ignore_errors=True)
+
+
+def test_concurrent_clients_share_one_batch(servidor, lotes):
+    cliente = InferenceClient(servidor.path)
+    barrera = threading.Barrier(4)
+    respuestas = {}
+
+    def pedir(i):
+        img = np.full((32, 32, 3), 10 * (i + 1), dtype=np.uint8)
+        barrera.wait()
+        if i % 2:
+            respuestas[i] = cliente.detectar_frame(img)  # memoria compartida
+        else:
+            respuestas[i] = cliente.detectar_bytes(cv2.imencode(".png", img)[1].tobytes())
+
+    hilos = [threading.Thread(target=pedir, args=(i,)) for i in range(4)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join(10)
+
+    assert len(lotes) == 1 and sorted(lotes[0]) == [10, 20, 30, 40]
+    assert all(r["ok"] and r["severidad"] == "Moderada" for r in respuestas.values())
+    assert respuestas[1]["detecciones"][0]["box"] == [0, 0, 8, 8]
+    info = cliente.info()
+    assert (info["batches"], info["requests"]) == (1, 4)
+
+
+def test_shm_frame_is_read_in_place(servidor, lotes):
+    from multiprocessing import shared_memory
+    cliente = InferenceClient(servidor.path)
+    shm = shared_memory.SharedMemory(create=True, size=16 * 16 * 3)
+    try:
+        np.ndarray((16, 16, 3), dtype=np.uint8, buffer=shm.buf)[...] = 77
+        r = cliente.detectar_shm(shm.name, (16, 16, 3), "uint8")
+        assert r["ok"] and lotes == [[77]]
+    finally:
+        shm.close()
+        shm.unlink()
+    assert cliente.request({"op": "nada"}) == {"ok": False, "error": "Operación desconocida: nada"}
+    assert inference_server.get_client(servidor.path) is inference_server.get_client(servidor.path)
@@ -0,0 +1,81 @@
+"""
+Tests for the resumable analysis job journal
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("TOYOTA_DB_PATH", os.path.join(tempfile.mkdtemp(), "toyota_test.db"))
+
+import db_utils
+
+
+def _simular_reinicio(job_id):
+    """El trabajo queda como si lo hubiera dejado a medias otro proceso"""
+    db_utils.c.execute("UPDATE analysis_jobs SET pid = -1 WHERE id = ?", (job_id,))
+    db_utils.conn.commit()
+
+
+def _asignar(job_id, pid, latido):
+    db_utils.c.execute("UPDATE analysis_jobs SET pid = ?, latido = ? WHERE id = ?", (pid, latido, job_id))
+    db_utils.conn.commit()
+
+
+def test_items_keep_state_and_results():
+    job_id = db_utils.create_job("VIN1", "ABC123", [["a.jpg", "a2.jpg"], ["b.mp4"]])
+    items = db_utils.fetch_job_items(job_id)
+    assert [(it[2], it[3], it[4]) for it in items] == [("a.jpg", ["a.jpg", "a2.jpg"], "queued"), ("b.mp4", ["b.mp4"], "queued")]
+
+    db_utils.update_job_item(items[0][0], "decoded")
+    db_utils.update_job_item(items[0][0], "inferred", ["📷 a.jpg: Abolladura"], "Moderada")
+    primero = db_utils.fetch_job_items(job_id)[0]
+    assert primero[4:] == ("inferred", ["📷 a.jpg: Abolladura"], "Moderada")
+
+
+def test_interrupted_job_is_claimed_once_and_finished():
+    job_id = db_utils.create_job("VIN2", "XYZ789", [["c.jpg"]])
+    # En el propio proceso el trabajo está en curso, no interrumpido
+    assert job_id not in [j[0] for j in db_utils.fetch_interrupted_jobs()]
+
+    _simular_reinicio(job_id)
+    assert job_id in [j[0] for j in db_utils.fetch_interrupted_jobs()]
+    assert db_utils.claim_job(job_id)
+    assert not db_utils.claim_job(job_id)
+
+    reporte_id = db_utils.insert_report("VIN2", "XYZ789", "Sin daños", "Perfecto", "c.jpg")
+    db_utils.finish_job(job_id, reporte_id)
+    assert [it[4] for it in db_utils.fetch_job_items(job_id)] == ["persisted"]
+    _simular_reinicio(job_id)
+    assert job_id not in [j[0] for j in db_utils.fetch_interrupted_jobs()]
+
+
+def test_job_of_live_foreign_process_is_not_adopted():
+    job_id = db_utils.create_job("VIN3", "LIV001", [["d.jpg"]])
+    otro = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+    try:
+        _asignar(job_id, otro.pid, db_utils._now())
+        assert job_id not in [j[0] for j in db_utils.fetch_interrupted_jobs()]
+        assert not db_utils.claim_job(job_id)
+
+        # Sigue vivo pero sin latido hace rato: colgado (o pid reutilizado)
+        _asignar(job_id, otro.pid, "2000-01-01 00:00:00")
+        assert job_id in [j[0] for j in db_utils.fetch_interrupted_jobs()]
+    finally:
+        otro.kill()
+        otro.wait()
+
+    # El proceso terminó: se adopta aunque el latido sea reciente
+    _asignar(job_id, otro.pid, db_utils._now())
+    assert job_id in [j[0] for j in db_utils.fetch_interrupted_jobs()]
+    assert db_utils.claim_job(job_id)
+    assert not db_utils.claim_job(job_id)
+
+
+def test_item_progress_refreshes_heartbeat():
+    job_id = db_utils.create_job("VIN4", "LAT001", [["e.jpg"]])
+    _asignar(job_id, os.getpid(), "2000-01-01 00:00:00")
+    db_utils.update_job_item(db_utils.fetch_job_items(job_id)[0][0], "decoded")
+    latido = db_utils.c.execute("SELECT latido FROM analysis_jobs WHERE id = ?", (job_id,)).fetchone()[0]
+    assert latido > "2000-01-01 00:00:00"
@@ -0,0 +1,112 @@
+"""
+Tests for kiosk sync: change log, incremental push/pull and conflict rules.
+Each kiosk runs in its own process (db_utils holds one global connection).
+"""
+import json
+import os
+import subprocess
+import sys
+import threading
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+
+import sync_central
+
+
+def _kiosco(tmp_path, nombre, central, codigo):
+    env = dict(os.environ, TOYOTA_DB_PATH=str(tmp_path / f"{nombre}.db"))
+    script = (
+        "import json, db_utils\n"
+        "from sync_agent import SyncAgent, abrir_central\n"
+        f"agent = SyncAgent(abrir_central({central!r}))\n"
+        f"{codigo}\n"
+    )
+    out = subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1]) if out.stdout.strip() else None
+
+
+def test_reports_and_orders_flow_between_kiosks(tmp_path):
+    central = str(tmp_path / "central.db")
+    _kiosco(tmp_path, "a", central,
+            "r = db_utils.insert_report('VIN1', 'AAA111', 'Rayón', 'Moderada', 'x.jpg')\n"
+            "db_utils.insert_order(r, '2025-01-01', 'Pintura', 'Puerta', 'Pendiente')\n"
+            "print(json.dumps(agent.sincronizar()))")
+    b = _kiosco(tmp_path, "b", central,
+                "r = agent.sincronizar()\n"
+                "db_utils.c.execute('SELECT r.vin, o.tipo_pedido FROM repair_orders o JOIN damage_reports r ON r.id = o.reporte_id')\n"
+                "print(json.dumps([r, db_utils.c.fetchall()]))")
+    assert b[0]["bajados"] == 2
+    assert b[1] == [["VIN1", "Pintura"]]
+
+    # Segundo ciclo sin cambios: incremental, nada se vuelve a subir ni bajar
+    again = _kiosco(tmp_path, "b", central, "print(json.dumps(agent.sincronizar()))")
+    assert again["subidos"] == again["bajados"] == 0
+
+
+def test_last_writer_wins_on_order_estado(tmp_path):
+    central = str(tmp_path / "central.db")
+    _kiosco(tmp_path, "a", central,
+            "r = db_utils.insert_report('VIN1', 'AAA111', 'Rayón', 'Moderada', 'x.jpg')\n"
+            "db_utils.insert_order(r, '2025-01-01', 'Pintura', 'Puerta', 'Pendiente')\n"
+            "agent.sincronizar()")
+    _kiosco(tmp_path, "b", central, "agent.sincronizar()")
+    # A cambia primero, B después; A sincroniza antes pero la versión de B es más nueva
+    _kiosco(tmp_path, "a", central, "db_utils.update_order_estado(1, 'Completado')")
+    _kiosco(tmp_path, "b", central, "db_utils.update_order_estado(1, 'En taller')")
+    _kiosco(tmp_path, "a", central, "agent.sincronizar()")
+    b = _kiosco(tmp_path, "b", central, "print(json.dumps(agent.sincronizar()))")
+    a = _kiosco(tmp_path, "a", central,
+                "agent.sincronizar()\n"
+                "db_utils.c.execute('SELECT estado FROM repair_orders')\n"
+                "print(json.dumps(db_utils.c.fetchall()))")
+    assert b["bajados"] == 0  # la de A era más vieja
+    assert a == [["En taller"]]
+
+
+def test_http_stand_in_roundtrip(tmp_path):
+    store = sync_central.CentralStore(str(tmp_path / "central.db"))
+    servidor = sync_central.crear_servidor(store, port=0)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    try:
+        cliente = sync_central.HttpCentral(f"http://127.0.0.1:{servidor.server_address[1]}")
+        cambio = {"tabla": "damage_reports", "op": "insert", "origen": "k1", "id": 1,
+                  "modificado": "2025-01-01T00:00:00.000000", "fila": {"vin": "VIN1"}}
+        assert cliente.push("k1", sync_central.comprimir([cambio])) == {"aceptados": 1, "rechazados": 0}
+        assert cliente.push("k1", sync_central.comprimir([cambio])) == {"aceptados": 0, "rechazados": 1}
+        lote, ultimo = cliente.pull("k2", 0)
+        assert sync_central.descomprimir(lote) == [cambio] and ultimo == 1
+        lote, ultimo = cliente.pull("k1", 0)
+        assert sync_central.descomprimir(lote) == [] and ultimo == 1
+    finally:
+        servidor.shutdown()
+
+
+def test_sync_thread_does_not_commit_or_discard_other_writes(tmp_path):
+    # En un proceso aparte: la UI inserta mientras el agente aplica cambios
+    # remotos y uno de ellos falla a mitad de su transacción
+    codigo = (
+        "import threading\n"
+        "remotos = [{'tabla': 'damage_reports', 'op': 'insert', 'origen': 'otro', 'id': i,\n"
+        "            'modificado': '2030-01-01T00:00:00', 'fila': {'vin': f'R{i}', 'placa': 'R', 'fecha': '2030-01-01',\n"
+        "            'daños': '', 'severidad': 'Perfecto', 'foto_path': ''}} for i in range(200)]\n"
+        "malo = dict(remotos[0], id=999, tabla='repair_orders', fila={'reporte_id': 'no-es-lista'})\n"
+        "fallos = []\n"
+        "def agente():\n"
+        "    for i in range(0, 200, 10):\n"
+        "        db_utils.apply_remote_changes(remotos[i:i + 10])\n"
+        "        try:\n"
+        "            db_utils.apply_remote_changes([dict(remotos[0], id=1000 + i), malo])  # el primero se deshace\n"
+        "        except ValueError:\n"
+        "            fallos.append(1)\n"
+        "        agent.push()\n"
+        "t = threading.Thread(target=agente)\n"
+        "t.start()\n"
+        "locales = [db_utils.insert_report(f'L{i}', 'L', '', 'Perfecto', '') for i in range(200)]\n"
+        "t.join()\n"
+        "sin_log = db_utils.conn.execute(\"SELECT COUNT(*) FROM damage_reports WHERE placa = 'L' AND id NOT IN \"\n"
+        "    \"(SELECT local_id FROM sync_rows WHERE tabla = 'damage_reports')\").fetchone()[0]\n"
+        "print(json.dumps([len(set(locales)), len(fallos), sin_log,\n"
+        "    db_utils.conn.execute(\"SELECT COUNT(*) FROM damage_reports WHERE placa = 'R'\").fetchone()[0]]))"
+    )
+    assert _kiosco(tmp_path, "a", str(tmp_path / "central.db"), codigo) == [200, 20, 0, 200]
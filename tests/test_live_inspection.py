@@ -0,0 +1,95 @@
+"""
+Tests for live inspection: the size-1 frame queue drops the oldest frame and
+the inference loop stays within its duty cycle
+"""
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from live_inspection import LatestFrameQueue, LiveInspector
+
+
+class ServicioFalso:
+    """Imita CaptureService: listeners por frame y último frame"""
+
+    def __init__(self):
+        self.listeners = []
+        self.frame = np.zeros((48, 64, 3), dtype=np.uint8)
+
+    def add_listener(self, fn):
+        self.listeners.append(fn)
+
+    def remove_listener(self, fn):
+        self.listeners.remove(fn)
+
+    def latest(self):
+        return self.frame
+
+    def emitir(self, segundos, fps=100):
+        fin = time.monotonic() + segundos
+        while time.monotonic() < fin:
+            for fn in list(self.listeners):
+                fn(self.frame, time.monotonic())
+            time.sleep(1.0 / fps)
+
+
+def test_queue_keeps_only_latest_frame():
+    q = LatestFrameQueue()
+    assert q.get(timeout=0.01) is None
+    for i in range(3):
+        q.put(f"frame{i}", i)
+    assert q.dropped == 2
+    assert q.get(timeout=0.01) == ("frame2", 2)
+    assert q.get(timeout=0.01) is None
+
+
+def test_queue_wakes_waiting_consumer():
+    q = LatestFrameQueue()
+    recibido = []
+    t = threading.Thread(target=lambda: recibido.append(q.get(timeout=5)))
+    t.start()
+    time.sleep(0.05)
+    q.put("f", 1.0)
+    t.join(5)
+    assert recibido == [("f", 1.0)] and q.dropped == 0
+
+
+def test_inference_loop_respects_duty_cycle_and_drops_backlog():
+    servicio = ServicioFalso()
+    inicios = []
+
+    def detectar(frame):
+        inicios.append(time.monotonic())
+        time.sleep(0.05)
+        return [{"box": (1, 1, 10, 10), "conf": 0.9, "daños": ["Rayón"], "severidad": "Moderada"}]
+
+    previews = []
+    inspector = LiveInspector(servicio, lambda url, dets, stats: previews.append((url, dets)),
+                              preview_fps=10, duty_cycle=0.5, detectar=detectar)
+    inspector.start()
+    try:
+        servicio.emitir(1.0)
+    finally:
+        inspector.stop()
+    assert not servicio.listeners and not inspector.running
+
+    # 50 ms de inferencia con ciclo 0.5 -> una inferencia cada ~100 ms como mucho
+    huecos = [b - a for a, b in zip(inicios, inicios[1:])]
+    assert 5 <= len(inicios) <= 12
+    assert min(huecos) >= 0.09
+    st = inspector.stats()
+    assert 40 <= st["latency_ms"] <= 150
+    assert st["dropped"] > 50  # los frames que llegan durante la inferencia se descartan
+    assert st["inferences"] == len(inicios)
+
+    assert 3 <= len(previews) <= 12  # limitado a preview_fps
+    assert previews[-1][0].startswith("data:image/jpeg;base64,")
+    assert previews[-1][1][0]["severidad"] == "Moderada"
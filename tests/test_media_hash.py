@@ -0,0 +1,88 @@
+"""
+Tests for perceptual hashing of gallery photos: re-encoded or resized copies
+group together, different shots stay apart and previous reports are found
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+np = pytest.importorskip("numpy")
+cv2 = pytest.importorskip("cv2")
+
+import media_hash
+from media_hash import HashIndex, dhash, hamming
+
+
+def _foto(semilla, size=(640, 480)):
+    """Escena suave y con estructura (como un panel fotografiado), distinta por semilla"""
+    base = np.random.default_rng(semilla).integers(0, 255, (12, 16, 3), dtype=np.uint8)
+    return cv2.resize(base, size, interpolation=cv2.INTER_CUBIC)
+
+
+@pytest.fixture
+def fotos(tmp_path):
+    original = _foto(1)
+    rutas = {
+        "original": tmp_path / "original.png",
+        "jpeg": tmp_path / "recodificada.jpg",
+        "chica": tmp_path / "reducida.png",
+        "otra": tmp_path / "otra.png",
+    }
+    cv2.imwrite(str(rutas["original"]), original)
+    cv2.imwrite(str(rutas["jpeg"]), original, [cv2.IMWRITE_JPEG_QUALITY, 35])
+    cv2.imwrite(str(rutas["chica"]), cv2.resize(original, (320, 240), interpolation=cv2.INTER_AREA))
+    cv2.imwrite(str(rutas["otra"]), _foto(2))
+    return {k: str(v) for k, v in rutas.items()}
+
+
+def test_dhash_is_stable_under_reencoding_and_resizing():
+    original = _foto(1)
+    h = dhash(original)
+    assert 0 <= h < 2 ** 64
+    recodificada = cv2.imdecode(cv2.imencode(".jpg", original, [cv2.IMWRITE_JPEG_QUALITY, 35])[1], cv2.IMREAD_COLOR)
+    assert hamming(h, dhash(recodificada)) <= media_hash.DUPLICATE_THRESHOLD
+    assert hamming(h, dhash(cv2.resize(original, (200, 150)))) <= media_hash.DUPLICATE_THRESHOLD
+    assert hamming(h, dhash(cv2.cvtColor(original, cv2.COLOR_BGR2GRAY))) == 0
+    assert hamming(h, dhash(_foto(2))) > media_hash.DUPLICATE_THRESHOLD
+    assert media_hash.from_hex(media_hash.to_hex(h)) == h
+
+
+def test_agrupar_keeps_order_and_puts_duplicates_together(fotos, tmp_path):
+    video = tmp_path / "paseo.mp4"
+    video.write_bytes(b"no importa")
+    rotas = tmp_path / "rota.jpg"
+    rotas.write_bytes(b"no es una imagen")
+    indice = HashIndex()
+    grupos = indice.agrupar([fotos["original"], str(video), fotos["otra"], fotos["jpeg"], str(rotas), fotos["chica"]])
+    assert grupos == [
+        [fotos["original"], fotos["jpeg"], fotos["chica"]],
+        [str(video)],
+        [fotos["otra"]],
+        [str(rotas)],
+    ]
+
+
+def test_cache_invalidated_when_file_changes(fotos):
+    indice = HashIndex()
+    antes = indice.get(fotos["original"])
+    assert indice.get(fotos["original"]) == antes
+    cv2.imwrite(fotos["original"], _foto(3))
+    os.utime(fotos["original"], ns=(1, 1))
+    assert hamming(indice.get(fotos["original"]), antes) > media_hash.DUPLICATE_THRESHOLD
+
+
+def test_buscar_previo_finds_closest_previous_shot(fotos):
+    indice = HashIndex()
+    h_original = indice.get(fotos["original"])
+    h_otra = indice.get(fotos["otra"])
+    previos = [
+        (media_hash.to_hex(h_otra), "otra.png", "2025-01-01", "Rayón", "Moderada"),
+        (media_hash.to_hex(h_original), "original.png", "2025-01-02", "Abolladura", "Grave"),
+    ]
+    assert indice.buscar_previo(fotos["jpeg"], previos)[1] == "original.png"
+    assert indice.buscar_previo(fotos["chica"], previos)[1] == "original.png"
+    assert indice.buscar_previo(fotos["otra"], previos)[1] == "otra.png"
+    assert indice.buscar_previo(fotos["jpeg"], previos[:1]) is None  # sólo hay una toma distinta
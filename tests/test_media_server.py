@@ -0,0 +1,101 @@
+"""
+Tests for the HTTP media endpoint (registered files only, Range, ETag)
+"""
+import http.client
+import logging
+import os
+import socket
+import sys
+import urllib.parse
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import media_server
+
+
+@pytest.fixture
+def server():
+    srv = media_server.MediaServer(host="127.0.0.1", port=0).start()
+    yield srv
+    srv.stop()
+
+
+def _get(srv, url, headers=None, method="GET"):
+    conn = http.client.HTTPConnection("127.0.0.1", srv.port, timeout=5)
+    conn.request(method, urllib.parse.urlparse(url).path if url.startswith("http") else url, headers=headers or {})
+    resp = conn.getresponse()
+    body = resp.read()
+    conn.close()
+    return resp, body
+
+
+def test_full_and_ranged_responses(server, tmp_path):
+    video = tmp_path / "clip.mp4"
+    video.write_bytes(bytes(range(256)) * 40)
+    url = server.url_for(str(video))
+
+    resp, body = _get(server, url)
+    assert resp.status == 200 and len(body) == 10240
+    assert resp.getheader("Content-Type") == "video/mp4" and resp.getheader("Accept-Ranges") == "bytes"
+
+    resp, body = _get(server, url, {"Range": "bytes=100-199"})
+    assert resp.status == 206 and body == (bytes(range(256)) * 40)[100:200]
+    assert resp.getheader("Content-Range") == "bytes 100-199/10240"
+
+    resp, body = _get(server, url, {"Range": "bytes=-16"})
+    assert resp.status == 206 and len(body) == 16
+
+    resp, _ = _get(server, url, {"Range": "bytes=20000-"})
+    assert resp.status == 416 and resp.getheader("Content-Range") == "bytes */10240"
+
+
+def test_etag_revalidation(server, tmp_path):
+    foto = tmp_path / "foto.jpg"
+    foto.write_bytes(b"jpeg" * 100)
+    url = server.url_for(str(foto))
+    resp, _ = _get(server, url, method="HEAD")
+    etag = resp.getheader("ETag")
+    resp, body = _get(server, url, {"If-None-Match": etag})
+    assert resp.status == 304 and body == b""
+    # If-Range con un ETag viejo: se ignora el rango y se envía entero
+    resp, body = _get(server, url, {"Range": "bytes=0-9", "If-Range": '"viejo"'})
+    assert resp.status == 200 and len(body) == 400
+
+
+def test_only_registered_files_are_served(server, tmp_path):
+    assert _get(server, "/m/" + "0" * 32 + "/passwd")[0].status == 404
+    assert _get(server, "/etc/passwd")[0].status == 404
+    assert server.url_for(str(tmp_path / "no_existe.jpg")) == ""
+
+
+def test_busy_port_falls_back_to_free_one(tmp_path, caplog):
+    ocupado = socket.socket()
+    ocupado.bind(("127.0.0.1", 0))
+    ocupado.listen(1)
+    try:
+        puerto = ocupado.getsockname()[1]
+        with caplog.at_level(logging.WARNING, logger="media_server"):
+            srv = media_server.MediaServer(host="127.0.0.1", port=puerto).start()
+        try:
+            assert srv.port not in (0, puerto)
+            assert f"puerto {puerto} no disponible" in caplog.text
+            foto = tmp_path / "a.jpg"
+            foto.write_bytes(b"jpeg")
+            url = srv.url_for(str(foto))
+            assert f":{srv.port}/" in url
+            assert _get(srv, url)[1] == b"jpeg"
+        finally:
+            srv.stop()
+    finally:
+        ocupado.close()
+
+
+def test_parse_range():
+    assert media_server.parse_range("bytes=0-", 10) == (0, 9)
+    assert media_server.parse_range("bytes=5-100", 10) == (5, 9)
+    assert media_server.parse_range("bytes=-3", 10) == (7, 9)
+    assert media_server.parse_range("bytes=0-1,4-5", 10) is None
+    with pytest.raises(ValueError):
+        media_server.parse_range("bytes=10-", 10)
@@ -0,0 +1,153 @@
+"""
+Tests for the detector model registry: background load with atomic swap,
+shadow evaluation stats and the watched models.json
+"""
+import json
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+import detector
+
+
+class _Caja:
+    def __init__(self, box, conf):
+        self.cls = [2]
+        self.conf = [conf]
+        self.xyxy = [box]
+
+
+class _Resultado:
+    def __init__(self, cajas):
+        self.boxes = cajas
+
+
+class ModeloFalso:
+    """Imita un modelo YOLO: un auto en la misma caja en cada frame"""
+    names = {2: "car"}
+
+    def __init__(self, box=(10, 10, 90, 90)):
+        self.box = box
+        self.llamadas = 0
+
+    def __call__(self, imgs, **kwargs):
+        self.llamadas += 1
+        imgs = imgs if isinstance(imgs, list) else [imgs]
+        return [_Resultado([_Caja(self.box, 0.9)]) for _ in imgs]
+
+
+@pytest.fixture
+def registro(monkeypatch):
+    modelos = {"a.pt": ModeloFalso(), "b.pt": ModeloFalso((20, 10, 100, 90))}
+    monkeypatch.setattr(detector, "_abrir_modelo", lambda ruta: modelos[ruta])
+    monkeypatch.setattr(detector, "model", None)
+    monkeypatch.setattr(detector, "YOLO_AVAILABLE", False)
+    monkeypatch.setattr(detector, "TILED_MODE", False)
+    reg = detector.ModelRegistry(muestra=1.0)
+    monkeypatch.setattr(detector, "registro", reg)
+    reg.modelos = modelos
+    return reg
+
+
+def _frames(n=2):
+    return [np.full((100, 100, 3), 120, dtype=np.uint8) for _ in range(n)]
+
+
+def test_load_swaps_active_model(registro):
+    assert registro.cargar("a.pt").result(timeout=10) == "a.pt"
+    assert detector.model is registro.modelos["a.pt"] and detector.YOLO_AVAILABLE
+    assert registro.activo == "a.pt"
+    assert len(detector.detectar_vehiculos_lote(_frames())) == 2
+
+    with pytest.raises(KeyError):
+        registro.cargar("no_existe.pt").result(timeout=10)
+    assert detector.model is registro.modelos["a.pt"]
+
+
+def test_shadow_records_latency_and_agreement(registro):
+    registro.cargar("a.pt").result(timeout=10)
+    registro.cargar("b.pt", sombra=True).result(timeout=10)
+    assert detector.model is registro.modelos["a.pt"] and registro.sombra == "b.pt"
+
+    detector.detectar_vehiculos_lote(_frames(3))
+    registro._pool_sombra.submit(lambda: None).result(timeout=10)  # esperar a la comparación
+    st = registro.estadisticas()
+    assert st["frames"] == 3 and st["acuerdo_autos"] == 1.0
+    assert 0.5 < st["iou_medio"] < 1.0
+    assert st["latencia_sombra_ms"]["p50"] is not None
+
+    assert registro.promover() == "b.pt"
+    assert detector.model is registro.modelos["b.pt"] and registro.sombra is None
+
+
+def test_config_file_drives_registry(registro, tmp_path):
+    config = tmp_path / "models.json"
+    config.write_text(json.dumps({"activo": "a.pt", "sombra": "b.pt", "muestra": 0.25}))
+    for futuro in registro.aplicar_config(str(config)):
+        futuro.result(timeout=10)
+    assert (registro.activo, registro.sombra, registro.muestra) == ("a.pt", "b.pt", 0.25)
+    assert registro.aplicar_config(str(config)) == []  # sin cambios
+
+
+def test_comparar_detecciones():
+    a = [{"box": (0, 0, 10, 10), "conf": 0.9, "severidad": "Grave"}]
+    b = [{"box": (0, 0, 10, 10), "conf": 0.8, "severidad": "Moderada"}]
+    assert detector.comparar_detecciones(a, b) == (False, True, 1.0)
+    assert detector.comparar_detecciones([], []) == (True, True, None)
+
+
+def test_cargar_modelo_loads_once_across_threads(monkeypatch):
+    abiertos = []
+
+    def abrir(ruta):
+        # Mientras carga, el flag todavía no indica "cargado"
+        assert not detector._modelo_cargado
+        time.sleep(0.1)
+        abiertos.append(ruta)
+        return ModeloFalso()
+
+    monkeypatch.setattr(detector, "_abrir_modelo", abrir)
+    monkeypatch.setattr(detector, "_modelo_cargado", False)
+    monkeypatch.setattr(detector, "model", None)
+    monkeypatch.setattr(detector, "YOLO_AVAILABLE", False)
+    monkeypatch.setattr(detector, "registro", detector.ModelRegistry())
+
+    modelos = []
+    hilos = [threading.Thread(target=lambda: modelos.append(detector.cargar_modelo())) for _ in range(4)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join(10)
+    assert len(abiertos) == 1 and detector._modelo_cargado and detector.YOLO_AVAILABLE
+    assert len(modelos) == 4 and all(m is modelos[0] is not None for m in modelos)
+    # Cargar el modelo no arranca el vigilante de models.json: lo hacen los puntos de entrada
+    assert detector.registro._vigilante is None
+
+
+def test_failed_load_is_retried_on_next_check(registro, tmp_path):
+    config = tmp_path / "models.json"
+    config.write_text(json.dumps({"activo": "no_existe.pt", "muestra": 0.5}))
+    futuros = registro.aplicar_config(str(config))
+    with pytest.raises(KeyError):
+        futuros[0].result(timeout=10)
+    limite = time.monotonic() + 5
+    while registro._config_en_curso is not None and time.monotonic() < limite:
+        time.sleep(0.01)  # los callbacks del Future corren justo después de result()
+    assert registro.activo is None and registro._config_mtime is None
+    # La versión fallida no se da por aplicada: se vuelve a intentar
+    futuros = registro.aplicar_config(str(config))
+    assert len(futuros) == 1
+    with pytest.raises(KeyError):
+        futuros[0].result(timeout=10)
+
+    config.write_text("{ roto")
+    os.utime(config, ns=(1, 1))
+    assert registro.aplicar_config(str(config)) == [] and registro._config_mtime is None
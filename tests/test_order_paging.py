@@ -0,0 +1,43 @@
+"""
+Tests for paged order history: LIMIT/OFFSET pages are stable and never overlap,
+also when many orders share the same date
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("TOYOTA_DB_PATH", os.path.join(tempfile.mkdtemp(), "toyota_test.db"))
+
+import db_utils
+
+
+def _paginas(tam):
+    paginas, offset = [], 0
+    while True:
+        pagina = db_utils.fetch_orders(limit=tam, offset=offset)
+        if not pagina:
+            return paginas
+        paginas.append(pagina)
+        offset += tam
+
+
+def test_pages_are_stable_and_disjoint():
+    reporte_id = db_utils.insert_report("PAG1", "PAG001", "Rayón", "Moderada", "p.jpg")
+    # Muchas con la misma fecha (empates en el ORDER BY) y algunas distintas
+    for i in range(23):
+        fecha = "2031-05-01 10:00:00" if i % 3 else f"2031-05-{2 + i:02d} 10:00:00"
+        db_utils.insert_order(reporte_id, fecha, "Pintura", f"Pieza {i}", "Pendiente")
+
+    todas = db_utils.fetch_orders()
+    paginas = _paginas(7)
+    ids = [r[0] for p in paginas for r in p]
+    assert all(len(p) == 7 for p in paginas[:-1])
+    assert len(ids) == len(set(ids)) == len(todas)
+    assert ids == [r[0] for r in todas]
+    assert _paginas(7) == paginas  # repetir la paginación da lo mismo
+
+    fechas = [r[2] for r in todas]
+    assert fechas == sorted(fechas, reverse=True)
+    empatadas = [r[0] for r in todas if r[2] == "2031-05-01 10:00:00"]
+    assert empatadas == sorted(empatadas, reverse=True)  # desempate por id, más nuevo primero
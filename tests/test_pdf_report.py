@@ -0,0 +1,59 @@
+"""
+Tests for PDF inspection reports (valid PDF, cache by report version, async
+pool and bulk generation for a day)
+"""
+import os
+import sys
+import tempfile
+import zlib
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("TOYOTA_DB_PATH", os.path.join(tempfile.mkdtemp(), "toyota_test.db"))
+
+import db_utils
+import pdf_report
+
+
+def _reporte(fecha=None):
+    reporte_id = db_utils.insert_report("PDF1", "PDF001", "Rayón en puerta (izq.) 🚗", "Grave", "", fecha=fecha)
+    db_utils.insert_order(reporte_id, "2025-12-04", "Repuestos", "Puerta delantera", "Pendiente")
+    return reporte_id
+
+
+def test_pdf_is_valid_and_escapes_text(tmp_path):
+    ruta = pdf_report.generar_pdf(_reporte(), str(tmp_path))
+    datos = open(ruta, "rb").read()
+    assert datos.startswith(b"%PDF-1.4") and datos.rstrip().endswith(b"%%EOF")
+    contenido = zlib.decompress(datos.split(b"stream\n", 1)[1].split(b"\nendstream", 1)[0])
+    assert b"Ray\xf3n en puerta \\(izq.\\)" in contenido  # WinAnsi, paréntesis escapados, sin emoji
+    assert b"Puerta delantera" in contenido
+
+
+def test_cache_reused_until_report_changes(tmp_path):
+    reporte_id = _reporte()
+    primera = pdf_report.generar_pdf(reporte_id, str(tmp_path))
+    mtime = os.stat(primera).st_mtime_ns
+    assert pdf_report.generar_pdf(reporte_id, str(tmp_path)) == primera
+    assert os.stat(primera).st_mtime_ns == mtime
+
+    order_id = db_utils.fetch_report_orders(reporte_id)[0][0]
+    db_utils.update_order_estado(order_id, "Completado")
+    segunda = pdf_report.generar_pdf(reporte_id, str(tmp_path))
+    assert segunda != primera and not os.path.exists(primera)
+    assert [n for n in os.listdir(tmp_path) if n.startswith(f"reporte_{reporte_id}_")] == [os.path.basename(segunda)]
+
+
+def test_renderer_runs_in_background(tmp_path):
+    renderer = pdf_report.ReportRenderer(workers=1, directorio=str(tmp_path))
+    reporte_id = _reporte()
+    assert renderer.solicitar(reporte_id).result(timeout=30).endswith(".pdf")
+    with pytest.raises(LookupError):
+        renderer.solicitar(10 ** 9).result(timeout=30)
+
+
+def test_generar_dia_in_processes(tmp_path):
+    ids = [_reporte(fecha="2030-01-15 10:00:00") for _ in range(3)]
+    rutas = pdf_report.generar_dia("2030-01-15", workers=2, directorio=str(tmp_path))
+    assert sorted(rutas) == sorted(ids) and all(r and os.path.exists(r) for r in rutas.values())
@@ -0,0 +1,67 @@
+"""
+Tests for the coalescing UI update scheduler
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from ui_scheduler import UpdateScheduler
+
+
+class FakePage:
+    def __init__(self):
+        self.calls = []
+
+    def update(self, *controls):
+        self.calls.append(controls)
+
+
+def test_requests_within_interval_are_coalesced():
+    page = FakePage()
+    ui = UpdateScheduler(page, interval_ms=50)
+    a, b = object(), object()
+    ui.request(a)          # primer envío inmediato
+    for _ in range(20):
+        ui.request(a)
+        ui.request(b)
+    assert len(page.calls) == 1
+    time.sleep(0.15)
+    assert len(page.calls) == 2
+    assert set(map(id, page.calls[1])) == {id(a), id(b)}
+    assert ui.stats() == {"requests": 41, "flushes": 2, "coalesced": 39}
+
+
+def test_flush_sends_pending_immediately():
+    page = FakePage()
+    ui = UpdateScheduler(page, interval_ms=10_000)
+    a, b = object(), object()
+    ui.request(a)
+    ui.request(a)
+    ui.flush(b)
+    assert len(page.calls) == 2
+    assert set(map(id, page.calls[1])) == {id(a), id(b)}
+    ui.flush()             # nada pendiente: no se envía
+    assert len(page.calls) == 2
+
+
+def test_request_without_controls_updates_whole_page():
+    page = FakePage()
+    ui = UpdateScheduler(page, interval_ms=10_000)
+    ui.flush(object())
+    ui.request(object())
+    ui.request()
+    ui.flush()
+    assert page.calls[-1] == ()
+
+
+def test_failed_update_is_logged_with_traceback(caplog):
+    class PageCerrada(FakePage):
+        def update(self, *controls):
+            raise RuntimeError("sesión cerrada")
+
+    ui = UpdateScheduler(PageCerrada(), interval_ms=10_000)
+    ui.flush(object())
+    fallos = [r for r in caplog.records if r.name == "ui_scheduler"]
+    assert len(fallos) == 1 and fallos[0].exc_info[0] is RuntimeError
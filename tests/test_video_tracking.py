@@ -0,0 +1,104 @@
+"""
+Tests for walkaround video analysis (detect-then-track and the gallery
+wrapper that survives scheduler load shedding)
+"""
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+np = pytest.importorskip("numpy")
+cv2 = pytest.importorskip("cv2")
+
+import video_tracking
+from inference_scheduler import BATCH, InferenceScheduler
+
+
+def _video(path, frames=30, size=(320, 240), paso=4, caja=(60, 50)):
+    """Video sintético: un rectángulo texturizado que se desplaza a la derecha"""
+    w, h = size
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 10, size)
+    if not writer.isOpened():
+        pytest.skip("OpenCV sin codificador de video")
+    rng = np.random.default_rng(0)
+    textura = rng.integers(0, 255, (caja[1], caja[0], 3), dtype=np.uint8)
+    for i in range(frames):
+        img = np.full((h, w, 3), 90, dtype=np.uint8)
+        x = 20 + i * paso
+        img[80:80 + caja[1], x:x + caja[0]] = textura
+        writer.write(img)
+    writer.release()
+    return str(path)
+
+
+def _detector_caja(llamadas):
+    """Detector falso: la caja es la zona que difiere del fondo gris"""
+    def detectar(frame):
+        llamadas.append(1)
+        ys, xs = np.nonzero(np.abs(frame.astype(np.int16) - 90).max(axis=2) > 40)
+        if not len(xs):
+            return []
+        return [{"box": (int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1),
+                 "conf": 0.9, "daños": ["Rayón"], "severidad": "Moderada"}]
+    return detectar
+
+
+def test_moving_box_is_one_track(tmp_path):
+    # 8 px por frame: entre keyframes la caja se mueve 40 px (IoU < umbral sin flujo óptico)
+    video = _video(tmp_path / "auto.avi", paso=8)
+    llamadas = []
+    lineas, severidad, tracks = video_tracking.analizar_video_tracking(
+        video, detect_every=5, detectar=_detector_caja(llamadas))
+    assert len(llamadas) == 6
+    assert len(tracks) == 1 and tracks[0].hits == 6 and tracks[0].confirmado
+    assert (tracks[0].first_frame, tracks[0].last_frame) == (0, 25)
+    assert lineas == ["Vehículo #1 (frames 0-25): Rayón"] and severidad == "Moderada"
+
+
+def test_unconfirmed_tracks_are_labelled():
+    t = video_tracking.Track(1, {"box": (0, 0, 10, 10), "daños": ["Abolladura"], "severidad": "Grave"}, 0)
+    lineas, severidad = video_tracking.resumir_tracks([t])
+    assert lineas == ["Vehículo #1 (frames 0-0) [sin confirmar]: Abolladura"]
+    assert severidad == "Grave"
+
+    confirmado = video_tracking.Track(2, {"box": (50, 0, 60, 10), "daños": ["Rayón"], "severidad": "Moderada"}, 0)
+    confirmado.observar({"box": (50, 0, 60, 10), "daños": ["Rayón"], "severidad": "Moderada"}, 10)
+    # Con algún track confirmado los aislados se descartan
+    assert video_tracking.resumir_tracks([t, confirmado]) == (["Vehículo #2 (frames 0-10): Rayón"], "Moderada")
+
+
+def test_scheduler_shedding_mid_video_marks_it_for_retry(tmp_path):
+    video = _video(tmp_path / "walk.avi")
+    s = InferenceScheduler(workers=1, max_queue=1)
+    llamadas = []
+
+    def detectar(frame):
+        llamadas.append(1)
+        if len(llamadas) == 2:
+            # Otra sesión ocupa el worker y llena la cola: la siguiente petición se rechaza
+            gate, empezada = threading.Event(), threading.Event()
+            s.submit(lambda: (empezada.set(), gate.wait(5)), priority=BATCH, session="otra")
+            empezada.wait(5)
+            s.submit(lambda: None, priority=BATCH, session="otra")
+            try:
+                return s.run(lambda f: [], frame, priority=BATCH, session="galeria")[0]
+            finally:
+                gate.set()
+        return s.run(lambda f: [], frame, priority=BATCH, session="galeria")[0]
+
+    lineas, severidad, completado = video_tracking.analizar_video_galeria(video, "tracking", detectar=detectar)
+    assert not completado and severidad == "Perfecto"
+    assert lineas == ["⏳ walk.avi: no analizado (sistema ocupado, reintentar)"]
+    assert len(llamadas) == 2  # el resto del video no se procesa
+    assert s.stats()["lote"]["shed"] == 1
+
+
+def test_frames_mode_uses_precomputed_results(tmp_path):
+    lineas, severidad, completado = video_tracking.analizar_video_galeria(
+        str(tmp_path / "no_se_abre.mp4"), "frames",
+        resultados_frames=[("Sin daños detectados", "Perfecto"), ("Abolladura detectada", "Moderada")])
+    assert completado and severidad == "Moderada"
+    assert lineas == ["🎥 Video frame 2: Abolladura detectada"]
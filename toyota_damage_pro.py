@@ -5,31 +5,79 @@ import subprocess
 import platform
 import tempfile
 import shutil
-import base64
 import sqlite3
 import logging
+import threading
+import time
+import functools
+import urllib.parse
 from datetime import datetime
 
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('/tmp/toyota_app_main.log'),
-        logging.StreamHandler()
-    ]
-)
+from app_logging import setup_logging, log_context, new_job_id, StageTimer
 logger = logging.getLogger(__name__)
 
 # Importar módulos personalizados
-from db_utils import insert_report, insert_order, fetch_reports, fetch_orders, export_reports_csv, export_orders_csv, sanitize_text, conn, c
-from detector import detectar_daños, extract_video_frames, YOLO_AVAILABLE
+from db_utils import insert_report, insert_order, fetch_reports, fetch_orders, export_reports_csv, export_orders_csv, sanitize_text
+from db_utils import insert_media_hash, fetch_media_hashes, update_order_estado
+from db_utils import fetch_report_annotations
+from db_utils import create_job, fetch_job_items, update_job_item, finish_job, abandon_job, fetch_interrupted_jobs, claim_job, heartbeat_job
+from change_feed import feed
+from media_hash import HashIndex, to_hex, VIDEO_EXTENSIONS
 from ui_components import build_header
+from ui_scheduler import UpdateScheduler
+from inference_scheduler import get_scheduler, SchedulerBusyError, INTERACTIVE, BATCH, BACKGROUND
+from db_backup import iniciar_backups
+from sync_agent import iniciar_sync
+from evidence_store import get_evidence_store, guardar_bytes, ruta_en_almacen, claves_de
+from media_server import get_media_server
+from pdf_report import get_report_renderer, generar_dia
 
 # PLATFORM DETECTION
 SYSTEM = platform.system()
-print(f"✅ Sistema operativo: {SYSTEM}")
-print(f"✅ Módulos cargados exitosamente")
+
+# CARGA DIFERIDA DEL DETECTOR
+# detector arrastra cv2, numpy y ultralytics/torch (varios segundos). La página se
+# renderiza primero y el detector se importa en un hilo de fondo; los handlers
+# que lo necesitan esperan a que termine con get_detector().
+_detector_listo = threading.Event()
+_detector_estado = {"modulo": None, "iniciado": False}
+_detector_lock = threading.Lock()
+
+def _cargar_detector():
+    try:
+        import detector
+        # Cambios en caliente de models.json (sólo si el modelo se cargó en este proceso)
+        detector.vigilar_modelos()
+        _detector_estado["modulo"] = detector
+        logger.info(f"Sistema operativo: {SYSTEM} | detector cargado (YOLO: {detector.YOLO_AVAILABLE})")
+    except Exception as e:
+        logger.error(f"No se pudo cargar el detector: {e}")
+    finally:
+        _detector_listo.set()
+
+def precargar_detector():
+    """Inicia (una sola vez) la importación del detector en segundo plano"""
+    with _detector_lock:
+        if _detector_estado["iniciado"]:
+            return
+        _detector_estado["iniciado"] = True
+    threading.Thread(target=_cargar_detector, name="detector-preload", daemon=True).start()
+
+def get_detector():
+    """Módulo detector, esperando a que termine la carga en segundo plano"""
+    precargar_detector()
+    _detector_listo.wait()
+    if _detector_estado["modulo"] is None:
+        raise ImportError("Detector no disponible (revisa OpenCV/ultralytics)")
+    return _detector_estado["modulo"]
+
+# Modo de análisis de video: "tracking" (detect-then-track, cobertura completa)
+# o "frames" (5 frames muestreados, más rápido en videos cortos; varios videos
+# se decodifican en paralelo con frame_arena)
+VIDEO_ANALYSIS_MODE = os.environ.get("TOYOTA_VIDEO_MODE", "tracking")
+
+# Frames de la ráfaga del botón de cámara (se guarda el más nítido); 0 = captura instantánea
+CAMERA_BURST = int(os.environ.get("TOYOTA_CAMERA_BURST", "5"))
 
 def open_system_file_dialog():
     """Abre diálogo de archivo"""
@@ -58,24 +106,38 @@ def open_system_file_dialog():
     
     return None
 
-def open_camera():
-    """Abre la cámara para capturar foto (multi-plataforma)"""
+def open_camera(rafaga=CAMERA_BURST):
+    """Captura una foto con la cámara del equipo (multi-plataforma).
+
+    Con el servicio de captura persistente la cámara ya está abierta y con la
+    exposición ajustada: con `rafaga` > 1 se toma el más nítido de los próximos
+    frames, si no el frame nítido más reciente. Si el servicio no está
+    disponible se usa ffmpeg (macOS) u OpenCV directamente. Devuelve la ruta o None."""
     try:
-        temp_dir = tempfile.gettempdir()
-        output_path = os.path.join(temp_dir, "toyota_camera_capture.jpg")
+        output_path = os.path.join(tempfile.gettempdir(), f"toyota_camera_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.jpg")
 
-        # Remove old capture if exists
-        if os.path.exists(output_path):
-            try:
-                os.remove(output_path)
-            except:
-                pass
+        try:
+            import cv2
+            from camera_service import get_capture_service
+            service = get_capture_service()
+            if service:
+                frames = service.burst(rafaga) if rafaga > 1 else []
+                if frames and cv2.imwrite(output_path, frames[0]):
+                    logger.info(f"Captura en ráfaga ({len(frames)} frames): {output_path}")
+                    return output_path
+                if service.capture_to_file(output_path):
+                    logger.info(f"Captura instantánea: {output_path}")
+                    return output_path
+        except ImportError:
+            logger.warning("OpenCV no instalado")
+        except Exception as e:
+            logger.warning(f"Servicio de cámara no disponible: {e}")
 
         if SYSTEM == "Darwin":  # macOS
             # Prefer the ffmpeg in PATH, fallback to common Homebrew location
             ffmpeg_path = shutil.which("ffmpeg") or "/opt/homebrew/bin/ffmpeg"
             if not ffmpeg_path or not os.path.exists(ffmpeg_path):
-                print("FFmpeg no encontrado")
+                logger.warning("FFmpeg no encontrado")
                 return None
 
             # Try simple capture without video_size constraint
@@ -84,20 +146,19 @@ def open_camera():
                 "-i", "0", "-frames:v", "1", "-update", "1", "-y", output_path
             ]
             try:
-                print(f"Ejecutando: {' '.join(cmd)}")
+                logger.info(f"Ejecutando: {' '.join(cmd)}")
                 proc = subprocess.run(cmd, capture_output=True, text=True, timeout=15)
-                print(f"Return code: {proc.returncode}")
-                if proc.stderr:
-                    print(f"STDERR: {proc.stderr[:500]}")
+                if proc.returncode != 0:
+                    logger.warning(f"ffmpeg terminó con {proc.returncode}: {proc.stderr[:500]}")
             except subprocess.TimeoutExpired:
-                print("Timeout al capturar")
+                logger.warning("Timeout al capturar")
                 return None
             except Exception as e:
-                print(f"Error: {e}")
+                logger.warning(f"Error ejecutando ffmpeg: {e}")
                 return None
 
             if proc and proc.returncode == 0 and os.path.exists(output_path):
-                print(f"Captura exitosa: {output_path}")
+                logger.info(f"Captura exitosa: {output_path}")
                 return output_path
 
             # Try with explicit video size
@@ -107,86 +168,120 @@ def open_camera():
                         ffmpeg_path, "-f", "avfoundation", "-video_size", size,
                         "-framerate", "30", "-i", "0", "-frames:v", "1", "-update", "1", "-y", output_path
                     ]
-                    print(f"Reintentando con {size}")
+                    logger.info(f"Reintentando con {size}")
                     p2 = subprocess.run(alt_cmd, capture_output=True, text=True, timeout=15)
                     if p2.returncode == 0 and os.path.exists(output_path):
-                        print(f"Captura exitosa con {size}")
+                        logger.info(f"Captura exitosa con {size}")
                         return output_path
                 except Exception as e:
-                    print(f"Fallo con {size}: {e}")
+                    logger.warning(f"Fallo con {size}: {e}")
                     continue
-                    
-        elif SYSTEM == "Windows":  # Windows
+
+        elif SYSTEM in ("Windows", "Linux"):
             try:
                 import cv2
                 cap = cv2.VideoCapture(0)
                 if not cap.isOpened():
-                    print("No se pudo abrir la cámara")
+                    logger.warning("No se pudo abrir la cámara")
                     return None
-                
+
                 ret, frame = cap.read()
                 cap.release()
-                
+
                 if ret and frame is not None:
                     cv2.imwrite(output_path, frame)
-                    print(f"Captura exitosa Windows: {output_path}")
+                    logger.info(f"Captura exitosa {SYSTEM}: {output_path}")
                     return output_path
-                else:
-                    print("No se capturó frame")
-                    return None
-            except ImportError:
-                print("OpenCV no instalado")
+                logger.warning("No se capturó frame")
                 return None
-            except Exception as e:
-                print(f"Error cámara Windows: {e}")
-                return None
-                
-        elif SYSTEM == "Linux":  # Linux
-            try:
-                import cv2
-                cap = cv2.VideoCapture(0)
-                if not cap.isOpened():
-                    print("No se pudo abrir la cámara")
-                    return None
-                
-                ret, frame = cap.read()
-                cap.release()
-                
-                if ret and frame is not None:
-                    cv2.imwrite(output_path, frame)
-                    print(f"Captura exitosa Linux: {output_path}")
-                    return output_path
-                else:
-                    print("No se capturó frame")
-                    return None
             except ImportError:
-                print("OpenCV no instalado")
+                logger.warning("OpenCV no instalado")
                 return None
             except Exception as e:
-                print(f"Error cámara Linux: {e}")
+                logger.warning(f"Error cámara {SYSTEM}: {e}")
                 return None
-                
+
     except Exception as e:
-        print(f"Error general en open_camera: {e}")
-        pass
+        logger.error(f"Error general en open_camera: {e}")
 
     return None
 
-def file_to_data_url(path: str) -> str:
-    """Convierte un archivo de imagen local a data URL (base64) para mostrar en Flet web view.
-    Devuelve una cadena vacía si falla."""
-    try:
-        if not os.path.exists(path):
-            return ""
-        ext = os.path.splitext(path)[1].lower().replace('.', '')
-        if ext == 'jpg':
-            ext = 'jpeg'
-        with open(path, 'rb') as f:
-            b = f.read()
-        b64 = base64.b64encode(b).decode('ascii')
-        return f"data:image/{ext};base64,{b64}"
-    except Exception:
-        return ""
+# INTERNACIONALIZACIÓN (compartida por todas las sesiones, no se modifica)
+TRANSLATIONS = {
+    "es": {
+        "app_title": "TOYOTA DAMAGE PRO",
+        "assessment": "EVALUACIÓN DE DAÑOS (IA)",
+        "orders": "GESTIÓN DE PEDIDOS",
+        "vin": "VIN (opcional)",
+        "plate": "Placa (opcional)",
+        "url_hint": "URL de imagen o ruta local",
+        "url_placeholder": "Ej: https://... o /ruta/local/foto.jpg",
+        "camera": "📷 CÁMARA",
+        "gallery": "🖼️ GALERÍA",
+        "live": "🎥 EN VIVO",
+        "live_stop": "⏹️ DETENER",
+        "analyze": "🔍 ANALIZAR",
+        "selected_files": "📁 Archivos Seleccionados:",
+        "waiting": "Esperando foto...",
+        "ready": "Listo",
+        "analyzing": "Analizando...",
+        "saved": "✅ Guardado",
+        "export_csv": "📊 EXPORTAR CSV",
+        "export_pdfs": "📄 PDFs DEL DÍA",
+        "order_id": "ID Reporte (opcional)",
+        "order_type": "Tipo de Pedido",
+        "description": "Descripción",
+        "register": "✅ REGISTRAR",
+        "export_orders": "📊 EXPORTAR PEDIDOS CSV",
+        "history": "HISTORIAL",
+        "no_orders": "Sin pedidos",
+        "recent_reports": "REPORTES RECIENTES",
+        "parts": "Repuestos",
+        "repair": "Reparación",
+        "service": "Servicio",
+        "severity": "SEVERIDAD",
+        "damage": "DAÑOS"
+    },
+    "en": {
+        "app_title": "TOYOTA DAMAGE PRO",
+        "assessment": "DAMAGE ASSESSMENT (AI)",
+        "orders": "ORDER MANAGEMENT",
+        "vin": "VIN (optional)",
+        "plate": "Plate (optional)",
+        "url_hint": "Image URL or local path",
+        "url_placeholder": "Ex: https://... or /local/path/photo.jpg",
+        "camera": "📷 CAMERA",
+        "gallery": "🖼️ GALLERY",
+        "live": "🎥 LIVE",
+        "live_stop": "⏹️ STOP",
+        "analyze": "🔍 ANALYZE",
+        "selected_files": "📁 Selected Files:",
+        "waiting": "Waiting for photo...",
+        "ready": "Ready",
+        "analyzing": "Analyzing...",
+        "saved": "✅ Saved",
+        "export_csv": "📊 EXPORT CSV",
+        "export_pdfs": "📄 TODAY'S PDFs",
+        "order_id": "Report ID (optional)",
+        "order_type": "Order Type",
+        "description": "Description",
+        "register": "✅ REGISTER",
+        "export_orders": "📊 EXPORT ORDERS CSV",
+        "history": "HISTORY",
+        "no_orders": "No orders",
+        "recent_reports": "RECENT REPORTS",
+        "parts": "Parts",
+        "repair": "Repair",
+        "service": "Service",
+        "severity": "SEVERITY",
+        "damage": "DAMAGE"
+    }
+}
+
+# Pedidos cargados por página en el historial (la sesión no carga la tabla completa)
+ORDERS_PAGE_SIZE = 50
+# Reportes recientes visibles en la vista de evaluación
+RECENT_REPORTS = 5
 
 def main(page: ft.Page):
     page.title = "TOYOTA DAMAGE PRO UNIFIED"
@@ -197,74 +292,14 @@ def main(page: ft.Page):
     # Header
     header = build_header()
 
-    # INTERNACIONALIZACIÓN
-    translations = {
-        "es": {
-            "app_title": "TOYOTA DAMAGE PRO",
-            "assessment": "EVALUACIÓN DE DAÑOS (IA)",
-            "orders": "GESTIÓN DE PEDIDOS",
-            "vin": "VIN (opcional)",
-            "plate": "Placa (opcional)",
-            "url_hint": "URL de imagen o ruta local",
-            "url_placeholder": "Ej: https://... o /ruta/local/foto.jpg",
-            "camera": "📷 CÁMARA",
-            "gallery": "🖼️ GALERÍA",
-            "analyze": "🔍 ANALIZAR",
-            "selected_files": "📁 Archivos Seleccionados:",
-            "waiting": "Esperando foto...",
-            "ready": "Listo",
-            "analyzing": "Analizando...",
-            "saved": "✅ Guardado",
-            "export_csv": "📊 EXPORTAR CSV",
-            "order_id": "ID Reporte (opcional)",
-            "order_type": "Tipo de Pedido",
-            "description": "Descripción",
-            "register": "✅ REGISTRAR",
-            "export_orders": "📊 EXPORTAR PEDIDOS CSV",
-            "history": "HISTORIAL",
-            "no_orders": "Sin pedidos",
-            "parts": "Repuestos",
-            "repair": "Reparación",
-            "service": "Servicio",
-            "severity": "SEVERIDAD",
-            "damage": "DAÑOS"
-        },
-        "en": {
-            "app_title": "TOYOTA DAMAGE PRO",
-            "assessment": "DAMAGE ASSESSMENT (AI)",
-            "orders": "ORDER MANAGEMENT",
-            "vin": "VIN (optional)",
-            "plate": "Plate (optional)",
-            "url_hint": "Image URL or local path",
-            "url_placeholder": "Ex: https://... or /local/path/photo.jpg",
-            "camera": "📷 CAMERA",
-            "gallery": "🖼️ GALLERY",
-            "analyze": "🔍 ANALYZE",
-            "selected_files": "📁 Selected Files:",
-            "waiting": "Waiting for photo...",
-            "ready": "Ready",
-            "analyzing": "Analyzing...",
-            "saved": "✅ Saved",
-            "export_csv": "📊 EXPORT CSV",
-            "order_id": "Report ID (optional)",
-            "order_type": "Order Type",
-            "description": "Description",
-            "register": "✅ REGISTER",
-            "export_orders": "📊 EXPORT ORDERS CSV",
-            "history": "HISTORY",
-            "no_orders": "No orders",
-            "parts": "Parts",
-            "repair": "Repair",
-            "service": "Service",
-            "severity": "SEVERITY",
-            "damage": "DAMAGE"
-        }
-    }
-    
     current_lang = {"value": "es"}
+    # Funciones que actualizan textos de vistas ya construidas (ver build_orders_view)
+    text_updaters = []
+    # Funciones que aplican a vistas ya construidas los cambios de la BD (de esta y otras sesiones)
+    change_handlers = []
     
     def get_text(key):
-        return translations[current_lang["value"]].get(key, key)
+        return TRANSLATIONS[current_lang["value"]].get(key, key)
     
     def change_language(e):
         current_lang["value"] = lang_selector.value
@@ -280,28 +315,21 @@ def main(page: ft.Page):
         image_url_field.hint_text = get_text("url_placeholder")
         camera_btn.text = get_text("camera")
         gallery_btn.text = get_text("gallery")
+        live_btn.text = get_text("live_stop") if live_session["inspector"] else get_text("live")
         analyze_btn.text = get_text("analyze")
         assessment_title.value = get_text("assessment")
         selected_files_text.value = get_text("selected_files")
+        recent_reports_text.value = get_text("recent_reports")
         if result_text.value == "Esperando foto..." or result_text.value == "Waiting for photo...":
             result_text.value = get_text("waiting")
         if status.value == "Listo" or status.value == "Ready":
             status.value = get_text("ready")
         export_btn.text = get_text("export_csv")
+        pdf_day_btn.text = get_text("export_pdfs")
         
-        # Tab 2
-        order_id_field.label = get_text("order_id")
-        order_type_field.label = get_text("order_type")
-        order_type_field.options = [
-            ft.dropdown.Option(get_text("parts")),
-            ft.dropdown.Option(get_text("repair")),
-            ft.dropdown.Option(get_text("service")),
-        ]
-        order_desc_field.label = get_text("description")
-        register_btn.text = get_text("register")
-        export_orders_btn.text = get_text("export_orders")
-        orders_title.value = get_text("orders")
-        history_text.value = get_text("history")
+        # Vistas construidas bajo demanda
+        for updater in text_updaters:
+            updater()
     
     lang_selector = ft.Dropdown(
         label="🌐 Language / Idioma",
@@ -318,77 +346,155 @@ def main(page: ft.Page):
     vin_field = ft.TextField(label=get_text("vin"), expand=True)
     placa_field = ft.TextField(label=get_text("plate"), expand=True)
     image_url_field = ft.TextField(label=get_text("url_hint"), hint_text=get_text("url_placeholder"), expand=True)
+    image_url_field.on_submit = lambda e: analyze_photo_from_url(e)
     
     # Lista para almacenar múltiples fotos/videos
     media_list = []
+    # Índice de hashes perceptuales para agrupar fotos casi idénticas
+    hash_index = HashIndex()
+    # Agrupa los page.update() de los análisis largos (ver ui_scheduler.py)
+    ui = UpdateScheduler(page)
+    # Trabajo de análisis interrumpido (reinicio del servidor) adoptado por esta sesión
+    trabajo_pendiente = {"job_id": None}
+    
+    def trabajo(prefijo):
+        """Decora un handler para que sus logs lleven la sesión y un id de trabajo"""
+        def decorador(handler):
+            @functools.wraps(handler)
+            def wrapper(e):
+                with log_context(session=getattr(page, "session_id", None), job=new_job_id(prefijo)):
+                    return handler(e)
+            return wrapper
+        return decorador
+    
+    # Toda inferencia pasa por el planificador compartido (prioridad + turno por sesión)
+    sesion_id = getattr(page, "session_id", None)
+    espera_cola = {"ms": 0.0}
+
+    def inferir(fn, *args, prioridad=BATCH):
+        resultado, espera_ms = get_scheduler().run(fn, *args, priority=prioridad, session=sesion_id)
+        espera_cola["ms"] = espera_ms
+        return resultado
     gallery_row = ft.Row([], wrap=True, spacing=10, run_spacing=10, width=600)
     
     preview = ft.Image(width=600, height=400, fit="contain", visible=True)
+    # Los videos se reproducen desde el servidor de medios (el navegador pide rangos)
+    video_preview = ft.Container(width=600, height=400, visible=False)
+
+    # Fotos y videos llegan al navegador por HTTP (media_server.py), no en base64 por el websocket
+    media_host = urllib.parse.urlparse(page.url or "").hostname
+
+    def media_url(path):
+        try:
+            return get_media_server().url_for(path, media_host)
+        except OSError as ex:
+            logger.error(f"Servidor de medios no disponible: {ex}", extra={"sample": "media_server"})
+            return ""
+
+    def show_preview(path):
+        """Muestra la foto o el video en el área de preview. False si no hay archivo"""
+        url = media_url(path)
+        if url and os.path.splitext(path)[1].lower() in VIDEO_EXTENSIONS and hasattr(ft, "Video"):
+            video_preview.content = ft.Video(playlist=[ft.VideoMedia(url)], width=600, height=400,
+                                             autoplay=False, show_controls=True)
+            video_preview.visible = True
+            preview.visible = False
+        else:
+            preview.src = url
+            preview.visible = bool(url)
+            video_preview.visible = False
+        return bool(url)
     result_text = ft.Text(get_text("waiting"), size=20, weight="bold", color="#666")
     severity_text = ft.Text("", size=32, weight="bold", color="#c41e3a")
     progress = ft.ProgressBar(width=600, value=0, color="#2196f3")
     status = ft.Text(get_text("ready"), size=14, color="#999")
     photo_source = {"path": None}
     
+    ia_badge_text = ft.Text("⏳ CARGANDO IA", size=12, weight="bold", color="white")
     ia_badge = ft.Container(
-        content=ft.Text(
-            f"{'✅ YOLO IA' if YOLO_AVAILABLE else '⚡ MODO RÁPIDO'}",
-            size=12, weight="bold", color="white"
-        ),
-        bgcolor="#4CAF50" if YOLO_AVAILABLE else "#FFA726",
+        content=ia_badge_text,
+        bgcolor="#9E9E9E",
         padding=8,
         border_radius=5
     )
 
+    def update_ia_badge():
+        """Actualiza la insignia de IA cuando termina la carga diferida del detector"""
+        _detector_listo.wait()
+        modulo = _detector_estado["modulo"]
+        yolo = bool(modulo and modulo.YOLO_AVAILABLE)
+        ia_badge_text.value = '✅ YOLO IA' if yolo else '⚡ MODO RÁPIDO'
+        ia_badge.bgcolor = "#4CAF50" if yolo else "#FFA726"
+        page.update()
+
     def remove_media_item(path):
         """Elimina un item de la galería"""
         def handler(e):
             media_list.remove(path)
+            hash_index.forget(path)
             update_gallery()
         return handler
     
+    def build_gallery_item(media_path):
+        """Miniatura de un archivo de la galería con botón para quitarlo"""
+        ext = os.path.splitext(media_path)[1].lower()
+        is_video = ext in VIDEO_EXTENSIONS
+        
+        return ft.Container(
+            content=ft.Stack([
+                ft.Image(
+                    src=media_url(media_path),
+                    width=120,
+                    height=120,
+                    fit="cover",
+                    border_radius=8
+                ) if not is_video else ft.Container(
+                    width=120,
+                    height=120,
+                    bgcolor="#333",
+                    border_radius=8,
+                    content=ft.Icon(ft.icons.PLAY_CIRCLE, size=40, color="white"),
+                    on_click=lambda e: (show_preview(media_path), page.update())
+                ),
+                ft.Container(
+                    content=ft.IconButton(
+                        icon=ft.icons.CLOSE,
+                        icon_size=16,
+                        on_click=remove_media_item(media_path),
+                        bgcolor="#ff5252",
+                        icon_color="white"
+                    ),
+                    right=0,
+                    top=0
+                )
+            ]),
+            width=120,
+            height=120
+        )
+    
     def update_gallery():
-        """Actualiza la galería de fotos/videos"""
+        """Actualiza la galería de fotos/videos (los casi duplicados se muestran agrupados)"""
         gallery_row.controls.clear()
-        for media_path in media_list:
+        for grupo in hash_index.agrupar(media_list):
             try:
-                data_url = file_to_data_url(media_path)
-                ext = os.path.splitext(media_path)[1].lower()
-                is_video = ext in ['.mp4', '.avi', '.mov', '.mkv', '.webm']
+                items = [build_gallery_item(media_path) for media_path in grupo]
+                if len(grupo) == 1:
+                    gallery_row.controls.extend(items)
+                    continue
                 
-                item = ft.Container(
-                    content=ft.Stack([
-                        ft.Image(
-                            src=data_url if not is_video else "",
-                            width=120,
-                            height=120,
-                            fit="cover",
-                            border_radius=8
-                        ) if not is_video else ft.Container(
-                            width=120,
-                            height=120,
-                            bgcolor="#333",
-                            border_radius=8,
-                            content=ft.Icon(ft.icons.VIDEOCAM, size=40, color="white")
-                        ),
-                        ft.Container(
-                            content=ft.IconButton(
-                                icon=ft.icons.CLOSE,
-                                icon_size=16,
-                                on_click=remove_media_item(media_path),
-                                bgcolor="#ff5252",
-                                icon_color="white"
-                            ),
-                            right=0,
-                            top=0
-                        )
-                    ]),
-                    width=120,
-                    height=120
+                gallery_row.controls.append(
+                    ft.Container(
+                        content=ft.Column([
+                            ft.Text(f"🔁 {len(grupo)} fotos similares (se analiza 1)", size=11, color="#9C27B0", weight="bold"),
+                            ft.Row(items, spacing=4),
+                        ], spacing=4),
+                        padding=6,
+                        border=ft.border.all(2, "#9C27B0"),
+                        border_radius=10
+                    )
                 )
-                gallery_row.controls.append(item)
-            except:
-                pass
+            except Exception as ex:
+                logger.warning(f"No se pudo mostrar {grupo[0]} en la galería: {ex}")
         page.update()
     
     def select_photo_from_gallery(e):
@@ -403,12 +509,7 @@ def main(page: ft.Page):
             
             # Mostrar preview del último agregado
             try:
-                data_url = file_to_data_url(photo_path)
-                if data_url:
-                    preview.src = data_url
-                    preview.visible = True
-                else:
-                    preview.src = ""
+                show_preview(photo_path)
             except Exception as ex:
                 status.value = f"Error al mostrar: {str(ex)[:20]}"
             
@@ -418,8 +519,33 @@ def main(page: ft.Page):
             status.value = "❌ Selección cancelada"
             page.update()
 
+    def add_camera_photo(photo_path):
+        media_list.append(photo_path)
+        photo_source["path"] = photo_path
+        image_url_field.value = f"{len(media_list)} archivo(s) seleccionado(s)"
+        status.value = f"✅ Foto capturada ({len(media_list)} total)"
+        show_preview(photo_path)
+        update_gallery()
+        page.update()
+
     def capture_photo_from_camera(e):
-        """Captura foto desde la cámara - usa FilePicker con upload para web/móvil"""
+        """Captura foto desde la cámara: en el kiosco (app de escritorio) con la
+        cámara local; en web/móvil, o si no hay cámara local, con FilePicker"""
+        if not page.web:
+            status.value = "📷 Capturando..."
+            page.update()
+
+            def capturar():
+                photo_path = open_camera()
+                if photo_path:
+                    add_camera_photo(photo_path)
+                else:
+                    pick_camera_file()
+            threading.Thread(target=capturar, daemon=True).start()
+            return
+        pick_camera_file()
+
+    def pick_camera_file():
         status.value = "📷 Selecciona/Captura una foto..."
         page.update()
         
@@ -469,12 +595,7 @@ def main(page: ft.Page):
                 status.value = f"✅ Foto agregada ({len(media_list)} total)"
                 
                 try:
-                    data_url = file_to_data_url(photo_path)
-                    if data_url:
-                        preview.src = data_url
-                        preview.width = 600
-                        preview.height = 400
-                        preview.visible = True
+                    show_preview(photo_path)
                 except:
                     pass
                 
@@ -498,12 +619,7 @@ def main(page: ft.Page):
             status.value = f"✅ Foto subida ({len(media_list)} total)"
             
             try:
-                data_url = file_to_data_url(photo_path)
-                if data_url:
-                    preview.src = data_url
-                    preview.width = 600
-                    preview.height = 400
-                    preview.visible = True
+                show_preview(photo_path)
             except:
                 pass
             
@@ -513,103 +629,162 @@ def main(page: ft.Page):
             status.value = "❌ Error al subir foto"
             page.update()
 
-    def extract_video_frames(video_path, num_frames=5):
-        """Extrae frames de un video para análisis"""
-        frames = []
-        try:
-            cap = cv2.VideoCapture(video_path)
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            
-            if total_frames < 1:
-                cap.release()
-                return frames
-            
-            # Extraer frames distribuidos uniformemente
-            frame_indices = np.linspace(0, total_frames-1, num_frames, dtype=int)
-            
-            for idx in frame_indices:
-                cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
-                ret, frame = cap.read()
-                if ret:
-                    frames.append(frame)
-            
-            cap.release()
-        except Exception as e:
-            print(f"Error extrayendo frames de video: {e}")
-        
-        return frames
-
+    @trabajo("galeria")
     def analyze_all_media(e):
         """Analiza todas las fotos/videos en la galería"""
         if not media_list:
+            # Sin galería: analizar la URL, ruta o lista de URLs escrita en el campo
+            if (image_url_field.value or "").strip():
+                analyze_photo_from_url(e)
+                return
             status.value = "⚠️ No hay archivos para analizar. Agrega fotos o videos primero."
-            page.update()
+            ui.flush(status)
             return
         
         all_damages = []
         max_severity = "Perfecto"
+        # Evidencia anotada por archivo: media_path -> (clave en el almacén, severidad)
+        anotadas = {}
         
         status.value = "🔍 Iniciando análisis..."
-        page.update()
+        ui.flush(status)
+        timer = StageTimer()
+        detector = get_detector()
+        timer.lap("carga_detector")
+        
+        # Fotos casi idénticas: se analiza sólo la representante de cada grupo
+        grupos = hash_index.agrupar(media_list)
+        vin_actual = sanitize_text(vin_field.value or "N/A")
+        placa_actual = sanitize_text(placa_field.value or "N/A")
+        previos = fetch_media_hashes(vin_actual, placa_actual)
+        timer.lap("agrupar")
+        
+        # Diario del trabajo: reanudar el interrumpido si es la misma galería
+        job_id = trabajo_pendiente["job_id"]
+        trabajo_pendiente["job_id"] = None
+        items = fetch_job_items(job_id) if job_id else []
+        if items and sorted(p for it in items for p in it[3]) == sorted(media_list):
+            grupos = [it[3] for it in items]
+        else:
+            if job_id:
+                abandon_job(job_id)
+            job_id = create_job(vin_actual, placa_actual, grupos)
+            items = fetch_job_items(job_id)
+        items_por_path = {it[2]: it for it in items}
+        hechos = sum(1 for it in items if it[4] in ("inferred", "persisted"))
+        logger.info(f"Análisis de galería: {len(media_list)} archivo(s) en {len(grupos)} grupo(s), trabajo {job_id} ({hechos} ya analizados)")
+        
+        # Modo "frames" con varios videos: decodificar e inferir en paralelo
+        # (frames en memoria compartida; inferencia en el servidor o por el scheduler)
+        videos_precalculados = {}
+        videos = [g[0] for g in grupos if os.path.splitext(g[0])[1].lower() in ['.mp4', '.avi', '.mov', '.mkv', '.webm']
+                  and os.path.exists(g[0]) and items_por_path[g[0]][4] not in ("inferred", "persisted")]
+        if VIDEO_ANALYSIS_MODE == "frames" and len(videos) > 1:
+            status.value = f"🎥 Analizando {len(videos)} videos en paralelo..."
+            ui.flush(status)
+            try:
+                from frame_arena import analizar_videos_paralelo
+                videos_precalculados = analizar_videos_paralelo(
+                    videos, num_frames=5, analizar=lambda img: inferir(detector.analizar_imagen, img))
+            except Exception as ex:
+                logger.warning(f"Análisis paralelo de videos no disponible: {ex}")
+            timer.lap("videos_paralelo")
         
         try:
-            for idx, media_path in enumerate(media_list):
+            for idx, grupo in enumerate(grupos):
+                media_path = grupo[0]
+                item_id, _, _, _, item_estado, item_lineas, item_severidad = items_por_path[media_path]
+                if item_estado in ("inferred", "persisted"):
+                    # Ya analizado antes del reinicio: reutilizar el resultado del diario
+                    all_damages.extend(item_lineas)
+                    max_severity = detector.peor_severidad(max_severity, item_severidad or "Perfecto")
+                    continue
                 if not os.path.exists(media_path):
                     status.value = f"⚠️ Archivo no encontrado: {os.path.basename(media_path)}"
                     continue
                     
                 ext = os.path.splitext(media_path)[1].lower()
                 is_video = ext in ['.mp4', '.avi', '.mov', '.mkv', '.webm']
+                nombre = os.path.basename(media_path)
+                if len(grupo) > 1:
+                    nombre += f" (+{len(grupo) - 1} similares)"
                 
-                progress.value = idx / len(media_list)
-                status.value = f"🔍 Analizando {idx+1}/{len(media_list)}: {os.path.basename(media_path)}"
-                page.update()
+                progress.value = idx / len(grupos)
+                status.value = f"🔍 Analizando {idx+1}/{len(grupos)}: {nombre} | cola {espera_cola['ms']:.0f} ms"
+                ui.request(progress, status)
+                update_job_item(item_id, "decoded")
+                # Resultado de este archivo (se guarda en el diario al terminarlo)
+                lineas_item = []
+                sev_item = "Perfecto"
+                completado = True
                 
                 if is_video:
-                    # Analizar video frame por frame
-                    frames = extract_video_frames(media_path, num_frames=5)
-                    status.value = f"Analizando video ({len(frames)} frames)..."
-                    page.update()
-                    
-                    for frame_idx, frame in enumerate(frames):
-                        temp_frame_path = os.path.join(tempfile.gettempdir(), f"frame_{frame_idx}.jpg")
-                        cv2.imwrite(temp_frame_path, frame)
-                        
-                        daños, severidad = detectar_daños(temp_frame_path)
-                        
-                        if "Error" not in daños and "Sin daños" not in daños:
-                            all_damages.append(f"🎥 Video frame {frame_idx+1}: {daños}")
-                            
-                            # Actualizar severidad máxima
-                            if severidad == "Grave":
-                                max_severity = "Grave"
-                            elif severidad == "Moderada" and max_severity != "Grave":
-                                max_severity = "Moderada"
-                        
-                        try:
-                            os.remove(temp_frame_path)
-                        except:
-                            pass
+                    # tracking: YOLO cada DETECT_EVERY frames y flujo óptico entre medias;
+                    # frames: unos pocos frames sueltos (ya calculados si hubo análisis paralelo)
+                    from video_tracking import analizar_video_galeria, DETECT_EVERY
+                    ultimo_latido = [time.monotonic()]
+                    def on_video_progress(frame_idx, name=os.path.basename(media_path)):
+                        if VIDEO_ANALYSIS_MODE == "tracking":
+                            status.value = f"🎥 {name}: frame {frame_idx} (detección cada {DETECT_EVERY})"
+                        else:
+                            status.value = f"🎥 {name}: frame {frame_idx + 1}"
+                        ui.request(status)
+                        logger.info(f"{name}: frame {frame_idx}", extra={"sample": "video_frame"})
+                        if time.monotonic() - ultimo_latido[0] > 30:
+                            # Video largo: que otro proceso no dé el trabajo por colgado
+                            ultimo_latido[0] = time.monotonic()
+                            heartbeat_job(job_id)
+
+                    lineas_item, sev_item, completado = analizar_video_galeria(
+                        media_path, VIDEO_ANALYSIS_MODE,
+                        detectar=lambda frame: inferir(detector.detectar_vehiculos, frame),
+                        analizar=lambda frame: inferir(detector.analizar_imagen, frame),
+                        resultados_frames=videos_precalculados.get(media_path),
+                        on_progress=on_video_progress)
+                    if not completado:
+                        # Sistema ocupado a mitad del video: queda pendiente en el diario
+                        status.value = f"⏳ Sistema ocupado, {nombre} omitido"
+                        ui.request(status)
                 else:
                     # Analizar imagen
                     try:
-                        daños, severidad = detectar_daños(media_path)
-                        print(f"Resultado análisis: {daños}, {severidad}")
+                        previo = hash_index.buscar_previo(media_path, previos)
+                        if previo:
+                            # Misma toma que en un reporte anterior del vehículo: reutilizar resultado
+                            daños, severidad = previo[3], previo[4]
+                            nombre += f" [reporte previo {previo[2]}]"
+                        else:
+                            # Las cajas se dibujan en el worker con el frame aún decodificado
+                            daños, severidad, anotada = inferir(detector.detectar_y_anotar, media_path)
+                            if anotada:
+                                anotadas[media_path] = (guardar_bytes(anotada, ".webp"), severidad)
+                            h = hash_index.get(media_path)
+                            if h is not None and "Error" not in daños:
+                                insert_media_hash(to_hex(h), media_path, vin_actual, placa_actual, daños, severidad)
+                        logger.info(f"Resultado análisis {nombre}: {daños}, {severidad}", extra={"sample": "resultado_imagen"})
                         
                         if "Error" not in daños and "Sin daños" not in daños:
-                            all_damages.append(f"📷 {os.path.basename(media_path)}: {daños}")
-                            
-                            # Actualizar severidad máxima
-                            if severidad == "Grave":
-                                max_severity = "Grave"
-                            elif severidad == "Moderada" and max_severity != "Grave":
-                                max_severity = "Moderada"
+                            lineas_item.append(f"📷 {nombre}: {daños}")
+                            sev_item = detector.peor_severidad(sev_item, severidad)
+                    except SchedulerBusyError as ex:
+                        logger.warning(f"{nombre} omitido: {ex}")
+                        lineas_item.append(f"⏳ {nombre}: no analizado (sistema ocupado)")
+                        completado = False
+                        status.value = f"⏳ Sistema ocupado, {nombre} omitido"
+                        ui.request(status)
                     except Exception as ex:
-                        print(f"Error analizando {media_path}: {ex}")
+                        logger.error(f"Error analizando {media_path}: {ex}")
+                        completado = False
                         status.value = f"⚠️ Error analizando: {str(ex)[:50]}"
-                        page.update()
+                        ui.request(status)
+                
+                all_damages.extend(lineas_item)
+                max_severity = detector.peor_severidad(max_severity, sev_item)
+                if completado:
+                    update_job_item(item_id, "inferred", lineas_item, sev_item)
             
             progress.value = 1.0
+            timer.lap("inferencia")
             
             if not all_damages:
                 result_text.value = f"✅ Sin daños detectados en {len(media_list)} archivo(s)"
@@ -626,67 +801,88 @@ def main(page: ft.Page):
             try:
                 vin = sanitize_text(vin_field.value or "N/A")
                 placa = sanitize_text(placa_field.value or "N/A")
-                c.execute(
-                    "INSERT INTO damage_reports (vin,placa,fecha,daños,severidad,foto_path) VALUES (?,?,?,?,?,?)",
-                    (vin, placa,
-                     datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                     result_text.value, max_severity, ", ".join(media_list))
-                )
-                conn.commit()
+                reporte_id = insert_report(vin, placa, result_text.value, max_severity, ", ".join(media_list))
+                enlazadas = sorted(((p, clave, sev) for p, (clave, sev) in anotadas.items()),
+                                   key=lambda a: detector.SEVERIDAD_ORDEN.get(a[2], -1), reverse=True)
+                finish_job(job_id, reporte_id)
+                # Copia al almacén (hash + escritura) en el pool de evidencia, fuera de este
+                # hilo; al terminar se enlazan las claves al reporte y sus anotaciones
+                get_evidence_store().ingresar_reporte(reporte_id, media_list, max_severity, enlazadas)
+                if enlazadas:
+                    # La preview muestra dónde está el daño más grave
+                    show_preview(ruta_en_almacen(enlazadas[0][1]))
                 status.value = f"✅ Análisis completado: {len(media_list)} archivo(s)"
             except sqlite3.OperationalError as e:
-                conn.rollback()
                 status.value = f"⚠️ Error DB: {e}"
+            timer.lap("bd")
         except Exception as e:
-            print(f"Error general en análisis: {e}")
+            logger.error(f"Error general en análisis: {e}")
             status.value = f"❌ Error: {str(e)[:100]}"
         except Exception as e:
-            conn.rollback()
             status.value = f"❌ Error guardando: {e}"
-        page.update()
+        ui.flush(preview, video_preview, progress, status, result_text, severity_text)
+        logger.info(f"Análisis de galería terminado: {max_severity} | UI {ui.stats()} | cola {get_scheduler().stats()}", extra={"timings": timer.ms()})
 
+    @trabajo("imagen")
     def analyze_photo_from_url(e):
         image_source = image_url_field.value.strip()
         
         if not image_source and not photo_source.get("path"):
             status.value = "⚠️ Ingresa una URL, ruta o selecciona foto"
-            page.update()
+            ui.flush(status)
+            return
+        
+        from downloader import descargar, descargar_lista, leer_lista_urls, DownloadError
+        
+        # Lista de URLs exportada del DMS: descargar todas y analizarlas como galería
+        if image_source.lower().endswith(('.csv', '.txt')) and os.path.exists(image_source):
+            urls = leer_lista_urls(image_source)
+            if not urls:
+                status.value = "⚠️ La lista no contiene URLs"
+                ui.flush(status)
+                return
+            status.value = f"⬇️ Descargando {len(urls)} imagen(es)..."
+            progress.value = 0.1
+            ui.flush(status, progress)
+            
+            resultados = descargar_lista(urls)
+            errores = [r for r in resultados if "error" in r]
+            for r in resultados:
+                if "path" in r and r["path"] not in media_list:
+                    media_list.append(r["path"])
+            for r in errores:
+                logger.warning(f"Error descargando {r['url']}: {r['error']}")
+            image_url_field.value = f"{len(media_list)} archivo(s) seleccionado(s)"
+            status.value = f"✅ {len(resultados) - len(errores)} descargada(s), {len(errores)} con error"
+            update_gallery()
+            analyze_all_media(e)
             return
         
         # Usar la foto seleccionada de galería si está disponible
         if photo_source.get("path") and not image_source.startswith("http"):
             image_source = photo_source["path"]
         
-        # Si es URL remota
+        # Si es URL remota: descargar al almacén local y analizarla como un archivo más
         if image_source.startswith("http"):
-            try:
-                preview.src = image_source
-            except:
-                pass
-            progress.value = 0.2
-            status.value = "Analizando..."
+            progress.value = 0.1
+            status.value = "⬇️ Descargando imagen..."
             result_text.value = ""
             severity_text.value = ""
-            page.update()
-
-            progress.value = 0.6
-            page.update()
-
-            result_text.value = "Vista previa de imagen cargada"
-            result_text.color = "#2196f3"
-            
-            severity_text.value = "VISTA PREVIA"
-            severity_text.color = "#2196f3"
-            
-            progress.value = 1.0
-            status.value = "✅ Imagen cargada (preview)"
-            page.update()
-            return
+            ui.flush(progress, status, result_text, severity_text)
+            try:
+                descarga = descargar(image_source)
+            except DownloadError as ex:
+                status.value = f"❌ Error descargando: {str(ex)[:80]}"
+                progress.value = 0
+                ui.flush(status, progress)
+                return
+            logger.info(f"Descargada {image_source} -> {descarga['path']} (cache: {descarga['cached']})")
+            image_source = descarga["path"]
 
         # Si es ruta local
         if not os.path.exists(image_source):
             status.value = f"❌ Archivo no existe: {os.path.basename(image_source)}"
-            page.update()
+            ui.flush(status)
             return
 
         # Validar que es un archivo de imagen (ampliado para múltiples formatos)
@@ -698,15 +894,11 @@ def main(page: ft.Page):
         )
         if not image_source.lower().endswith(valid_extensions):
             status.value = f"⚠️ Formato no soportado. Soportados: JPG, PNG, BMP, TIFF, WEBP, GIF, HEIC, RAW"
-            page.update()
+            ui.flush(status)
             return
 
         try:
-            data_url = file_to_data_url(image_source)
-            if data_url:
-                preview.src = data_url
-            else:
-                preview.src = ""
+            if not show_preview(image_source):
                 status.value = "⚠️ No se pudo mostrar preview"
         except Exception as ex:
             print(f"Error en preview: {ex}")
@@ -716,18 +908,27 @@ def main(page: ft.Page):
         status.value = "Analizando imagen..."
         result_text.value = ""
         severity_text.value = ""
-        page.update()
+        ui.flush(preview, video_preview, progress, status, result_text, severity_text)
 
         progress.value = 0.6
-        page.update()
+        ui.request(progress)
 
-        print(f"Llamando a detectar_daños con: {image_source}")
-        daños, severidad = detectar_daños(image_source)
-        print(f"Resultado: daños={daños}, severidad={severidad}")
+        timer = StageTimer()
+        try:
+            # Foto que el asesor está esperando: pasa delante de galerías y videos
+            daños, severidad, anotada = inferir(get_detector().detectar_y_anotar, image_source, prioridad=INTERACTIVE)
+        except SchedulerBusyError as ex:
+            logger.warning(f"Análisis rechazado: {ex}")
+            status.value = "⏳ Sistema ocupado, reintenta en unos segundos"
+            progress.value = 0
+            ui.flush(status, progress)
+            return
+        timer.lap("inferencia")
+        logger.info(f"Resultado {os.path.basename(image_source)}: daños={daños}, severidad={severidad}")
 
         progress.value = 0.9
-        status.value = "Guardando..."
-        page.update()
+        status.value = f"Guardando... (espera en cola {espera_cola['ms']:.0f} ms)"
+        ui.request(progress, status)
 
         result_text.value = daños
         result_text.color = "#4CAF50" if "Sin daños" in daños else "#ff5252"
@@ -738,29 +939,76 @@ def main(page: ft.Page):
         try:
             vin = sanitize_text(vin_field.value or "N/A")
             placa = sanitize_text(placa_field.value or "N/A")
-            c.execute(
-                "INSERT INTO damage_reports (vin,placa,fecha,daños,severidad,foto_path) VALUES (?,?,?,?,?,?)",
-                (vin, placa,
-                 datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                 daños, severidad, image_source)
-            )
-            conn.commit()
-            status.value = "✅ Guardado"
+            reporte_id = insert_report(vin, placa, daños, severidad, image_source)
+            enlazadas = []
+            if anotada:
+                clave_anotada = guardar_bytes(anotada, ".webp")
+                enlazadas.append((image_source, clave_anotada, severidad))
+                show_preview(ruta_en_almacen(clave_anotada))
+            get_evidence_store().ingresar_reporte(reporte_id, [image_source], severidad, enlazadas)
+            status.value = f"✅ Guardado (espera en cola {espera_cola['ms']:.0f} ms)"
         except sqlite3.OperationalError as e:
-            conn.rollback()
             status.value = f"⚠️ Error DB: {e}"
         except Exception as e:
-            conn.rollback()
             status.value = f"❌ Error guardando: {e}"
         
         progress.value = 1.0
+        timer.lap("bd")
+        ui.flush(preview, video_preview, progress, status, result_text, severity_text)
+        logger.info(f"Análisis de imagen terminado: {severidad}", extra={"timings": timer.ms()})
+
+    live_session = {"inspector": None}
+
+    def on_live_preview(data_url, detecciones, stats):
+        """Recibe frames anotados del modo en vivo (ya limitados a PREVIEW_FPS)"""
+        preview.src = data_url
+        if detecciones:
+            result_text.value = " | ".join(sorted({d for det in detecciones for d in det["daños"]})) or "Sin daños visibles"
+            severidad = "Perfecto"
+            for det in detecciones:
+                severidad = get_detector().peor_severidad(severidad, det["severidad"])
+            severity_text.value = severidad
+            severity_text.color = "#4CAF50" if severidad == "Perfecto" else "#FFA726" if severidad == "Moderada" else "#ff5252"
+        status.value = f"🎥 En vivo | modelo {stats['latency_ms']} ms | cámara→resultado {stats['end_to_end_ms']} ms | descartados {stats['dropped']}"
+        ui.request(preview, result_text, severity_text, status)
+
+    def toggle_live_inspection(e):
+        """Inicia/detiene la inspección en vivo con la cámara del kiosco"""
+        inspector = live_session["inspector"]
+        if inspector:
+            inspector.stop()
+            live_session["inspector"] = None
+            live_btn.text = get_text("live")
+            status.value = get_text("ready")
+            page.update()
+            return
+
+        try:
+            from camera_service import get_capture_service
+            from live_inspection import LiveInspector
+            service = get_capture_service()
+        except Exception as ex:
+            logger.warning(f"Error iniciando modo en vivo: {ex}")
+            service = None
+        if not service:
+            status.value = "❌ No se pudo abrir la cámara"
+            page.update()
+            return
+
+        # Frames del modo en vivo: prioridad más baja, se descartan si hay trabajo esperando
+        inspector = LiveInspector(service, on_live_preview,
+                                  detectar=lambda frame: get_scheduler().run(
+                                      get_detector().detectar_vehiculos, frame, priority=BACKGROUND, session=sesion_id)[0])
+        live_session["inspector"] = inspector
+        inspector.start()
+        live_btn.text = get_text("live_stop")
+        status.value = "🎥 Iniciando modo en vivo..."
         page.update()
 
     def export_csv(e):
         """Exporta reportes a CSV"""
         try:
-            c.execute("SELECT * FROM damage_reports ORDER BY fecha DESC")
-            rows = c.fetchall()
+            rows = fetch_reports()  # incluye las particiones archivadas
             export_path = os.path.join(os.path.expanduser("~/Desktop"), "reportes_toyota.csv")
             
             with open(export_path, "w", encoding="utf-8") as f:
@@ -776,29 +1024,111 @@ def main(page: ft.Page):
             status.value = f"❌ Error exportando"
             page.update()
     
-    def export_orders_csv(e):
-        """Exporta órdenes de reparación a CSV"""
-        try:
-            c.execute("SELECT * FROM repair_orders ORDER BY fecha_pedido DESC")
-            rows = c.fetchall()
-            export_path = os.path.join(os.path.expanduser("~/Desktop"), "pedidos_toyota.csv")
-            
-            with open(export_path, "w", encoding="utf-8") as f:
-                f.write("ID,Reporte_ID,Fecha,Tipo,Descripción,Estado\n")
-                for r in rows:
-                    f.write(f"{r[0]},{r[1]},{r[2]},{r[3]},\"{r[4]}\",{r[5]}\n")
-            
-            logger.info(f"CSV de pedidos exportado: {export_path}")
-            pedido_status.value = f"✅ Exportado: {export_path}"
-            page.update()
-        except Exception as ex:
-            logger.error(f"Error exportando CSV de pedidos: {ex}")
-            pedido_status.value = f"❌ Error exportando"
-            page.update()
+    def export_day_pdfs(e):
+        """PDFs de todos los reportes de hoy, en procesos aparte"""
+        hoy = datetime.now().strftime("%Y-%m-%d")
+        status.value = f"📄 Generando PDFs del {hoy}..."
+        ui.flush(status)
+
+        def generar():
+            try:
+                rutas = generar_dia(hoy)
+                ok = sum(1 for r in rutas.values() if r)
+                status.value = f"✅ {ok}/{len(rutas)} PDF(s) del {hoy}" if rutas else f"Sin reportes el {hoy}"
+            except Exception as ex:
+                logger.error(f"Error generando PDFs del día: {ex}")
+                status.value = "❌ Error generando PDFs"
+            ui.flush(status)
+
+        threading.Thread(target=generar, daemon=True, name="pdf-dia").start()
 
     # Crear referencias para los elementos de UI que necesitan actualizarse
     assessment_title = ft.Text(get_text("assessment"), size=24, weight="bold", color="#333")
     selected_files_text = ft.Text(get_text("selected_files"), size=14, weight="bold", color="#666")
+    recent_reports_text = ft.Text(get_text("recent_reports"), size=14, weight="bold", color="#666")
+    recent_reports = ft.Column([], spacing=4, width=600)
+    
+    def abrir_reporte(r):
+        """Muestra un reporte guardado con su evidencia anotada (sin volver a inferir ni dibujar)"""
+        def handler(e):
+            report_id, _, _, fecha, daños, severidad = r[:6]
+            anotaciones = fetch_report_annotations(report_id)
+            if anotaciones:
+                show_preview(ruta_en_almacen(anotaciones[0][1]))
+            else:
+                rutas = [get_evidence_store().resolver(k) for k in claves_de(r[6] if len(r) > 6 else "")]
+                rutas = [p for p in rutas if p]
+                if rutas:
+                    show_preview(rutas[0])
+            result_text.value = daños
+            result_text.color = "#4CAF50" if "Sin daños" in (daños or "") else "#ff5252"
+            severity_text.value = severidad
+            severity_text.color = "#4CAF50" if severidad == "Perfecto" else "#FFA726" if severidad == "Moderada" else "#ff5252"
+            status.value = f"📄 Reporte #{report_id} ({fecha}) | {len(anotaciones)} imagen(es) anotada(s)"
+            ui.flush(preview, video_preview, result_text, severity_text, status)
+        return handler
+
+    def mostrar_pdf(report_id, futuro):
+        """Fin de la generación de un PDF (en el hilo del pool): avisa y lo abre"""
+        try:
+            ruta = futuro.result()
+        except Exception as ex:
+            logger.error(f"Error generando PDF del reporte #{report_id}: {ex}")
+            status.value = f"❌ Error generando PDF del reporte #{report_id}"
+        else:
+            status.value = f"✅ PDF: {ruta}"
+            url = media_url(ruta)
+            if url:
+                page.launch_url(url)
+        ui.flush(status)
+
+    def pedir_pdf(report_id):
+        def handler(e):
+            status.value = f"📄 Generando PDF del reporte #{report_id}..."
+            ui.flush(status)
+            get_report_renderer().solicitar(report_id).add_done_callback(
+                functools.partial(mostrar_pdf, report_id))
+        return handler
+
+    def build_report_card(r):
+        report_id, vin, placa, fecha, _, severidad = r[:6]
+        color = "#4CAF50" if severidad == "Perfecto" else "#FFA726" if severidad == "Moderada" else "#ff5252"
+        return ft.Container(
+            content=ft.Row([
+                ft.Text(f"#{report_id} | {vin} / {placa} | {fecha}", size=12, color="#666"),
+                ft.Row([
+                    ft.Text(severidad, size=12, weight="bold", color=color),
+                    ft.TextButton("📄 PDF", on_click=pedir_pdf(report_id)),
+                ], spacing=4),
+            ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
+            padding=6,
+            border_radius=5,
+            bgcolor="#f9f9f9",
+            data=report_id,
+            on_click=abrir_reporte(r)
+        )
+    
+    def load_recent_reports():
+        recent_reports.controls = [build_report_card(r) for r in fetch_reports(limit=RECENT_REPORTS)]
+    
+    def apply_report_change(change):
+        """Nuevo reporte (de cualquier sesión): se añade arriba sin volver a consultar"""
+        if change.table != "damage_reports" or change.row is None:
+            return
+        cards = recent_reports.controls
+        if change.op == "update":
+            for i, card in enumerate(cards):
+                if card.data == change.row_id:
+                    cards[i] = build_report_card(change.row)
+                    break
+            else:
+                return
+        elif change.op == "insert":
+            if any(card.data == change.row_id for card in cards):
+                return
+            cards.insert(0, build_report_card(change.row))
+            del cards[RECENT_REPORTS:]
+        ui.request(recent_reports)
     
     camera_btn = ft.ElevatedButton(
         get_text("camera"),
@@ -818,6 +1148,15 @@ def main(page: ft.Page):
         expand=True
     )
     
+    live_btn = ft.ElevatedButton(
+        get_text("live"),
+        on_click=toggle_live_inspection,
+        bgcolor="#333333",
+        color="white",
+        height=40,
+        expand=True
+    )
+    
     analyze_btn = ft.ElevatedButton(
         get_text("analyze"),
         on_click=analyze_all_media,
@@ -836,233 +1175,344 @@ def main(page: ft.Page):
         expand=True
     )
 
-    assessment_view = ft.Column([
-        ft.Row([ia_badge, lang_selector], alignment="spaceBetween"),
-        assessment_title,
-        ft.Container(height=15),
-        
-        ft.ResponsiveRow([
-            ft.Column([vin_field], col={"xs": 12, "md": 6}),
-            ft.Column([placa_field], col={"xs": 12, "md": 6}),
-        ]),
-        ft.Container(height=15),
-        
-        image_url_field,
-        ft.Container(height=10),
-        
-        ft.ResponsiveRow([
-            ft.Column([camera_btn], col={"xs": 12, "sm": 6}),
-            ft.Column([gallery_btn], col={"xs": 12, "sm": 6}),
-        ]),
-        ft.Container(height=15),
-        
-        # Galería de archivos seleccionados
-        ft.Container(
-            content=ft.Column([
-                selected_files_text,
-                ft.Container(height=5),
-                gallery_row,
+    pdf_day_btn = ft.ElevatedButton(
+        get_text("export_pdfs"),
+        on_click=export_day_pdfs,
+        bgcolor="#c41e3a",
+        color="white",
+        height=50,
+        expand=True
+    )
+
+    def build_assessment_view():
+        load_recent_reports()
+        change_handlers.append(apply_report_change)
+        return ft.Column([
+            ft.Row([ia_badge, lang_selector], alignment="spaceBetween"),
+            assessment_title,
+            ft.Container(height=15),
+            
+            ft.ResponsiveRow([
+                ft.Column([vin_field], col={"xs": 12, "md": 6}),
+                ft.Column([placa_field], col={"xs": 12, "md": 6}),
             ]),
-            visible=True,
-            padding=10,
-            bgcolor="#f9f9f9",
-            border_radius=8,
-        ),
-        ft.Container(height=10),
+            ft.Container(height=15),
+            
+            image_url_field,
+            ft.Container(height=10),
+            
+            ft.ResponsiveRow([
+                ft.Column([camera_btn], col={"xs": 12, "sm": 4}),
+                ft.Column([gallery_btn], col={"xs": 12, "sm": 4}),
+                ft.Column([live_btn], col={"xs": 12, "sm": 4}),
+            ]),
+            ft.Container(height=15),
+            
+            # Galería de archivos seleccionados
+            ft.Container(
+                content=ft.Column([
+                    selected_files_text,
+                    ft.Container(height=5),
+                    gallery_row,
+                ]),
+                visible=True,
+                padding=10,
+                bgcolor="#f9f9f9",
+                border_radius=8,
+            ),
+            ft.Container(height=10),
+            
+            analyze_btn,
+            ft.Container(height=20),
+            
+            preview,
+            video_preview,
+            ft.Container(height=15),
+            
+            status,
+            progress,
+            ft.Container(height=15),
+            
+            ft.Text(get_text("damage") + ":", size=16, weight="bold", color="#333"),
+            result_text,
+            ft.Text(get_text("severity") + ":", size=16, weight="bold", color="#333"),
+            severity_text,
+            ft.Container(height=30),
+            
+            ft.Row([export_btn, pdf_day_btn], spacing=10),
+            ft.Container(height=15),
+            
+            recent_reports_text,
+            recent_reports,
+        ], alignment="center", spacing=10, horizontal_alignment="center", scroll="adaptive")
+
+    # TAB 2: ORDERS (se construye en la primera navegación a Pedidos)
+    def build_orders_view():
+        order_id_field = ft.TextField(label=get_text("order_id"), keyboard_type="number", expand=True)
         
-        analyze_btn,
-        ft.Container(height=20),
+        # Campo de fecha con selector de calendario
+        order_date_field = ft.TextField(
+            label="Fecha del Pedido (YYYY-MM-DD)",
+            value=datetime.now().strftime("%Y-%m-%d"),
+            expand=True,
+            hint_text="2025-12-04"
+        )
         
-        preview,
-        ft.Container(height=15),
+        def on_date_change(e):
+            if e.control.value:
+                order_date_field.value = e.control.value.strftime("%Y-%m-%d")
+                page.update()
         
-        status,
-        progress,
-        ft.Container(height=15),
+        def open_date_picker(e):
+            date_picker = ft.DatePicker(
+                on_change=on_date_change,
+                first_date=datetime(2020, 1, 1),
+                last_date=datetime(2030, 12, 31),
+            )
+            page.overlay.append(date_picker)
+            page.update()
+            date_picker.open = True
+            page.update()
         
-        ft.Text(get_text("damage") + ":", size=16, weight="bold", color="#333"),
-        result_text,
-        ft.Text(get_text("severity") + ":", size=16, weight="bold", color="#333"),
-        severity_text,
-        ft.Container(height=30),
+        date_picker_btn = ft.ElevatedButton(
+            "📅 Calendario",
+            on_click=open_date_picker,
+            bgcolor="#2196F3",
+            color="white",
+            height=40
+        )
         
-        export_btn,
-    ], alignment="center", spacing=10, horizontal_alignment="center", scroll="adaptive")
-
-    # TAB 2: ORDERS
-    order_id_field = ft.TextField(label=get_text("order_id"), keyboard_type="number", expand=True)
-    
-    # Campo de fecha con selector de calendario
-    order_date_field = ft.TextField(
-        label="Fecha del Pedido (YYYY-MM-DD)",
-        value=datetime.now().strftime("%Y-%m-%d"),
-        expand=True,
-        hint_text="2025-12-04"
-    )
-    
-    def on_date_change(e):
-        if e.control.value:
-            order_date_field.value = e.control.value.strftime("%Y-%m-%d")
-            page.update()
-    
-    def open_date_picker(e):
-        date_picker = ft.DatePicker(
-            on_change=on_date_change,
-            first_date=datetime(2020, 1, 1),
-            last_date=datetime(2030, 12, 31),
+        order_type_field = ft.Dropdown(
+            label=get_text("order_type"),
+            options=[
+                ft.dropdown.Option(get_text("parts")),
+                ft.dropdown.Option(get_text("repair")),
+                ft.dropdown.Option(get_text("service")),
+                ft.dropdown.Option("Cambio de Aceite y Filtro"),
+                ft.dropdown.Option("Rotación de Neumáticos"),
+                ft.dropdown.Option("Alineamiento"),
+                ft.dropdown.Option("Chequeo General"),
+                ft.dropdown.Option("Chequeo de Fluidos"),
+                ft.dropdown.Option("Chequeo de Sistema de Frenos"),
+            ],
+            value=get_text("repair"),
+            expand=True
         )
-        page.overlay.append(date_picker)
-        page.update()
-        date_picker.open = True
-        page.update()
-    
-    date_picker_btn = ft.ElevatedButton(
-        "📅 Calendario",
-        on_click=open_date_picker,
-        bgcolor="#2196F3",
-        color="white",
-        height=40
-    )
-    
-    order_type_field = ft.Dropdown(
-        label=get_text("order_type"),
-        options=[
-            ft.dropdown.Option(get_text("parts")),
-            ft.dropdown.Option(get_text("repair")),
-            ft.dropdown.Option(get_text("service")),
-            ft.dropdown.Option("Cambio de Aceite y Filtro"),
-            ft.dropdown.Option("Rotación de Neumáticos"),
-            ft.dropdown.Option("Alineamiento"),
-            ft.dropdown.Option("Chequeo General"),
-            ft.dropdown.Option("Chequeo de Fluidos"),
-            ft.dropdown.Option("Chequeo de Sistema de Frenos"),
-        ],
-        value=get_text("repair"),
-        expand=True
-    )
-    order_desc_field = ft.TextField(
-        label=get_text("description"),
-        multiline=True,
-        min_lines=4,
-        expand=True
-    )
-    orders_list = ft.ListView(expand=True, spacing=8)
-    pedido_status = ft.Text("", size=14, color="#999")
+        order_desc_field = ft.TextField(
+            label=get_text("description"),
+            multiline=True,
+            min_lines=4,
+            expand=True
+        )
+        orders_list = ft.ListView(expand=True, spacing=8)
+        pedido_status = ft.Text("", size=14, color="#999")
+        orders_page = {"limit": ORDERS_PAGE_SIZE, "hay_mas": False}
 
-    def load_orders():
-        orders_list.controls.clear()
-        c.execute("SELECT * FROM repair_orders ORDER BY fecha_pedido DESC")
-        rows = c.fetchall()
-        
-        if not rows:
-            orders_list.controls.append(ft.Text(get_text("no_orders"), size=14, color="#999"))
-            return
-        
-        for r in rows:
+        def load_more_orders(e):
+            orders_page["limit"] += ORDERS_PAGE_SIZE
+            load_orders()
+
+        def toggle_order_estado(order_id, estado):
+            def handler(e):
+                try:
+                    if not update_order_estado(order_id, "Pendiente" if estado == "Completado" else "Completado"):
+                        pedido_status.value = f"⚠️ El pedido #{order_id} está archivado (sólo lectura)"
+                        ui.request(pedido_status)
+                except sqlite3.OperationalError as ex:
+                    logger.warning(f"Error DB cambiando el estado del pedido {order_id}: {ex}")
+            return handler
+
+        def build_order_card(r):
             order_id_val, report_id, fecha, tipo, desc, estado = r
             color = "#4CAF50" if estado == "Completado" else "#FFA726"
+            return ft.Container(
+                content=ft.Column([
+                    ft.Row([
+                        ft.Text(f"Pedido #{order_id_val} - {tipo}", weight="bold"),
+                        ft.Container(
+                            content=ft.Text(estado, color=color, weight="bold"),
+                            on_click=toggle_order_estado(order_id_val, estado),
+                            tooltip="Pendiente ⇄ Completado"
+                        ),
+                    ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
+                    ft.Text(f"Fecha: {fecha} | Reporte: {report_id or 'N/A'}", size=12, color="#999"),
+                    ft.Text(desc, size=13),
+                ], spacing=3),
+                padding=10,
+                border_radius=5,
+                bgcolor="#f9f9f9",
+                border="1px solid #ddd",
+                data=(order_id_val, fecha)
+            )
+
+        def load_orders():
+            orders_list.controls.clear()
+            # Sólo la página visible (+1 fila para saber si hay más)
+            rows = fetch_orders(limit=orders_page["limit"] + 1)
+            hay_mas = len(rows) > orders_page["limit"]
+            orders_page["hay_mas"] = hay_mas
+            rows = rows[:orders_page["limit"]]
             
-            orders_list.controls.append(
-                ft.Container(
-                    content=ft.Column([
-                        ft.Row([
-                            ft.Text(f"Pedido #{order_id_val} - {tipo}", weight="bold"),
-                            ft.Text(estado, color=color, weight="bold"),
-                        ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
-                        ft.Text(f"Fecha: {fecha} | Reporte: {report_id or 'N/A'}", size=12, color="#999"),
-                        ft.Text(desc, size=13),
-                    ], spacing=3),
-                    padding=10,
-                    border_radius=5,
-                    bgcolor="#f9f9f9",
-                    border="1px solid #ddd"
+            if not rows:
+                orders_list.controls.append(ft.Text(get_text("no_orders"), size=14, color="#999"))
+                return
+            
+            for r in rows:
+                orders_list.controls.append(build_order_card(r))
+            if hay_mas:
+                orders_list.controls.append(
+                    ft.TextButton("⬇️ Cargar más / Load more", on_click=load_more_orders)
                 )
-            )
-        page.update()
+            page.update()
 
-    def add_order(e):
-        if not order_desc_field.value:
-            return
-        
-        rep_id = order_id_field.value if order_id_field.value and order_id_field.value.isdigit() else None
-        desc = sanitize_text(order_desc_field.value or "")
-        tipo = sanitize_text(order_type_field.value or get_text("repair"))
-        fecha = order_date_field.value + " " + datetime.now().strftime("%H:%M:%S")
-        
-        try:
-            c.execute(
-                "INSERT INTO repair_orders (reporte_id, fecha_pedido, tipo_pedido, descripcion, estado) VALUES (?,?,?,?,?)",
-                (rep_id, fecha, tipo, desc, "Pendiente")
-            )
-            conn.commit()
-            order_id_field.value = ""
-            order_date_field.value = datetime.now().strftime("%Y-%m-%d")
-            order_desc_field.value = ""
-            load_orders()
-        except sqlite3.OperationalError as e:
-            conn.rollback()
-            print(f"⚠️ Error DB: {e}")
-        except Exception as e:
-            conn.rollback()
-            print(f"❌ Error agregando pedido: {e}")
-        page.update()
+        def apply_order_change(change):
+            """Aplica un pedido nuevo o modificado (de cualquier sesión) a la lista ya cargada"""
+            if change.table != "repair_orders" or change.row is None:
+                return
+            controls = orders_list.controls
+            pos = next((i for i, ctrl in enumerate(controls)
+                        if isinstance(ctrl.data, tuple) and ctrl.data[0] == change.row_id), None)
+            if change.op == "update":
+                if pos is None:
+                    return  # fuera de la página cargada
+                controls[pos] = build_order_card(change.row)
+            elif change.op == "insert":
+                if pos is not None:
+                    return
+                fecha = change.row[2]
+                cards = [i for i, ctrl in enumerate(controls) if isinstance(ctrl.data, tuple)]
+                if not cards:
+                    controls.clear()  # quitar "Sin pedidos"
+                # Orden por fecha descendente, como fetch_orders
+                pos = next((i for i in cards if controls[i].data[1] < fecha), None)
+                if pos is None:
+                    if orders_page["hay_mas"]:
+                        return  # pertenece a una página aún no cargada
+                    pos = cards[-1] + 1 if cards else 0
+                controls.insert(pos, build_order_card(change.row))
+            ui.request(orders_list)
 
-    load_orders()
+        def add_order(e):
+            if not order_desc_field.value:
+                return
+            
+            rep_id = order_id_field.value if order_id_field.value and order_id_field.value.isdigit() else None
+            desc = sanitize_text(order_desc_field.value or "")
+            tipo = sanitize_text(order_type_field.value or get_text("repair"))
+            fecha = order_date_field.value + " " + datetime.now().strftime("%H:%M:%S")
+            
+            try:
+                # La fila nueva llega a orders_list (y a las demás sesiones) por el feed de cambios
+                insert_order(rep_id, fecha, tipo, desc)
+                order_id_field.value = ""
+                order_date_field.value = datetime.now().strftime("%Y-%m-%d")
+                order_desc_field.value = ""
+            except sqlite3.OperationalError as e:
+                logger.warning(f"Error DB agregando pedido: {e}")
+            except Exception:
+                logger.exception("Error agregando pedido")
+            page.update()
 
-    orders_title = ft.Text(get_text("orders"), size=24, weight="bold", color="#333")
-    history_text = ft.Text(get_text("history"), size=16, weight="bold", color="#333")
-    
-    register_btn = ft.ElevatedButton(
-        get_text("register"),
-        on_click=add_order,
-        bgcolor="#9C27B0",
-        color="white",
-        height=50,
-        expand=True
-    )
-    
-    export_orders_btn = ft.ElevatedButton(
-        get_text("export_orders"),
-        on_click=export_orders_csv,
-        bgcolor="#FF9800",
-        color="white",
-        height=40,
-        expand=True
-    )
+        def export_orders_csv(e):
+            """Exporta órdenes de reparación a CSV"""
+            try:
+                rows = fetch_orders()  # incluye las particiones archivadas
+                export_path = os.path.join(os.path.expanduser("~/Desktop"), "pedidos_toyota.csv")
+                
+                with open(export_path, "w", encoding="utf-8") as f:
+                    f.write("ID,Reporte_ID,Fecha,Tipo,Descripción,Estado\n")
+                    for r in rows:
+                        f.write(f"{r[0]},{r[1]},{r[2]},{r[3]},\"{r[4]}\",{r[5]}\n")
+                
+                logger.info(f"CSV de pedidos exportado: {export_path}")
+                pedido_status.value = f"✅ Exportado: {export_path}"
+                page.update()
+            except Exception as ex:
+                logger.error(f"Error exportando CSV de pedidos: {ex}")
+                pedido_status.value = f"❌ Error exportando"
+                page.update()
 
-    orders_view = ft.Column([
-        orders_title,
-        ft.Container(height=15),
-        
-        ft.ResponsiveRow([
-            ft.Column([order_id_field], col={"xs": 12, "md": 4}),
-            ft.Column([
-                ft.Row([
-                    order_date_field,
-                    date_picker_btn
-                ], spacing=5)
-            ], col={"xs": 12, "md": 8}),
-        ]),
-        order_type_field,
-        order_desc_field,
-        register_btn,
-        ft.Container(height=20),
+        orders_title = ft.Text(get_text("orders"), size=24, weight="bold", color="#333")
+        history_text = ft.Text(get_text("history"), size=16, weight="bold", color="#333")
         
-        export_orders_btn,
-        ft.Container(height=10),
+        register_btn = ft.ElevatedButton(
+            get_text("register"),
+            on_click=add_order,
+            bgcolor="#9C27B0",
+            color="white",
+            height=50,
+            expand=True
+        )
         
-        history_text,
-        ft.Container(
-            content=orders_list,
-            expand=True,
-            bgcolor="white",
-            border_radius=5
-        ),
-    ], spacing=10, horizontal_alignment="center", expand=True, scroll="adaptive")
+        export_orders_btn = ft.ElevatedButton(
+            get_text("export_orders"),
+            on_click=export_orders_csv,
+            bgcolor="#FF9800",
+            color="white",
+            height=40,
+            expand=True
+        )
+
+        orders_view = ft.Column([
+            orders_title,
+            ft.Container(height=15),
+            
+            ft.ResponsiveRow([
+                ft.Column([order_id_field], col={"xs": 12, "md": 4}),
+                ft.Column([
+                    ft.Row([
+                        order_date_field,
+                        date_picker_btn
+                    ], spacing=5)
+                ], col={"xs": 12, "md": 8}),
+            ]),
+            order_type_field,
+            order_desc_field,
+            register_btn,
+            ft.Container(height=20),
+            
+            export_orders_btn,
+            ft.Container(height=10),
+            
+            history_text,
+            ft.Container(
+                content=orders_list,
+                expand=True,
+                bgcolor="white",
+                border_radius=5
+            ),
+        ], spacing=10, horizontal_alignment="center", expand=True, scroll="adaptive")
+
+        def update_orders_texts():
+            order_id_field.label = get_text("order_id")
+            order_type_field.label = get_text("order_type")
+            order_type_field.options = [
+                ft.dropdown.Option(get_text("parts")),
+                ft.dropdown.Option(get_text("repair")),
+                ft.dropdown.Option(get_text("service")),
+            ]
+            order_desc_field.label = get_text("description")
+            register_btn.text = get_text("register")
+            export_orders_btn.text = get_text("export_orders")
+            orders_title.value = get_text("orders")
+            history_text.value = get_text("history")
+
+        text_updaters.append(update_orders_texts)
+        change_handlers.append(apply_order_change)
+        load_orders()
+        return orders_view
+
+    # Vistas construidas bajo demanda (una sola vez por sesión)
+    view_builders = {"assessment": build_assessment_view, "orders": build_orders_view}
+    views = {}
+    
+    def get_view(view_name):
+        if view_name not in views:
+            views[view_name] = view_builders[view_name]()
+        return views[view_name]
 
     # MAIN CONTAINER
     content_area = ft.Container(
-        content=assessment_view,
         expand=True,
         padding=20,
         bgcolor="white"
@@ -1070,10 +1520,7 @@ def main(page: ft.Page):
 
     def switch_tab(view_name):
         def handler(e):
-            if view_name == "assessment":
-                content_area.content = assessment_view
-            else:
-                content_area.content = orders_view
+            content_area.content = get_view(view_name)
             page.update()
         return handler
     
@@ -1082,13 +1529,13 @@ def main(page: ft.Page):
         print(f"🔍 Ruta detectada: {route}")  # Debug
         if "pedidos" in route.lower():
             print("📋 Cambiando a vista de PEDIDOS")
-            content_area.content = orders_view
+            content_area.content = get_view("orders")
         elif "evaluacion" in route.lower():
             print("📸 Cambiando a vista de EVALUACIÓN")
-            content_area.content = assessment_view
+            content_area.content = get_view("assessment")
         else:
             # Ruta por defecto
-            content_area.content = assessment_view
+            content_area.content = get_view("assessment")
         page.update()
     
     # Listener de cambios de ruta
@@ -1115,15 +1562,63 @@ def main(page: ft.Page):
         ),
     ], spacing=10)
 
+    def on_db_change(change):
+        for handler in change_handlers:
+            handler(change)
+
+    # Cambios de la BD hechos por cualquier sesión del proceso
+    feed.subscribe(on_db_change)
+    def on_session_close(e):
+        feed.unsubscribe(on_db_change)
+        # El inspector en vivo escucha la cámara compartida: sin esto seguiría inferiendo
+        if live_session["inspector"]:
+            live_session["inspector"].stop()
+            live_session["inspector"] = None
+        ui.cancel()
+
+    page.on_close = on_session_close
+
     page.add(
         header,
         tab_buttons,
         content_area
     )
     
-    # Verificar ruta inicial después de que la página esté lista
-    if page.route and page.route != "/":
-        update_view_from_route(page.route)
+    # Con la página ya renderizada, cargar el detector en segundo plano
+    precargar_detector()
+    # Respaldo periódico de la base en caliente (un hilo por proceso)
+    iniciar_backups()
+    # Sincronización con el almacén central si TOYOTA_SYNC_URL está definido
+    iniciar_sync()
+    threading.Thread(target=update_ia_badge, daemon=True).start()
+    
+    # Vista inicial según la ruta (sólo se construye la que se muestra)
+    update_view_from_route(page.route or "/")
+    
+    def reanudar_trabajo_interrumpido():
+        """Si el servidor se reinició a mitad de un análisis, esta sesión lo retoma
+        desde el diario: sólo se analizan los archivos que no llegaron a 'inferred'"""
+        for job_id, vin, placa, creado in fetch_interrupted_jobs():
+            if not claim_job(job_id):
+                continue  # otra sesión ya lo adoptó
+            items = fetch_job_items(job_id)
+            hechos = sum(1 for it in items if it[4] in ("inferred", "persisted"))
+            media_list[:] = [p for it in items for p in it[3]]
+            vin_field.value = vin
+            placa_field.value = placa
+            image_url_field.value = f"{len(media_list)} archivo(s) seleccionado(s)"
+            status.value = f"♻️ Reanudando análisis del {creado} ({hechos}/{len(items)} ya analizados)..."
+            trabajo_pendiente["job_id"] = job_id
+            logger.info(f"Reanudando trabajo {job_id}: {hechos}/{len(items)} items ya analizados")
+            update_gallery()
+            analyze_all_media(None)
+            return
+    
+    threading.Thread(target=reanudar_trabajo_interrumpido, daemon=True).start()
 
 if __name__ == "__main__":
+    # Configurar logging: cola + hilo escritor, archivo rotativo en JSON (ver app_logging.py).
+    # Sólo en el proceso de la app: los workers "spawn" (PDFs, videos) reimportan
+    # este módulo como __mp_main__ y no deben abrir otro escritor del mismo archivo
+    setup_logging()
     ft.app(target=main, view=ft.WEB_BROWSER, port=8000)
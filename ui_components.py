@@ -0,0 +1,18 @@
+# COMPONENTES DE UI - TOYOTA DAMAGE PRO
+import flet as ft
+
+TOYOTA_LOGO_URL = "https://www.toyota.com/etc.clientlibs/toyota/clientlibs/clientlib-site/resources/images/logos/toyota-logo.png"
+
+
+def build_header():
+    """Cabecera con logo y título de la app"""
+    return ft.Container(
+        content=ft.Column([
+            ft.Image(src=TOYOTA_LOGO_URL, width=120, height=90, fit="contain"),
+            ft.Text("TOYOTA DAMAGE PRO", size=36, weight="bold", color="#c41e3a"),
+            ft.Text("UNIFIED 2025", size=16, color="#666"),
+        ], alignment="center", spacing=5, horizontal_alignment="center"),
+        padding=20,
+        bgcolor="white",
+        border_radius=0
+    )
@@ -0,0 +1,91 @@
+# PLANIFICADOR DE ACTUALIZACIONES DE LA UI
+"""
+Cada page.update() serializa un diff y lo envía por el websocket de la sesión.
+Los análisis largos cambian progress/status varias veces por archivo (y por
+frame en videos), así que en vez de enviar cada cambio se marcan los controles
+como sucios y se envían juntos como mucho cada UPDATE_INTERVAL_MS, o al
+instante en los límites de un trabajo (inicio, fin, error) con flush().
+
+    ui = UpdateScheduler(page)
+    status.value = "..."; ui.request(status)   # se agrupa con los siguientes
+    ui.flush(status, progress)                 # fin del trabajo: enviar ya
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Intervalo mínimo entre dos envíos a la misma sesión (por debajo del PREVIEW_FPS del modo en vivo)
+UPDATE_INTERVAL_MS = 100
+
+
+class UpdateScheduler:
+    """Agrupa las actualizaciones de una sesión Flet (un planificador por página)"""
+
+    def __init__(self, page, interval_ms=UPDATE_INTERVAL_MS):
+        self.page = page
+        self.interval = interval_ms / 1000.0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._dirty = {}          # id(control) -> control
+        self._dirty_page = False  # algún cambio sin control concreto: actualizar la página entera
+        self._timer = None
+        self._last = 0.0
+        self.requests = 0
+        self.flushes = 0
+
+    def request(self, *controls):
+        """Marca controles (o la página, sin argumentos) como pendientes de enviar"""
+        with self._lock:
+            self.requests += 1
+            if controls:
+                for ctrl in controls:
+                    self._dirty[id(ctrl)] = ctrl
+            else:
+                self._dirty_page = True
+            if self._timer is not None:
+                return
+            espera = self._last + self.interval - time.monotonic()
+            if espera > 0:
+                self._timer = threading.Timer(espera, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+                return
+        self.flush()
+
+    def flush(self, *controls):
+        """Envía ya todo lo pendiente, más `controls` si se indican (límites de
+        trabajo o vencimiento del intervalo)"""
+        with self._flush_lock:
+            with self._lock:
+                for ctrl in controls:
+                    self._dirty[id(ctrl)] = ctrl
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                if not self._dirty and not self._dirty_page:
+                    return
+                controles = [] if self._dirty_page else list(self._dirty.values())
+                self._dirty.clear()
+                self._dirty_page = False
+                self._last = time.monotonic()
+                self.flushes += 1
+            try:
+                self.page.update(*controles)
+            except Exception:
+                logger.exception("Error actualizando la UI")
+
+    def cancel(self):
+        """Descarta lo pendiente (p. ej. al cerrar la sesión)"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._dirty.clear()
+            self._dirty_page = False
+
+    def stats(self):
+        with self._lock:
+            return {"requests": self.requests, "flushes": self.flushes,
+                    "coalesced": self.requests - self.flushes}
@@ -0,0 +1,224 @@
+# DETECT-THEN-TRACK PARA VIDEOS DE RECORRIDO (WALKAROUND)
+"""
+Analiza videos largos ejecutando el detector sólo cada N frames y siguiendo
+las cajas de los autos entre medias con flujo óptico (Lucas-Kanade). Cada
+auto físico queda como un único track, y los daños se agregan por track,
+así un mismo daño visto en 200 frames se cuenta una sola vez.
+"""
+import logging
+import os
+
+import cv2
+import numpy as np
+
+from detector import detectar_vehiculos, analizar_imagen, extract_video_frames, iter_video_frames, peor_severidad
+from inference_scheduler import SchedulerBusyError
+
+# Ejecutar YOLO cada N frames; entre medias se propaga con flujo óptico
+DETECT_EVERY = 10
+# IoU mínimo para asociar una detección a un track existente
+IOU_THRESHOLD = 0.3
+# Keyframes consecutivos sin detección antes de cerrar un track
+MAX_MISSED = 3
+# Detecciones necesarias para confirmar un track (evita falsos positivos aislados)
+MIN_HITS = 2
+# Ancho máximo del frame usado para el flujo óptico
+FLOW_WIDTH = 480
+
+logger = logging.getLogger(__name__)
+
+
+def iou(a, b):
+    """Intersección sobre unión de dos cajas (x1, y1, x2, y2)"""
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    if inter == 0:
+        return 0.0
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[2] - b[0]) * (b[3] - b[1])
+    return inter / float(area_a + area_b - inter)
+
+
+class Track:
+    """Un auto seguido a lo largo del video con sus observaciones de daños"""
+
+    def __init__(self, track_id, det, frame_idx):
+        self.id = track_id
+        self.box = tuple(float(v) for v in det["box"])
+        self.hits = 0
+        self.missed = 0
+        self.first_frame = frame_idx
+        self.last_frame = frame_idx
+        self.daños = {}  # etiqueta -> nº de keyframes en que se observó
+        self.severidad = "Perfecto"
+        self.observar(det, frame_idx)
+
+    def observar(self, det, frame_idx):
+        self.box = tuple(float(v) for v in det["box"])
+        self.hits += 1
+        self.missed = 0
+        self.last_frame = frame_idx
+        for d in det["daños"]:
+            self.daños[d] = self.daños.get(d, 0) + 1
+        self.severidad = peor_severidad(self.severidad, det["severidad"])
+
+    @property
+    def confirmado(self):
+        return self.hits >= MIN_HITS
+
+
+class IoUTracker:
+    """Tracker ligero: asociación greedy por IoU en keyframes y
+    propagación de cajas con flujo óptico en los frames intermedios"""
+
+    def __init__(self, iou_threshold=IOU_THRESHOLD, max_missed=MAX_MISSED):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.activos = []
+        self.cerrados = []
+        self._next_id = 1
+        self._prev_gray = None
+        self._scale = 1.0
+
+    def _gray(self, frame):
+        h, w = frame.shape[:2]
+        self._scale = min(1.0, FLOW_WIDTH / float(w))
+        if self._scale < 1.0:
+            frame = cv2.resize(frame, (int(w * self._scale), int(h * self._scale)), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+    def propagar(self, frame):
+        """Desplaza las cajas activas según el flujo óptico desde el frame anterior"""
+        gray = self._gray(frame)
+        prev, self._prev_gray = self._prev_gray, gray
+        if prev is None or prev.shape != gray.shape or not self.activos:
+            return
+
+        s = self._scale
+        for t in self.activos:
+            x1, y1, x2, y2 = (int(v * s) for v in t.box)
+            mask = np.zeros_like(prev)
+            mask[max(0, y1):max(0, y2), max(0, x1):max(0, x2)] = 255
+            pts = cv2.goodFeaturesToTrack(prev, maxCorners=40, qualityLevel=0.01, minDistance=5, mask=mask)
+            if pts is None:
+                continue
+            nuevos, estado, _ = cv2.calcOpticalFlowPyrLK(prev, gray, pts, None)
+            ok = estado.reshape(-1) == 1
+            if not ok.any():
+                continue
+            dx, dy = np.median((nuevos - pts).reshape(-1, 2)[ok], axis=0) / s
+            t.box = (t.box[0] + dx, t.box[1] + dy, t.box[2] + dx, t.box[3] + dy)
+
+    def actualizar(self, detecciones, frame_idx):
+        """Asocia las detecciones de un keyframe con los tracks activos"""
+        pares = []
+        for ti, t in enumerate(self.activos):
+            for di, det in enumerate(detecciones):
+                score = iou(t.box, det["box"])
+                if score >= self.iou_threshold:
+                    pares.append((score, ti, di))
+        pares.sort(reverse=True)
+
+        usados_t, usados_d = set(), set()
+        for _, ti, di in pares:
+            if ti in usados_t or di in usados_d:
+                continue
+            self.activos[ti].observar(detecciones[di], frame_idx)
+            usados_t.add(ti)
+            usados_d.add(di)
+
+        siguen = []
+        for ti, t in enumerate(self.activos):
+            if ti not in usados_t:
+                t.missed += 1
+            if t.missed > self.max_missed:
+                self.cerrados.append(t)
+            else:
+                siguen.append(t)
+        self.activos = siguen
+
+        for di, det in enumerate(detecciones):
+            if di not in usados_d:
+                self.activos.append(Track(self._next_id, det, frame_idx))
+                self._next_id += 1
+
+    def tracks(self):
+        """Todos los tracks (cerrados y activos) ordenados por id"""
+        return sorted(self.cerrados + self.activos, key=lambda t: t.id)
+
+
+def resumir_tracks(tracks):
+    """Agrega los tracks confirmados en líneas de texto y una severidad máxima.
+
+    Si ningún track llegó a MIN_HITS (videos muy cortos) se informan los vistos
+    en un solo keyframe, marcados como sin confirmar para que no pasen por una
+    detección consolidada"""
+    lineas = []
+    severidad = "Perfecto"
+    confirmados = [t for t in tracks if t.confirmado]
+    for t in confirmados or [t for t in tracks if t.hits]:
+        daños = sorted(t.daños, key=t.daños.get, reverse=True)
+        if not daños:
+            continue
+        marca = "" if t.confirmado else " [sin confirmar]"
+        lineas.append(f"Vehículo #{t.id} (frames {t.first_frame}-{t.last_frame}){marca}: {' | '.join(daños)}")
+        severidad = peor_severidad(severidad, t.severidad)
+    return lineas, severidad
+
+
+def analizar_video_tracking(video_path, detect_every=DETECT_EVERY, on_progress=None, detectar=None):
+    """Analiza un video completo con detect-then-track.
+
+    Devuelve (lineas, severidad, tracks). `on_progress(frame_idx)` se llama en
+    cada keyframe para que la UI pueda mostrar el avance. `detectar(frame)`
+    reemplaza a detectar_vehiculos (p. ej. para pasar por el planificador)."""
+    detectar = detectar or detectar_vehiculos
+    tracker = IoUTracker()
+    for idx, frame in iter_video_frames(video_path):
+        tracker.propagar(frame)
+        if idx % detect_every == 0:
+            tracker.actualizar(detectar(frame), idx)
+            if on_progress:
+                on_progress(idx)
+
+    tracks = tracker.tracks()
+    lineas, severidad = resumir_tracks(tracks)
+    return lineas, severidad, tracks
+
+
+def analizar_video_galeria(video_path, modo="tracking", detectar=None, analizar=None,
+                           resultados_frames=None, num_frames=5, on_progress=None):
+    """Un video de la galería en el modo indicado ("tracking" o "frames").
+
+    Devuelve (lineas, severidad, completado). `detectar` / `analizar` pasan
+    por el planificador; si éste rechaza una inferencia a mitad del video
+    (SchedulerBusyError) el video queda como no analizado, con una línea para
+    reintentar y completado=False, y el resto de la galería sigue.
+    `resultados_frames` son los (daños, severidad) ya calculados en paralelo."""
+    nombre = os.path.basename(video_path)
+    lineas = []
+    severidad = "Perfecto"
+    try:
+        if modo == "tracking":
+            encontradas, sev_video, tracks = analizar_video_tracking(video_path, on_progress=on_progress, detectar=detectar)
+            logger.info(f"Video {video_path}: {len(tracks)} vehículo(s) seguidos")
+            lineas = [f"🎥 {nombre} - {linea}" for linea in encontradas]
+            if encontradas:
+                severidad = sev_video
+        else:
+            if resultados_frames is None:
+                analizar = analizar or analizar_imagen
+                resultados_frames = []
+                for frame_idx, frame in enumerate(extract_video_frames(video_path, num_frames=num_frames)):
+                    if on_progress:
+                        on_progress(frame_idx)
+                    resultados_frames.append(analizar(frame))
+            for frame_idx, (daños, sev_frame) in enumerate(resultados_frames):
+                if "Error" not in daños and "Sin daños" not in daños:
+                    lineas.append(f"🎥 Video frame {frame_idx + 1}: {daños}")
+                    severidad = peor_severidad(severidad, sev_frame)
+    except SchedulerBusyError as e:
+        logger.warning(f"{nombre} omitido: {e}")
+        return [f"⏳ {nombre}: no analizado (sistema ocupado, reintentar)"], "Perfecto", False
+    return lineas, severidad, True